@@ -13,24 +13,162 @@ class Settings(BaseSettings):
     openai_embedding_model: str = "text-embedding-3-small"
     openai_chat_model: str = "gpt-4o"
     
+    # Rate limiting da OpenAI (cotas da conta; ajustadas pelos headers x-ratelimit-*)
+    openai_rpm_limit: int = 3000
+    openai_tpm_limit: int = 1_000_000
+    openai_max_concurrency: int = 16
+    openai_min_concurrency: int = 1
+    openai_bulk_reserve_ratio: float = 0.1  # Fração da cota reservada à busca
+    openai_interactive_slots: int = 2  # Vagas de concorrência que a ingestão não ocupa
+    openai_max_retries: int = 3
+    openai_interactive_timeout: float = 10.0  # Timeout por requisição de embedding da busca (s)
+    embedding_request_max_inputs: int = 256
+    
+    # Micro-batching de embeddings de query
+    embedding_batch_enabled: bool = True
+    embedding_batch_window_ms: float = 5.0
+    embedding_batch_max_items: int = 64
+    
     # Google Cloud Storage
     gcs_bucket_name: str
     gcs_project_id: Optional[str] = None  # Opcional se usar ADC
+    gcs_max_workers: int = 16  # Threads do executor dedicado ao GCS
+    gcs_max_concurrent_blobs: int = 8  # Operações simultâneas em lote (vários blobs)
+    gcs_slice_threshold_bytes: int = 8 * 1024 * 1024  # Acima disso, download em fatias
+    gcs_slice_size_bytes: int = 4 * 1024 * 1024
+    gcs_upload_chunk_bytes: int = 4 * 1024 * 1024  # Upload resumable (múltiplo de 256 KiB)
     
     # Pinecone
     pinecone_api_key: str
     pinecone_index_name: str = "agrofinder"
     pinecone_environment: str = "us-east-1"  # Free tier (AWS)
+    pinecone_upsert_batch_size: int = 100  # Vetores por requisição de upsert
+    pinecone_max_workers: int = 16  # Threads do executor dedicado às queries da busca
     
     # Application
     environment: str = "development"
     log_level: str = "INFO"
     
+    # Modo offline: substitutos locais de OpenAI, Pinecone e GCS (testes de carga)
+    offline_mode: bool = False
+    offline_data_dir: str = "data/offline"
+    offline_openai_latency_ms: float = 0
+    offline_pinecone_latency_ms: float = 0
+    offline_gcs_latency_ms: float = 0
+    offline_redis_latency_ms: float = 0
+    
     # Search
     top_k_results: int = 10
     chunk_size: int = 1000
     chunk_overlap: int = 200
     
+    # Re-ranking (MMR local)
+    rerank_enabled: bool = True
+    rerank_lambda: float = 0.7  # 1.0 = só relevância, 0.0 = só diversidade
+    rerank_fetch_multiplier: int = 4  # Candidatos buscados = top_k * multiplicador
+    rerank_max_candidates: int = 100
+    rerank_dedup_threshold: float = 0.97  # Cosseno acima disso = quase-duplicata
+    
+    # Caches de busca (embeddings de query, resultados e URLs assinadas)
+    embedding_cache_size: int = 2048
+    search_cache_size: int = 512
+    search_cache_ttl: int = 300  # segundos
+    cache_backend: str = "memory"  # memory (por processo) | sqlite (workers do host) | redis (instâncias)
+    cache_sqlite_path: str = "data/search_cache.db"
+    cache_redis_url: str = "redis://localhost:6379/0"
+    cache_redis_prefix: str = "agrofinder"
+    cache_redis_stale_ttl: int = 86400  # segundos que a chave sobrevive à validade (modo degradado)
+    
+    # Paginação por cursor: candidatos ranqueados guardados por sessão de busca
+    search_cursor_enabled: bool = True
+    search_cursor_depth: int = 100  # Resultados ranqueados no primeiro uso do cursor (total paginável)
+    search_cursor_sessions: int = 1000  # Sessões em memória (LRU acima disso)
+    search_cursor_max_bytes: int = 64 * 1024 * 1024  # Soma estimada das sessões em memória
+    search_cursor_ttl: int = 600  # segundos
+    
+    # Entrega de documentos (/api/document)
+    document_stream_chunk_bytes: int = 1024 * 1024
+    document_cache_control: str = "public, max-age=3600"
+    document_delivery_mode: str = "proxy"  # proxy | redirect (302 p/ URL assinada) | json
+    document_signed_url_ttl: int = 900  # segundos
+    document_signed_url_refresh_margin: int = 120  # renovar antes de expirar
+    document_signed_url_cache_size: int = 4096
+    
+    # Fatias de página (/api/document/{path}?page=N entrega só a página)
+    page_slices_enabled: bool = False  # Gravar as fatias na ingestão (senão, sob demanda)
+    page_slice_pages: int = 1  # Páginas por fatia
+    page_slice_prefix: str = "_pages"  # Prefixo das fatias no bucket
+    
+    # Cache local de PDFs em disco (LRU por bytes)
+    blob_cache_enabled: bool = True
+    blob_cache_dir: str = "data/blob_cache"
+    blob_cache_max_bytes: int = 512 * 1024 * 1024
+    blob_cache_max_item_bytes: int = 64 * 1024 * 1024
+    
+    # Respostas JSON (orjson + compressão)
+    response_compression_min_bytes: int = 1024
+    response_gzip_level: int = 5
+    response_brotli_quality: int = 5
+    
+    # Log de queries e warm-up
+    query_log_enabled: bool = True
+    query_log_path: str = "data/query_log.jsonl"
+    query_log_max_bytes: int = 5_000_000
+    query_log_backup_count: int = 3
+    query_warmup_top_n: int = 20
+    query_warmup_timeout: float = 15.0  # segundos aguardados antes de aceitar tráfego
+    startup_warmup_enabled: bool = True  # Conexões (OpenAI/Pinecone/GCS) + queries frequentes
+    
+    # Deadline da busca, hedging e circuit breakers (OpenAI e Pinecone)
+    search_deadline_ms: float = 3000
+    hedge_enabled: bool = True
+    hedge_percentile: float = 95  # Segunda tentativa quando a primeira passa deste percentil
+    hedge_min_delay_ms: float = 50
+    hedge_max_delay_ms: float = 1000
+    hedge_min_samples: int = 20  # Amostras antes de começar a fazer hedging
+    hedge_latency_window: int = 500
+    circuit_failure_threshold: int = 5  # Falhas consecutivas para abrir o circuito
+    circuit_recovery_seconds: float = 30.0
+    lexical_fallback_enabled: bool = True
+    lexical_fallback_max_chunks: int = 20_000
+    
+    # Controle de admissão: vagas simultâneas e fila limitada por classe de rota
+    admission_control_enabled: bool = True
+    admission_search_slots: int = 32
+    admission_search_queue: int = 128
+    admission_search_queue_timeout: float = 10.0  # segundos na fila antes do 429
+    admission_ingest_slots: int = 2
+    admission_ingest_queue: int = 4
+    admission_ingest_queue_timeout: float = 30.0
+    
+    # Estatísticas do index (snapshot atualizado em background)
+    index_stats_refresh_interval: float = 60.0  # segundos; 0 desativa a task
+    index_stats_refresh_debounce: float = 2.0  # espera após ingestão antes de atualizar
+    index_stats_max_age: float = 180.0  # acima disso o snapshot é marcado como stale
+    health_deep_check_timeout: float = 5.0  # timeout de cada probe de /api/health/deep
+    
+    # Ledger de ingestão (perfil por documento: etapas, tokens, lotes)
+    ingest_ledger_enabled: bool = True
+    ingest_ledger_path: str = "data/ingest_ledger.jsonl"
+    ingest_ledger_max_bytes: int = 10_000_000
+    ingest_ledger_backup_count: int = 3
+    ingest_ledger_recent_size: int = 10_000  # Registros mantidos em memória por processo
+    
+    # Catálogo local de documentos (SQLite, atualizado na ingestão)
+    catalog_enabled: bool = True
+    catalog_db_path: str = "data/catalog.db"
+    
+    # Deduplicação de chunks quase idênticos na ingestão (MinHash + LSH)
+    dedup_enabled: bool = True
+    dedup_index_path: str = "data/dedup_index.npz"
+    dedup_num_perm: int = 64  # Tamanho da assinatura MinHash
+    dedup_bands: int = 16  # Bandas do LSH (num_perm deve ser múltiplo)
+    dedup_shingle_size: int = 3  # Palavras por shingle
+    dedup_similarity_threshold: float = 0.7  # Jaccard estimado para considerar duplicado
+    dedup_max_copies: int = 3  # Cópias gravadas de um mesmo texto; as seguintes são puladas
+    dedup_max_clusters: int = 100_000  # Assinaturas mantidas (as mais antigas saem)
+    dedup_save_interval: float = 30.0  # segundos entre gravações do índice em disco
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
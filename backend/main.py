@@ -1,24 +1,43 @@
 """
 FastAPI Application - AgroFinder
 """
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
+import asyncio
 import logging
+import tempfile
 import time
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 from backend.config import settings
 from backend.models.schemas import (
     SearchRequest, SearchResponse, SearchResult,
     IngestRequest, IngestResponse,
-    UploadResponse, HealthResponse
+    UploadResponse, HealthResponse, DocumentCategory
 )
-from backend.services.search_pinecone import search_service_pinecone
+from backend.services.search_pinecone import CursorExpired, InvalidCursor, search_service_pinecone
 from backend.services.ingestion_pinecone import ingestion_service_pinecone
 from backend.services.gcs_client import gcs_client
+from backend.services.document_delivery import document_delivery_service
+from backend.services.query_log import query_log
+from backend.services.serialization import search_response_bytes, json_response
+from backend.services.upload_stream import MultipartError, MultipartFileStream
+from backend.services.warmup import warmup_service
+from backend.services.index_stats import index_stats_service
+from backend.services.metrics import MetricsMiddleware, render_metrics
+from backend.services.admission import AdmissionMiddleware, admission_controller
+from backend.services.lexical import lexical_index
+from backend.services.dedup import chunk_deduplicator
+from backend.services.catalog import InvalidCatalogCursor, document_catalog
+from backend.services.resilience import (
+    CircuitOpenError, Deadline, DeadlineExceeded,
+    openai_guard, pinecone_guard, search_degraded
+)
+from backend.services.ingestion_profile import ingestion_ledger, summarize
 
 # Configurar logging
 logging.basicConfig(
@@ -40,12 +59,28 @@ async def startup_event():
     logger.info("🚀 Iniciando AgroFinder API...")
     logger.info(f"📊 Pinecone Index: {settings.pinecone_index_name}")
     logger.info(f"🌍 Environment: {settings.environment}")
-    # Pinecone será inicializado lazy no primeiro uso
+    # Clients são criados lazy; o warm-up em background abre as conexões e
+    # aquece os caches. Aguardamos até query_warmup_timeout antes de aceitar
+    # tráfego; depois disso ele continua em background (ver /api/ready).
+    index_stats_service.start()
+    warmup_task = warmup_service.start()
+    done, _ = await asyncio.wait({warmup_task}, timeout=settings.query_warmup_timeout)
+    if not done:
+        logger.info("🔥 Warm-up ainda em andamento, continuando em background")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento executado no shutdown"""
     logger.info("👋 Encerrando AgroFinder API...")
+    await index_stats_service.stop()
+    # Assinaturas de dedup ainda não gravadas (gravação periódica)
+    await asyncio.to_thread(chunk_deduplicator.save)
+    # Linhas do log de queries ainda na fila de escrita
+    await asyncio.to_thread(query_log.close)
+
+# Vagas e filas por classe de rota (429 quando a ingestão transborda);
+# adicionado antes do CORS para que o 429 também leve os headers CORS
+app.add_middleware(AdmissionMiddleware)
 
 # Configurar CORS
 app.add_middleware(
@@ -54,20 +89,90 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After", "X-Search-Degraded"],
 )
 
+# Latência por rota, requisições em andamento e header Server-Timing
+# (adicionado por último = mais externo: mede também o tempo na fila de admissão)
+app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint - versão rápida"""
+    """
+    Health check endpoint - versão rápida
+    
+    O total de documentos vem do snapshot em memória (atualizado em
+    background); probes reais ficam em /api/health/deep.
+    """
+    snapshot = index_stats_service.snapshot()
     return HealthResponse(
         status="healthy",
         environment=settings.environment,
         chromadb_status="pinecone",  # Agora usando Pinecone
-        total_documents=0,  # Não consultar Pinecone aqui (pode ser lento)
-        timestamp=datetime.now()
+        total_documents=snapshot["total_vectors"],
+        timestamp=datetime.now(),
+        stats_refreshed_at=snapshot["refreshed_at"],
+        stats_stale=snapshot["stale"]
+    )
+
+@app.get("/api/health/deep")
+async def deep_health_check():
+    """
+    Health check com probes reais: Pinecone (describe_index_stats, também
+    atualiza o snapshot), OpenAI (embedding de teste) e GCS (metadata)
+    
+    Responde 503 se algum probe falhar ou exceder o timeout. Não use como
+    liveness probe: cada chamada gera tráfego nos serviços externos.
+    """
+    from backend.services.openai_client import openai_client
+    
+    async def probe(coro):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(coro, timeout=settings.health_deep_check_timeout)
+            result = {"ok": True}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timeout após {settings.health_deep_check_timeout}s"}
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+    
+    names = ("pinecone", "openai", "gcs")
+    results = await asyncio.gather(
+        probe(index_stats_service.refresh()),
+        probe(openai_client.create_embedding("health check")),
+        probe(gcs_client.file_exists("__health__"))
+    )
+    checks = dict(zip(names, results))
+    healthy = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        {
+            "status": "healthy" if healthy else "unhealthy",
+            "checks": checks,
+            "index": index_stats_service.snapshot(),
+            "timestamp": datetime.now().isoformat()
+        },
+        status_code=200 if healthy else 503
     )
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness: 200 quando o warm-up terminou, 503 enquanto aquece
+    
+    Use como startup probe no Cloud Run para só rotear tráfego a instâncias aquecidas.
+    """
+    status = warmup_service.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/api/debug")
 async def debug_connections():
     """Endpoint de diagnóstico para verificar conectividade"""
@@ -109,57 +214,115 @@ async def debug_connections():
 
 @app.get("/api/stats")
 async def get_stats():
-    """Retorna estatísticas detalhadas do sistema"""
-    try:
-        # Consultamos o Pinecone
-        stats = ingestion_service_pinecone.get_index_stats()
-        return {
-            "success": True,
-            "total_vectors": stats.get("total_vectors", 0),
-            "vector_db": "pinecone",
-            "index_name": settings.pinecone_index_name,
-            "environment": settings.environment,
-            "timestamp": datetime.now().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Erro ao obter estatísticas: {e}")
-        return {
-            "success": False,
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }
+    """
+    Retorna estatísticas detalhadas do sistema
+    
+    Servidas do snapshot em memória; `index.refreshed_at`/`age_seconds`
+    indicam quando o Pinecone foi consultado pela última vez.
+    """
+    snapshot = index_stats_service.snapshot()
+    return {
+        "success": snapshot["refreshed_at"] is not None,
+        "total_vectors": snapshot["total_vectors"],
+        "vector_db": "pinecone",
+        "index_name": settings.pinecone_index_name,
+        "environment": settings.environment,
+        "index": snapshot,
+        "admission": admission_controller.stats(),
+        "dependencies": {"openai": openai_guard.stats(), "pinecone": pinecone_guard.stats()},
+        "lexical_fallback": lexical_index.stats(),
+        "dedup": chunk_deduplicator.stats(),
+        "blob_cache": gcs_client.cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 @app.post("/api/search", response_model=SearchResponse)
-async def search(request: SearchRequest):
+async def search(request: SearchRequest, http_request: Request):
     """
     Endpoint de busca semântica
     
     Realiza busca semântica nos documentos indexados usando OpenAI embeddings
     e ChromaDB para recuperação de documentos relevantes.
+    
+    A resposta é serializada direto com orjson (sem revalidar o response_model)
+    e comprimida com brotli/gzip conforme o Accept-Encoding.
+    
+    A busca tem um deadline (SEARCH_DEADLINE_MS). Com a OpenAI ou o Pinecone
+    degradados, a resposta vem do cache ou do índice lexical local e leva o
+    header X-Search-Degraded; sem fallback disponível, responde 503.
+    
+    A resposta traz `next_cursor` quando a página veio cheia. Reenviar a
+    mesma busca com `cursor` devolve a página seguinte: o primeiro uso
+    ranqueia a lista profunda, os seguintes saem da memória sem OpenAI nem
+    Pinecone (400 se o cursor for de outra busca, 410 se expirou).
     """
     start_time = time.time()
     
     try:
-        # Realizar busca usando Pinecone
-        results = await search_service_pinecone.search(
-            query=request.query,
-            top_k=request.top_k or 10,
-            category=request.category,
-            date_from=request.date_from,
-            date_to=request.date_to
-        )
+        if request.cursor:
+            # Páginas seguintes (não entram no log de queries)
+            results, next_cursor = await search_service_pinecone.next_page(
+                cursor=request.cursor,
+                query=request.query,
+                top_k=request.top_k or 10,
+                category=request.category,
+                date_from=request.date_from,
+                date_to=request.date_to,
+                deadline=Deadline(settings.search_deadline_ms / 1000)
+            )
+        else:
+            # Realizar busca usando Pinecone
+            results, next_cursor = await search_service_pinecone.search_page(
+                query=request.query,
+                top_k=request.top_k or 10,
+                category=request.category,
+                date_from=request.date_from,
+                date_to=request.date_to,
+                deadline=Deadline(settings.search_deadline_ms / 1000)
+            )
+        degraded = search_degraded.get()
         
         # Calcular tempo de processamento
         processing_time = (time.time() - start_time) * 1000  # em ms
         
-        return SearchResponse(
+        filters = {
+            "top_k": request.top_k or 10,
+            "category": request.category.value if request.category else None,
+            "date_from": request.date_from.isoformat() if request.date_from else None,
+            "date_to": request.date_to.isoformat() if request.date_to else None
+        }
+        if not request.cursor:
+            query_log.record(
+                query=request.query,
+                filters={k: v for k, v in filters.items() if v is not None},
+                latency_ms=processing_time,
+                result_ids=[result.document_id for result in results]
+            )
+        
+        body = search_response_bytes(
             query=request.query,
             results=results,
-            total_results=len(results),
-            processing_time_ms=round(processing_time, 2)
+            processing_time_ms=round(processing_time, 2),
+            next_cursor=next_cursor
         )
+        response = json_response(body, http_request.headers.get("accept-encoding"))
+        if degraded:
+            response.headers["X-Search-Degraded"] = degraded
+        return response
     
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (DeadlineExceeded, CircuitOpenError) as e:
+        logger.error(f"Busca indisponível: {e}")
+        retry_after = getattr(e, "retry_in", 1.0)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Busca temporariamente indisponível: {str(e)}",
+            headers={"Retry-After": str(max(1, int(retry_after)))}
+        )
     except Exception as e:
         logger.error(f"Erro na busca: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao realizar busca: {str(e)}")
@@ -189,6 +352,8 @@ async def ingest_pdf(request: IngestRequest):
             metadata=request.metadata
         )
         
+        await search_service_pinecone.invalidate_results()
+        index_stats_service.request_refresh()
         filename = request.gcs_path.split('/')[-1]
         
         return IngestResponse(
@@ -206,21 +371,59 @@ async def ingest_pdf(request: IngestRequest):
         raise HTTPException(status_code=500, detail=f"Erro ao processar PDF: {str(e)}")
 
 
-@app.post("/api/upload", response_model=UploadResponse)
+@app.get("/api/ingest/stats")
+async def ingest_stats(limit: int = 1000, top: int = 10, since: Optional[float] = None):
+    """
+    Estatísticas das ingestões registradas no ledger
+    
+    Tempo de parede e CPU por etapa, throughput, tokens de embedding,
+    lotes de upsert e os documentos mais lentos.
+    
+    Args:
+        limit: Número máximo de registros considerados (mais recentes)
+        top: Número de documentos mais lentos listados
+        since: Só ingestões iniciadas a partir deste epoch (segundos)
+    """
+    records = await asyncio.to_thread(ingestion_ledger.records, limit, since)
+    return {
+        "success": True,
+        **summarize(records, top_n=top),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.post(
+    "/api/upload",
+    response_model=UploadResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
 async def upload_pdf(
-    file: UploadFile = File(...),
+    request: Request,
     category: str = "anuncio"
 ):
     """
     Endpoint para upload de novo PDF
     
-    Faz upload do PDF para o GCS e indexa automaticamente no ChromaDB.
+    O corpo multipart é lido em streaming: cada pedaço vai para um upload
+    resumable no GCS e para um arquivo temporário local ao mesmo tempo (com
+    o hash calculado no caminho). A indexação no Pinecone lê a cópia local,
+    sem baixar o arquivo de volta do GCS.
     """
+    local_path = None
     try:
-        # Validar tipo de arquivo
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Apenas arquivos PDF são permitidos")
-        
         # Validar categoria
         from backend.models.schemas import DocumentCategory
         if category == "anuncio":
@@ -230,36 +433,60 @@ async def upload_pdf(
         else:
             raise HTTPException(status_code=400, detail=f"Categoria inválida: {category}")
         
+        try:
+            upload = MultipartFileStream(request, field_name="file")
+            filename = await upload.open()
+        except MultipartError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Validar tipo de arquivo
+        if not filename.endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Apenas arquivos PDF são permitidos")
+        
         # Gerar caminho no GCS
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        gcs_path = f"pdfs/{category}/{timestamp}_{file.filename}"
-        
-        # Upload para GCS
-        content = await file.read()
-        file_size = len(content)
+        gcs_path = f"pdfs/{category}/{timestamp}_{filename}"
         
-        from io import BytesIO
-        file_data = BytesIO(content)
-        gcs_url = await gcs_client.upload_file(file_data, gcs_path)
+        # Upload para GCS + cópia local em uma única passada
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as local_file:
+            local_path = local_file.name
+            try:
+                gcs_url, file_size, content_sha256 = await gcs_client.upload_stream(
+                    upload.chunks(), gcs_path, local_file=local_file
+                )
+            except MultipartError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        await upload.drain()
         
         logger.info(f"✅ Arquivo enviado para GCS: {gcs_path}")
         
-        # Indexar automaticamente no Pinecone
+        # Indexar automaticamente no Pinecone (a partir da cópia local)
         logger.info(f"🔄 Iniciando indexação automática no Pinecone...")
-        document_id, num_chunks = await ingestion_service_pinecone.ingest_pdf(
-            gcs_path=gcs_path,
-            category=doc_category,
-            metadata={"indexed_by": "web_upload", "upload_timestamp": timestamp}
+        (document_id, num_chunks), _ = await asyncio.gather(
+            ingestion_service_pinecone.ingest_pdf(
+                gcs_path=gcs_path,
+                category=doc_category,
+                metadata={
+                    "indexed_by": "web_upload",
+                    "upload_timestamp": timestamp,
+                    "content_sha256": content_sha256
+                },
+                local_path=local_path
+            ),
+            gcs_client.seed_cache(gcs_path, local_path)
         )
         
         logger.info(f"✅ Documento indexado: {num_chunks} chunks criados")
+        await search_service_pinecone.invalidate_results()
+        index_stats_service.request_refresh()
         
         return UploadResponse(
             success=True,
             gcs_path=gcs_path,
-            filename=file.filename,
+            filename=filename,
             file_size=file_size,
-            message=f"Arquivo enviado e indexado com sucesso! {num_chunks} chunks criados."
+            message=f"Arquivo enviado e indexado com sucesso! {num_chunks} chunks criados.",
+            content_sha256=content_sha256
         )
     
     except HTTPException:
@@ -267,33 +494,70 @@ async def upload_pdf(
     except Exception as e:
         logger.error(f"Erro no upload/indexação: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar arquivo: {str(e)}")
+    finally:
+        if local_path:
+            Path(local_path).unlink(missing_ok=True)
 
 
 
 
-@app.get("/api/document/{document_path:path}")
-async def get_document(document_path: str):
+@app.get("/api/documents")
+async def list_documents(
+    category: Optional[DocumentCategory] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    facets: bool = True
+):
     """
-    Serve PDF from GCS
+    Lista os documentos indexados (catálogo local, sem GCS nem Pinecone)
     
-    Example: /api/document/anuncios/file.pdf
+    Mais recentes primeiro, com paginação por `next_cursor`. Na primeira
+    página (sem cursor), `facets` traz as contagens por categoria e por mês
+    de ingestão para os filtros atuais.
+    
+    Args:
+        category: Filtro por categoria
+        date_from: Ingeridos a partir desta data
+        date_to: Ingeridos até esta data
+        limit: Documentos por página
+        cursor: next_cursor da página anterior
+        facets: Incluir as contagens (ignorado com cursor)
     """
+    category_value = category.value if category else None
     try:
-        # Download PDF from GCS
-        pdf_bytes = await gcs_client.download_file(document_path)
-        
-        # Return as PDF response
-        from fastapi.responses import Response
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"inline; filename={document_path.split('/')[-1]}"
-            }
+        documents, next_cursor = await asyncio.to_thread(
+            document_catalog.list_documents, category_value, date_from, date_to, limit, cursor
         )
-    except Exception as e:
-        logger.error(f"Erro ao buscar documento: {e}")
-        raise HTTPException(status_code=404, detail=f"Documento não encontrado: {str(e)}")
+    except InvalidCatalogCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = {
+        "documents": documents,
+        "count": len(documents),
+        "next_cursor": next_cursor
+    }
+    if facets and not cursor:
+        response["facets"] = await asyncio.to_thread(
+            document_catalog.facets, category_value, date_from, date_to
+        )
+    return response
+
+
+@app.get("/api/document/{document_path:path}")
+async def get_document(document_path: str, request: Request, page: Optional[int] = Query(None, ge=1)):
+    """
+    Serve PDF from GCS
+    
+    Faz streaming em pedaços, aceita Range (206) e responde 304 para
+    If-None-Match/If-Modified-Since quando o blob não mudou. Com
+    DOCUMENT_DELIVERY_MODE=redirect/json, devolve uma URL assinada do GCS.
+    Com `page`, entrega só a fatia do PDF que contém a página.
+    
+    Example: /api/document/anuncios/file.pdf?page=3
+    """
+    return await document_delivery_service.build_response(document_path, request, page=page)
 
 
 # Servir frontend (será adicionado após build do React)
@@ -29,6 +29,7 @@ class SearchRequest(BaseModel):
     top_k: Optional[int] = Field(10, ge=1, le=50, description="Número de resultados a retornar")
     date_from: Optional[datetime] = Field(None, description="Filtrar documentos a partir desta data")
     date_to: Optional[datetime] = Field(None, description="Filtrar documentos até esta data")
+    cursor: Optional[str] = Field(None, description="next_cursor da página anterior (mesma query e filtros)")
 
 
 class SearchResult(BaseModel):
@@ -41,6 +42,7 @@ class SearchResult(BaseModel):
     upload_date: datetime
     page_number: Optional[int] = None
     gcs_url: str
+    page_url: Optional[str] = None  # Só a página do resultado (/api/document?page=N)
 
 
 class SearchResponse(BaseModel):
@@ -49,6 +51,7 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     total_results: int
     processing_time_ms: float
+    next_cursor: Optional[str] = None  # Ausente na última página
 
 
 class IngestRequest(BaseModel):
@@ -74,6 +77,7 @@ class UploadResponse(BaseModel):
     filename: str
     file_size: int
     message: str
+    content_sha256: Optional[str] = None
 
 
 class HealthResponse(BaseModel):
@@ -83,4 +87,6 @@ class HealthResponse(BaseModel):
     chromadb_status: str
     total_documents: int
     timestamp: datetime
+    stats_refreshed_at: Optional[datetime] = None  # Snapshot das estatísticas do index
+    stats_stale: bool = False
 
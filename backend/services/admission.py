@@ -0,0 +1,208 @@
+"""
+Controle de admissão por classe de rota (busca x ingestão)
+
+Cada classe tem um número de vagas simultâneas e uma fila de espera
+limitada. Quando as vagas estão ocupadas o pedido aguarda na fila (em
+ordem de chegada) até `queue_timeout`; com a fila cheia, ou após o timeout,
+responde 429 com Retry-After estimado pelo tempo médio de atendimento.
+
+A busca tem prioridade: a ingestão só ocupa uma vaga livre quando não há
+buscas aguardando, então uma rajada de uploads não aumenta a fila da busca.
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+import asyncio
+import json
+import math
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.config import settings
+from backend.services.metrics import count_rejection, register_queue
+
+SEARCH = "search"
+INGEST = "ingest"
+
+# Rotas controladas: (método, path) -> classe
+ROUTE_CLASSES: Dict[Tuple[str, str], str] = {
+    ("POST", "/api/search"): SEARCH,
+    ("POST", "/api/upload"): INGEST,
+    ("POST", "/api/ingest"): INGEST,
+}
+
+
+class AdmissionRejected(Exception):
+    """Pedido recusado: vagas e fila da classe esgotadas"""
+
+    def __init__(self, route_class: str, reason: str, retry_after: int):
+        super().__init__(f"{route_class}: {reason}")
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Pool:
+    """Vagas, fila e estatísticas de uma classe"""
+
+    def __init__(self, name: str, slots: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.slots = slots
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting: Deque[object] = deque()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        # Média móvel exponencial do tempo de atendimento (Retry-After)
+        self.service_time = 1.0
+
+    def retry_after(self) -> int:
+        """Segundos estimados até a fila atual ser atendida"""
+        rounds = (len(self.waiting) + self.in_flight) / max(self.slots, 1)
+        return max(1, min(300, math.ceil(rounds * self.service_time)))
+
+    def stats(self) -> Dict:
+        return {
+            "slots": self.slots,
+            "in_flight": self.in_flight,
+            "waiting": len(self.waiting),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_service_s": round(self.service_time, 3)
+        }
+
+
+class AdmissionController:
+    """Orçamentos de concorrência por classe de rota"""
+
+    def __init__(self):
+        self.pools: Dict[str, _Pool] = {
+            SEARCH: _Pool(
+                SEARCH,
+                settings.admission_search_slots,
+                settings.admission_search_queue,
+                settings.admission_search_queue_timeout
+            ),
+            INGEST: _Pool(
+                INGEST,
+                settings.admission_ingest_slots,
+                settings.admission_ingest_queue,
+                settings.admission_ingest_queue_timeout
+            ),
+        }
+        self._changed: Optional[asyncio.Condition] = None
+        self._changed_loop: Optional[asyncio.AbstractEventLoop] = None
+        for name, pool in self.pools.items():
+            register_queue(f"admission_{name}", lambda pool=pool: len(pool.waiting))
+
+    def _condition(self) -> asyncio.Condition:
+        """Condition do event loop atual (vagas/filas mudaram)"""
+        loop = asyncio.get_running_loop()
+        if self._changed is None or self._changed_loop is not loop:
+            self._changed = asyncio.Condition()
+            self._changed_loop = loop
+        return self._changed
+
+    def _can_start(self, pool: _Pool, ticket: object) -> bool:
+        """Vaga livre, primeiro da fila e (ingestão) nenhuma busca aguardando"""
+        if pool.in_flight >= pool.slots or pool.waiting[0] is not ticket:
+            return False
+        return pool.name == SEARCH or not self.pools[SEARCH].waiting
+
+    def _reject(self, pool: _Pool, reason: str) -> AdmissionRejected:
+        pool.rejected[reason] += 1
+        count_rejection(pool.name, reason)
+        return AdmissionRejected(pool.name, reason, pool.retry_after())
+
+    @asynccontextmanager
+    async def acquire(self, route_class: str) -> AsyncIterator[None]:
+        """
+        Ocupa uma vaga da classe durante o bloco
+
+        Args:
+            route_class: SEARCH ou INGEST
+
+        Raises:
+            AdmissionRejected: Fila cheia ou espera maior que queue_timeout
+        """
+        pool = self.pools[route_class]
+        changed = self._condition()
+        ticket = object()
+
+        async with changed:
+            if len(pool.waiting) >= pool.queue_size + max(pool.slots - pool.in_flight, 0):
+                raise self._reject(pool, "queue_full")
+            pool.waiting.append(ticket)
+            try:
+                await asyncio.wait_for(
+                    changed.wait_for(lambda: self._can_start(pool, ticket)),
+                    timeout=pool.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                raise self._reject(pool, "queue_timeout")
+            finally:
+                pool.waiting.remove(ticket)
+                changed.notify_all()
+            pool.in_flight += 1
+            pool.admitted += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            pool.service_time = 0.8 * pool.service_time + 0.2 * (time.monotonic() - start)
+            async with changed:
+                pool.in_flight -= 1
+                changed.notify_all()
+
+    def stats(self) -> Dict:
+        """
+        Estado atual de cada classe
+
+        Returns:
+            {classe: {slots, in_flight, waiting, queue_size, admitted, rejected, avg_service_s}}
+        """
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+# Singleton instance
+admission_controller = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI: aplica o controle de admissão antes de ler o corpo"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route_class = None
+        if scope["type"] == "http" and settings.admission_control_enabled:
+            route_class = ROUTE_CLASSES.get((scope["method"], scope["path"]))
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with admission_controller.acquire(route_class):
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            body = json.dumps({
+                "detail": "Servidor ocupado, tente novamente mais tarde",
+                "route_class": e.route_class,
+                "reason": e.reason,
+                "retry_after": e.retry_after
+            }).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"retry-after", str(e.retry_after).encode("latin-1")),
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,286 @@
+"""
+Cache local em disco para blobs do GCS (PDFs)
+
+Entradas são identificadas por nome do blob + generation: um blob
+sobrescrito no bucket ganha outra generation e nunca é servido velho.
+O tamanho total é limitado com despejo LRU; escritas são atômicas
+(arquivo temporário + os.replace).
+
+O diretório é compartilhado pelos workers do host: o próprio diretório é
+o índice (o mtime de cada entrada é o último acesso, em qualquer worker) e
+o limite de bytes é aplicado sobre ele a cada gravação. Arquivos
+temporários levam o PID do processo e só sobras antigas são removidas.
+
+Atenção: no Cloud Run o disco local fica em memória; dimensione
+BLOB_CACHE_MAX_BYTES de acordo com a memória da instância.
+"""
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Temporários mais antigos que isso são sobras de processos encerrados (um
+# download em andamento atualiza o mtime a cada pedaço)
+_STALE_PART_SECONDS = 3600
+
+
+def _cache_key(name: str, generation) -> str:
+    return hashlib.sha256(f"{name}#{generation}".encode("utf-8")).hexdigest()
+
+
+class CacheWriter:
+    """Escrita incremental de uma entrada (ex: durante o streaming de um download)"""
+
+    def __init__(self, cache: "DiskBlobCache", key: str, expected_size: int):
+        self._cache = cache
+        self._key = key
+        self._expected_size = expected_size
+        self._written = 0
+        fd, tmp_path = tempfile.mkstemp(dir=cache.tmp_dir, prefix=f"{os.getpid()}-", suffix=".part")
+        self._tmp_path = Path(tmp_path)
+        self._file: BinaryIO = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._written += len(data)
+
+    def commit(self) -> bool:
+        """Publica a entrada se o conteúdo estiver completo"""
+        self._file.close()
+        if self._written != self._expected_size:
+            self._tmp_path.unlink(missing_ok=True)
+            return False
+        self._cache._publish(self._key, self._tmp_path)
+        return True
+
+    def abort(self) -> None:
+        """Descarta a escrita parcial"""
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class DiskBlobCache:
+    """Cache LRU em disco limitado por bytes totais (compartilhado entre processos)"""
+
+    def __init__(self, directory: str, max_bytes: int, max_item_bytes: int):
+        """
+        Args:
+            directory: Diretório das entradas
+            max_bytes: Tamanho total máximo do cache (somando todos os workers)
+            max_item_bytes: Tamanho máximo de uma entrada
+        """
+        self.directory = Path(directory)
+        self.tmp_dir = self.directory / "tmp"
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self._lock = threading.Lock()
+        self._ready = False
+        # Ocupação na última varredura do diretório
+        self._entry_count = 0
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def _ensure_ready(self) -> None:
+        """Cria os diretórios, remove temporários abandonados e aplica o limite (chamado com o lock)"""
+        if self._ready:
+            return
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        cutoff = time.time() - _STALE_PART_SECONDS
+        for leftover in self.tmp_dir.iterdir():
+            try:
+                if leftover.stat().st_mtime < cutoff:
+                    leftover.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+        self._ready = True
+        self._enforce_limit()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """Entradas no diretório: (mtime, caminho, tamanho)"""
+        entries = []
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                if not entry.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Despejada por outro worker
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _enforce_limit(self) -> None:
+        """Remove as entradas menos usadas (de qualquer worker) até caber no limite"""
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        count = len(entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total -= size
+            count -= 1
+            self.evictions += 1
+        self._entry_count = count
+        self._total_bytes = total
+
+    def _publish(self, key: str, tmp_path: Path) -> None:
+        """Move um arquivo completo para o cache e aplica o limite"""
+        with self._lock:
+            os.replace(tmp_path, self._path(key))
+            self.writes += 1
+            self._enforce_limit()
+
+    def open(self, name: str, generation, size: Optional[int]) -> Optional[BinaryIO]:
+        """
+        Abre uma entrada do cache para leitura
+
+        Mesmo que a entrada seja despejada em seguida (por qualquer worker),
+        o descritor aberto continua válido até ser fechado.
+
+        Args:
+            name: Nome do blob
+            generation: Generation do blob (metadata atual do GCS)
+            size: Tamanho esperado (entradas com tamanho diferente são descartadas)
+
+        Returns:
+            Arquivo aberto em modo binário, ou None em caso de miss
+        """
+        if not settings.blob_cache_enabled:
+            return None
+
+        with self._lock:
+            self._ensure_ready()
+
+        path = self._path(_cache_key(name, generation))
+        try:
+            file_obj = open(path, "rb")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if size is not None and os.fstat(file_obj.fileno()).st_size != size:
+            # Validação barata contra a metadata do GCS
+            file_obj.close()
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        try:
+            os.utime(path)  # Ordem LRU compartilhada entre workers e reinícios
+        except OSError:
+            pass
+        return file_obj
+
+    def read(self, name: str, generation, size: Optional[int]) -> Optional[bytes]:
+        """
+        Lê uma entrada inteira do cache
+
+        Returns:
+            Conteúdo, ou None em caso de miss
+        """
+        file_obj = self.open(name, generation, size)
+        if file_obj is None:
+            return None
+        with file_obj:
+            return file_obj.read()
+
+    def writer(self, name: str, generation, size: int) -> Optional[CacheWriter]:
+        """
+        Cria um escritor incremental para uma entrada
+
+        Returns:
+            CacheWriter, ou None se o cache estiver desativado ou o blob for grande demais
+        """
+        if not settings.blob_cache_enabled or size is None or size > self.max_item_bytes:
+            return None
+        try:
+            with self._lock:
+                self._ensure_ready()
+            return CacheWriter(self, _cache_key(name, generation), size)
+        except OSError as e:
+            logger.warning(f"⚠️  Cache local de blobs indisponível: {e}")
+            return None
+
+    def put(self, name: str, generation, data: bytes) -> bool:
+        """
+        Armazena o conteúdo completo de um blob
+
+        Returns:
+            True se armazenado
+        """
+        writer = self.writer(name, generation, len(data))
+        if writer is None:
+            return False
+        try:
+            writer.write(data)
+            return writer.commit()
+        except OSError as e:
+            writer.abort()
+            logger.warning(f"⚠️  Falha ao gravar {name} no cache local: {e}")
+            return False
+
+    def put_file(self, name: str, generation, source_path: str) -> bool:
+        """
+        Armazena um arquivo local já existente (cópia)
+
+        Returns:
+            True se armazenado
+        """
+        writer = self.writer(name, generation, os.path.getsize(source_path))
+        if writer is None:
+            return False
+        try:
+            with open(source_path, "rb") as source:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+            return writer.commit()
+        except OSError as e:
+            writer.abort()
+            logger.warning(f"⚠️  Falha ao gravar {name} no cache local: {e}")
+            return False
+
+    def stats(self) -> Dict:
+        """
+        Retorna métricas do cache
+
+        Returns:
+            Dicionário com hits, misses, despejos e ocupação (do diretório
+            compartilhado, na última gravação deste processo)
+        """
+        return {
+            "enabled": settings.blob_cache_enabled,
+            "entries": self._entry_count,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "writes": self.writes
+        }
+
+
+# Singleton instance
+blob_cache = DiskBlobCache(
+    settings.blob_cache_dir,
+    max_bytes=settings.blob_cache_max_bytes,
+    max_item_bytes=settings.blob_cache_max_item_bytes
+)
@@ -0,0 +1,126 @@
+"""
+Cache LRU em memória com expiração (TTL)
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+import time
+
+
+class TTLCache:
+    """Cache LRU limitado por número de itens (e opcionalmente por bytes), com TTL opcional por entrada"""
+
+    def __init__(self, max_items: int, ttl_seconds: float = 0, max_bytes: int = 0):
+        """
+        Args:
+            max_items: Número máximo de entradas (LRU acima disso)
+            ttl_seconds: Tempo de vida de cada entrada (0 = sem expiração)
+            max_bytes: Soma máxima dos tamanhos informados em `set` (0 = sem limite)
+        """
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Busca uma entrada válida no cache
+
+        Args:
+            key: Chave da entrada
+
+        Returns:
+            Valor armazenado ou None se ausente/expirado
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, _ = entry
+            if expires_at and expires_at < time.monotonic():
+                # Mantida até sair pelo LRU: get_stale ainda pode servi-la
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """
+        Busca uma entrada mesmo que expirada (fallback em modo degradado)
+
+        Args:
+            key: Chave da entrada
+
+        Returns:
+            Valor armazenado ou None se ausente
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any, size: int = 0) -> bool:
+        """
+        Armazena uma entrada, removendo as menos usadas se necessário
+
+        Args:
+            key: Chave da entrada
+            value: Valor a armazenar
+            size: Tamanho estimado em bytes (conta para max_bytes)
+
+        Returns:
+            False se a entrada não cabe no cache (não armazenada)
+        """
+        if self.max_items <= 0 or (self.max_bytes and size > self.max_bytes):
+            return False
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_items or (self.max_bytes and self._bytes > self.max_bytes):
+                self._bytes -= self._data.popitem(last=False)[1][2]
+        return True
+
+    def expire_all(self) -> None:
+        """Marca todas as entradas como expiradas (continuam disponíveis em get_stale)"""
+        with self._lock:
+            for key, (value, _, size) in self._data.items():
+                self._data[key] = (value, -1.0, size)
+
+    def clear(self) -> None:
+        """Remove todas as entradas"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """
+        Retorna estatísticas de uso do cache
+
+        Returns:
+            Dicionário com tamanho, hits e misses (e bytes, se limitado por bytes)
+        """
+        stats = {
+            "size": len(self._data),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+        if self.max_bytes:
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
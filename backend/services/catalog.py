@@ -0,0 +1,312 @@
+"""
+Catálogo local de documentos indexados (SQLite)
+
+Cada ingestão concluída grava uma linha por documento: id, arquivo,
+categoria, caminho e generation no GCS, páginas, chunks e datas. O catálogo
+atende /api/documents sem listar o bucket nem consultar o Pinecone:
+filtros por categoria/data usam índices, a paginação é por keyset
+(upload_ts, document_id) e as contagens por categoria e mês saem de um
+GROUP BY sobre os mesmos índices.
+
+O banco usa WAL, então vários workers no mesmo host podem ler enquanto uma
+ingestão grava. Para preencher o catálogo com documentos já indexados, ver
+scripts/rebuild_catalog.py.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import base64
+import binascii
+import logging
+import sqlite3
+import threading
+import time
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    category TEXT NOT NULL,
+    gcs_path TEXT NOT NULL,
+    generation INTEGER,
+    file_size INTEGER,
+    content_sha256 TEXT,
+    page_count INTEGER NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    upload_ts INTEGER NOT NULL,
+    upload_month TEXT NOT NULL,
+    file_updated_ts INTEGER,
+    indexed_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_upload ON documents (upload_ts DESC, document_id DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_category_upload ON documents (category, upload_ts DESC, document_id DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_month ON documents (upload_month, category);
+CREATE INDEX IF NOT EXISTS idx_documents_gcs_path ON documents (gcs_path);
+"""
+
+_COLUMNS = (
+    "document_id", "filename", "category", "gcs_path", "generation", "file_size", "content_sha256",
+    "page_count", "chunk_count", "upload_ts", "upload_month", "file_updated_ts", "indexed_at"
+)
+
+
+class InvalidCatalogCursor(ValueError):
+    """Cursor de /api/documents malformado"""
+
+
+def _encode_cursor(upload_ts: int, document_id: str) -> str:
+    raw = f"{upload_ts}:{document_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        upload_ts, document_id = raw.split(":", 1)
+        return int(upload_ts), document_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCatalogCursor("Cursor inválido")
+
+
+class DocumentCatalog:
+    """Catálogo de documentos em SQLite (uma conexão por thread)"""
+
+    def __init__(self):
+        self.path = Path(settings.catalog_db_path)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão da thread atual (criada e migrada sob demanda)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def record(
+        self,
+        document_id: str,
+        filename: str,
+        category: str,
+        gcs_path: str,
+        page_count: int,
+        chunk_count: int,
+        upload_date: datetime,
+        generation: Optional[int] = None,
+        file_size: Optional[int] = None,
+        content_sha256: Optional[str] = None,
+        file_updated: Optional[datetime] = None
+    ) -> None:
+        """
+        Registra (ou substitui) um documento indexado
+
+        Args:
+            document_id: ID do documento (prefixo dos IDs dos chunks)
+            filename: Nome do arquivo
+            category: Categoria (valor do enum)
+            gcs_path: Caminho do PDF no GCS
+            page_count: Páginas com texto
+            chunk_count: Vetores gravados no index
+            upload_date: Data de ingestão (a mesma de upload_date/upload_ts nos chunks)
+            generation: Generation do blob no GCS
+            file_size: Tamanho do PDF em bytes
+            content_sha256: Hash do conteúdo (uploads pela API)
+            file_updated: Última modificação do blob no GCS
+        """
+        self.record_many([{
+            "document_id": document_id,
+            "filename": filename,
+            "category": category,
+            "gcs_path": gcs_path,
+            "page_count": page_count,
+            "chunk_count": chunk_count,
+            "upload_date": upload_date,
+            "generation": generation,
+            "file_size": file_size,
+            "content_sha256": content_sha256,
+            "file_updated": file_updated
+        }])
+
+    def record_many(self, rows: List[Dict]) -> int:
+        """
+        Registra vários documentos numa única transação (ex: rebuild do catálogo)
+
+        Args:
+            rows: Dicionários com os argumentos de `record`
+
+        Returns:
+            Número de documentos gravados
+        """
+        conn = self._connection()
+        with conn:
+            for row in rows:
+                upload_date = row["upload_date"]
+                file_updated = row.get("file_updated")
+                conn.execute(
+                    f"INSERT OR REPLACE INTO documents ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                    (
+                        row["document_id"], row["filename"], row["category"], row["gcs_path"],
+                        row.get("generation"), row.get("file_size"), row.get("content_sha256"),
+                        row["page_count"], row["chunk_count"], int(upload_date.timestamp()),
+                        upload_date.strftime("%Y-%m"),
+                        int(file_updated.timestamp()) if file_updated else None, int(time.time())
+                    )
+                )
+        return len(rows)
+
+    def clear(self) -> None:
+        """Remove todos os documentos (rebuild completo)"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+
+    def _where(
+        self,
+        category: Optional[str],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+    ) -> Tuple[List[str], List]:
+        """Cláusulas e parâmetros dos filtros (mesma semântica da busca: datas inclusivas)"""
+        clauses, params = [], []
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if date_from:
+            clauses.append("upload_ts >= ?")
+            params.append(int(date_from.timestamp()))
+        if date_to:
+            clauses.append("upload_ts <= ?")
+            params.append(int(date_to.timestamp()))
+        return clauses, params
+
+    def list_documents(
+        self,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Documentos mais recentes primeiro, com paginação por keyset
+
+        Args:
+            category: Filtro por categoria
+            date_from: Ingeridos a partir desta data
+            date_to: Ingeridos até esta data
+            limit: Tamanho da página
+            cursor: next_cursor da página anterior
+
+        Returns:
+            Tupla (documentos, next_cursor ou None)
+
+        Raises:
+            InvalidCatalogCursor: Cursor malformado
+        """
+        clauses, params = self._where(category, date_from, date_to)
+        if cursor:
+            upload_ts, document_id = _decode_cursor(cursor)
+            clauses.append("(upload_ts, document_id) < (?, ?)")
+            params.extend([upload_ts, document_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT * FROM documents {where} ORDER BY upload_ts DESC, document_id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]["upload_ts"], rows[-1]["document_id"])
+        return [self._to_dict(row) for row in rows], next_cursor
+
+    def facets(
+        self,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Contagens por categoria e por mês de ingestão
+
+        Cada faceta aplica os outros filtros, mas não o próprio (as contagens
+        por categoria ignoram `category`), para o frontend mostrar as opções.
+
+        Returns:
+            {"total", "category": {valor: n}, "month": {"AAAA-MM": n}}
+        """
+        conn = self._connection()
+
+        clauses, params = self._where(None, date_from, date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        by_category = {
+            row["category"]: row["n"]
+            for row in conn.execute(
+                f"SELECT category, COUNT(*) AS n FROM documents {where} GROUP BY category ORDER BY category",
+                params
+            )
+        }
+
+        clauses, params = self._where(category, date_from, date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        by_month = {
+            row["upload_month"]: row["n"]
+            for row in conn.execute(
+                f"SELECT upload_month, COUNT(*) AS n FROM documents {where} "
+                f"GROUP BY upload_month ORDER BY upload_month DESC",
+                params
+            )
+        }
+
+        return {"total": sum(by_month.values()), "category": by_category, "month": by_month}
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        """Um documento pelo ID, ou None"""
+        row = self._connection().execute(
+            "SELECT * FROM documents WHERE document_id = ?", (document_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict:
+        return {
+            "document_id": row["document_id"],
+            "filename": row["filename"],
+            "category": row["category"],
+            "gcs_path": row["gcs_path"],
+            "gcs_url": f"/api/document/{row['gcs_path']}",
+            "generation": row["generation"],
+            "file_size": row["file_size"],
+            "content_sha256": row["content_sha256"],
+            "page_count": row["page_count"],
+            "chunk_count": row["chunk_count"],
+            "upload_date": datetime.fromtimestamp(row["upload_ts"]).isoformat(),
+            "file_updated": datetime.fromtimestamp(row["file_updated_ts"]).isoformat()
+            if row["file_updated_ts"] else None
+        }
+
+    def stats(self) -> Dict:
+        """Documentos e chunks registrados"""
+        row = self._connection().execute(
+            "SELECT COUNT(*) AS documents, COALESCE(SUM(chunk_count), 0) AS chunks FROM documents"
+        ).fetchone()
+        return {"documents": row["documents"], "chunks": row["chunks"], "path": str(self.path)}
+
+
+# Singleton instance
+document_catalog = DocumentCatalog()
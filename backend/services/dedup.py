@@ -0,0 +1,497 @@
+"""
+Detecção de chunks quase duplicados (MinHash + LSH) na ingestão
+
+Os PDFs de classificados repetem avisos legais, blocos de contato e rodapés
+em todas as páginas e arquivos. Cada chunk recebe uma assinatura MinHash dos
+seus shingles (sequências de palavras); o LSH por bandas encontra candidatos
+parecidos e a similaridade de Jaccard estimada decide se são o mesmo
+"cluster". Cada fonte (gcs_path) conta uma única vez por cluster: depois
+que `dedup_max_copies` fontes diferentes gravaram o texto, chunks dele
+vindos de novas fontes não são embedados nem gravados. Reingerir uma fonte
+que já tem a cópia gravada não conta de novo e mantém os chunks.
+
+O índice de assinaturas guarda uma assinatura por cluster e é persistido
+em disco (`dedup_index_path`), valendo entre ingestões e reinícios. Vários
+workers podem compartilhar o arquivo: `save` mescla o que está em disco sob
+um lock de arquivo antes de gravar. Se o index de vetores for apagado, o
+índice precisa ser zerado (`reset`); clusters cuja cópia canônica sumiu do
+index são descartados na ingestão (`forget`).
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from backend.config import settings
+from backend.services.lexical import tokenize
+from backend.services.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SEED = 1
+_FORMAT_VERSION = 2
+
+
+def source_key(source: str) -> int:
+    """Hash de 64 bits de uma fonte (gcs_path), guardado no lugar do caminho"""
+    return int.from_bytes(hashlib.blake2b(source.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class DedupPlan:
+    """Decisão de uma ingestão: quais chunks gravar e a que cluster cada um pertence"""
+
+    def __init__(self, chunk_ids: List[str], signatures: np.ndarray, source: str):
+        self.chunk_ids = chunk_ids
+        self.signatures = signatures
+        self.source = source_key(source)
+        self.keep: List[bool] = []
+        # ("g", cluster_id) para clusters já indexados, ("n", posição) para novos
+        self.clusters: List[Tuple[str, int]] = []
+        self.skipped_tokens = 0
+        self.skipped_bytes = 0
+        # Chunk mantido só para o documento continuar encontrável (não vira cópia do cluster)
+        self.forced: Optional[int] = None
+
+    @property
+    def skipped(self) -> int:
+        return self.keep.count(False)
+
+    def apply(
+        self,
+        chunk_ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict],
+        vector_bytes: int = 0
+    ) -> Tuple[List[str], List[str], List[Dict]]:
+        """
+        Filtra os chunks do documento, contabilizando o que deixa de ser gravado
+
+        Args:
+            chunk_ids: IDs dos chunks
+            texts: Textos dos chunks
+            metadatas: Metadatas dos chunks
+            vector_bytes: Bytes de cada vetor no index
+
+        Returns:
+            Tupla (ids, textos, metadatas) só com os chunks mantidos
+        """
+        for keep, text, metadata in zip(self.keep, texts, metadatas):
+            if not keep:
+                self.skipped_tokens += estimate_tokens(text)
+                # Vetor + metadata (o texto do chunk vai na metadata)
+                self.skipped_bytes += vector_bytes + sum(
+                    len(str(key)) + len(str(value).encode("utf-8")) for key, value in metadata.items()
+                )
+        return tuple(
+            [item for item, keep in zip(column, self.keep) if keep]
+            for column in (chunk_ids, texts, metadatas)
+        )
+
+
+class _FileLock:
+    """flock exclusivo num arquivo auxiliar, liberado ao sair do bloco"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+
+
+class ChunkDeduplicator:
+    """Índice persistente de assinaturas MinHash, com LSH por bandas"""
+
+    def __init__(self):
+        self.num_perm = settings.dedup_num_perm
+        self.bands = settings.dedup_bands
+        if self.num_perm % self.bands:
+            raise ValueError("DEDUP_NUM_PERM deve ser múltiplo de DEDUP_BANDS")
+        self.rows = self.num_perm // self.bands
+        self.shingle_size = settings.dedup_shingle_size
+        self.path = settings.dedup_index_path
+
+        # Permutações fixas: assinaturas persistidas continuam comparáveis
+        rng = np.random.RandomState(_SEED)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+
+        # cluster_id -> [assinatura, id canônico, fontes, fontes com cópia gravada]
+        self._clusters: Dict[int, list] = {}
+        # Ids canônicos descartados (não voltam na mescla com o arquivo)
+        self._forgotten: Set[str] = set()
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(self.bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+        # Economia acumulada neste processo
+        self.skipped_chunks = 0
+        self.skipped_tokens = 0
+        self.skipped_bytes = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Assinatura MinHash do texto
+
+        Args:
+            text: Texto do chunk
+
+        Returns:
+            Vetor uint32 de tamanho num_perm
+        """
+        tokens = tokenize(text)
+        size = self.shingle_size
+        if len(tokens) <= size:
+            shingles = {" ".join(tokens)}
+        else:
+            shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        # Overflow em uint64 é esperado (mesma família de hashes do datasketch)
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _best_match(
+        self,
+        signature: np.ndarray,
+        keys: List[bytes],
+        buckets: List[Dict[bytes, Set[int]]],
+        lookup
+    ) -> Optional[int]:
+        """Candidato com maior similaridade estimada acima do limiar"""
+        candidates: Set[int] = set()
+        for band, key in enumerate(keys):
+            candidates.update(buckets[band].get(key, ()))
+
+        best, best_similarity = None, settings.dedup_similarity_threshold
+        for candidate in candidates:
+            similarity = float(np.mean(lookup(candidate) == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def plan(self, chunk_ids: List[str], texts: List[str], source: str) -> DedupPlan:
+        """
+        Decide quais chunks de um documento gravar (não altera o índice)
+
+        Cada fonte que gravou o texto antes desta conta uma vez; chunks
+        repetidos dentro do próprio documento também contam. Pelo menos um chunk é
+        mantido, para o documento continuar encontrável.
+
+        Args:
+            chunk_ids: IDs dos chunks
+            texts: Textos dos chunks
+            source: Fonte do documento (gcs_path)
+
+        Returns:
+            DedupPlan, a confirmar com `commit` após o upsert
+        """
+        self._ensure_loaded()
+        signatures = np.stack([self.signature(text) for text in texts]) if texts else np.empty(
+            (0, self.num_perm), np.uint32
+        )
+        plan = DedupPlan(chunk_ids, signatures, source)
+        local_buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(self.bands)]
+        occurrences: Dict[Tuple[str, int], int] = {}
+
+        with self._lock:
+            for position, signature in enumerate(signatures):
+                keys = self._band_keys(signature)
+                cluster_id = self._best_match(signature, keys, self._buckets, lambda c: self._clusters[c][0])
+                if cluster_id is not None:
+                    cluster = ("g", cluster_id)
+                    # Fontes que gravaram o texto antes desta (reingestão mantém a posição)
+                    holders = self._clusters[cluster_id][3]
+                    previous = holders.index(plan.source) if plan.source in holders else len(holders)
+                else:
+                    first = self._best_match(signature, keys, local_buckets, lambda p: signatures[p])
+                    if first is None:
+                        first = position
+                        for band, key in enumerate(keys):
+                            local_buckets[band].setdefault(key, set()).add(position)
+                    cluster = ("n", first)
+                    previous = 0
+
+                seen = occurrences.get(cluster, 0)
+                occurrences[cluster] = seen + 1
+                plan.clusters.append(cluster)
+                plan.keep.append(previous + seen < settings.dedup_max_copies)
+
+        if plan.keep and not any(plan.keep):
+            plan.keep[0] = True
+            plan.forced = 0
+        return plan
+
+    def commit(self, plan: DedupPlan) -> None:
+        """
+        Registra a fonte nos clusters de uma ingestão concluída
+
+        Args:
+            plan: Plano retornado por `plan` (chunks já gravados no index)
+        """
+        with self._lock:
+            created: Dict[int, int] = {}
+            for position, ((kind, ref), keep) in enumerate(zip(plan.clusters, plan.keep)):
+                if kind == "g":
+                    cluster_id = ref
+                    if cluster_id not in self._clusters:
+                        continue
+                elif ref in created:
+                    cluster_id = created[ref]
+                else:
+                    cluster_id = self._add_cluster(plan.signatures[ref], plan.chunk_ids[ref], set(), [])
+                    created[ref] = cluster_id
+
+                _, _, sources, holders = self._clusters[cluster_id]
+                sources.add(plan.source)
+                if keep and position != plan.forced and plan.source not in holders:
+                    holders.append(plan.source)
+
+            if len(self._clusters) > settings.dedup_max_clusters:
+                self._evict()
+
+            self.skipped_chunks += plan.skipped
+            self.skipped_tokens += plan.skipped_tokens
+            self.skipped_bytes += plan.skipped_bytes
+            self._dirty = True
+
+        if time.monotonic() - self._saved_at >= settings.dedup_save_interval:
+            self.save()
+
+    def skipping_canonicals(self, plan: DedupPlan) -> List[str]:
+        """
+        Ids canônicos dos clusters já indexados que fazem o plano pular chunks
+
+        Args:
+            plan: Plano retornado por `plan`
+
+        Returns:
+            Ids a conferir no index antes de confiar no plano
+        """
+        with self._lock:
+            return sorted({
+                self._clusters[ref][1]
+                for (kind, ref), keep in zip(plan.clusters, plan.keep)
+                if kind == "g" and not keep and ref in self._clusters
+            })
+
+    def forget(self, canonical_ids: Iterable[str]) -> int:
+        """
+        Descarta clusters cuja cópia canônica não está mais no index
+
+        Args:
+            canonical_ids: Ids canônicos ausentes do index
+
+        Returns:
+            Quantidade de clusters descartados
+        """
+        canonical_ids = set(canonical_ids)
+        with self._lock:
+            victims = [cid for cid, cluster in self._clusters.items() if cluster[1] in canonical_ids]
+            for cluster_id in victims:
+                self._remove_cluster(cluster_id)
+            self._forgotten |= canonical_ids
+            if victims:
+                self._dirty = True
+        if victims:
+            logger.warning(f"⚠️  Dedup: {len(victims)} clusters sem cópia canônica no index foram descartados")
+        return len(victims)
+
+    def reset(self) -> None:
+        """Zera o índice (memória e arquivo); usado quando o index de vetores é apagado"""
+        try:
+            with self._file_lock():
+                with self._lock:
+                    self._clear()
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+        except OSError as e:
+            logger.warning(f"⚠️  Falha ao remover índice de dedup ({self.path}): {e}")
+        logger.warning("🧹 Índice de dedup zerado")
+
+    def _clear(self) -> None:
+        self._clusters.clear()
+        self._buckets = [{} for _ in range(self.bands)]
+        self._forgotten.clear()
+        self._loaded = True
+        self._dirty = False
+
+    def _add_cluster(self, signature: np.ndarray, canonical_id: str, sources: Set[int], holders: List[int]) -> int:
+        cluster_id = self._next_id
+        self._next_id += 1
+        self._clusters[cluster_id] = [signature, canonical_id, sources, holders]
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(cluster_id)
+        return cluster_id
+
+    def _remove_cluster(self, cluster_id: int) -> None:
+        signature = self._clusters.pop(cluster_id)[0]
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(cluster_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def _merge_cluster(self, signature: np.ndarray, canonical_id: str, sources: Set[int], holders: List[int]) -> None:
+        """Une um cluster lido do disco ao equivalente em memória (ou o adiciona)"""
+        if canonical_id in self._forgotten:
+            return
+        cluster_id = self._best_match(
+            signature, self._band_keys(signature), self._buckets, lambda c: self._clusters[c][0]
+        )
+        if cluster_id is None:
+            self._add_cluster(signature, canonical_id, set(sources), list(holders))
+            return
+        cluster = self._clusters[cluster_id]
+        cluster[2] |= sources
+        cluster[3].extend(holder for holder in holders if holder not in cluster[3])
+
+    def _evict(self) -> None:
+        """Remove clusters mais antigos (primeiro os vistos uma única vez) até 90% do limite"""
+        target = int(settings.dedup_max_clusters * 0.9)
+        excess = len(self._clusters) - target
+        victims = [cid for cid, cluster in self._clusters.items() if len(cluster[2]) <= 1][:excess]
+        if len(victims) < excess:
+            chosen = set(victims)
+            victims += [cid for cid in self._clusters if cid not in chosen][:excess - len(victims)]
+        for cluster_id in victims:
+            self._remove_cluster(cluster_id)
+        logger.info(f"🧹 Dedup: {len(victims)} clusters antigos removidos do índice de assinaturas")
+
+    def _ensure_loaded(self) -> None:
+        """Carrega o índice persistido no primeiro uso"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            for cluster in self._read():
+                self._merge_cluster(*cluster)
+            if self._clusters:
+                logger.info(f"✅ Índice de dedup carregado: {len(self._clusters)} clusters")
+
+    def _read(self) -> List[Tuple[np.ndarray, str, Set[int], List[int]]]:
+        """Clusters gravados em disco (lista vazia se ausente ou incompatível)"""
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                params = tuple(int(v) for v in data["params"])
+                if params != (self.num_perm, self.bands, self.shingle_size, _SEED, _FORMAT_VERSION):
+                    logger.warning("⚠️  Índice de dedup com outros parâmetros de MinHash: descartado")
+                    return []
+                sources = np.split(data["sources"], np.cumsum(data["source_counts"])[:-1])
+                holders = np.split(data["holders"], np.cumsum(data["holder_counts"])[:-1])
+                return [
+                    (signature, str(canonical_id), set(cluster_sources.tolist()), cluster_holders.tolist())
+                    for signature, canonical_id, cluster_sources, cluster_holders in zip(
+                        data["signatures"], data["canonical_ids"], sources, holders
+                    )
+                ]
+        except Exception as e:
+            logger.warning(f"⚠️  Falha ao carregar índice de dedup ({self.path}): {e}")
+            return []
+
+    def _file_lock(self):
+        """Lock exclusivo entre processos (arquivo `.lock` ao lado do índice)"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return _FileLock(f"{self.path}.lock")
+
+    def save(self) -> None:
+        """
+        Grava o índice em disco (escrita atômica), se houver mudanças
+
+        Sob o lock de arquivo, mescla antes os clusters gravados por outros
+        workers, para que um `save` não apague o que o outro registrou.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with self._file_lock():
+                on_disk = self._read()
+                with self._lock:
+                    for cluster in on_disk:
+                        self._merge_cluster(*cluster)
+                    if len(self._clusters) > settings.dedup_max_clusters:
+                        self._evict()
+                    clusters = [(c[0], c[1], list(c[2]), list(c[3])) for c in self._clusters.values()]
+
+                signatures = np.stack([c[0] for c in clusters]) if clusters else np.empty(
+                    (0, self.num_perm), np.uint32
+                )
+                with open(tmp_path, "wb") as f:
+                    np.savez(
+                        f,
+                        params=np.array([self.num_perm, self.bands, self.shingle_size, _SEED, _FORMAT_VERSION]),
+                        signatures=signatures,
+                        canonical_ids=np.array([c[1] for c in clusters], dtype=str),
+                        sources=np.array([s for c in clusters for s in c[2]], dtype=np.int64),
+                        source_counts=np.array([len(c[2]) for c in clusters], dtype=np.int64),
+                        holders=np.array([h for c in clusters for h in c[3]], dtype=np.int64),
+                        holder_counts=np.array([len(c[3]) for c in clusters], dtype=np.int64)
+                    )
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            self._dirty = True
+            logger.warning(f"⚠️  Falha ao gravar índice de dedup: {e}")
+
+    def stats(self, top_n: int = 5) -> Dict:
+        """
+        Estado do índice e economia acumulada neste processo
+
+        Returns:
+            Clusters, clusters acima do limite de cópias, economia (chunks,
+            tokens, bytes) e os textos mais repetidos (id canônico)
+        """
+        with self._lock:
+            clusters = [(c[1], len(c[2])) for c in self._clusters.values()]
+        boilerplate = [c for c in clusters if c[1] > settings.dedup_max_copies]
+        top = sorted(boilerplate, key=lambda c: c[1], reverse=True)[:top_n]
+        return {
+            "enabled": settings.dedup_enabled,
+            "clusters": len(clusters),
+            "boilerplate_clusters": len(boilerplate),
+            "max_copies": settings.dedup_max_copies,
+            "skipped_chunks": self.skipped_chunks,
+            "skipped_tokens": self.skipped_tokens,
+            "skipped_bytes": self.skipped_bytes,
+            "top_repeated": [{"canonical_id": c[0], "sources": c[1]} for c in top]
+        }
+
+
+# Singleton instance
+chunk_deduplicator = ChunkDeduplicator()
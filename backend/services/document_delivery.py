@@ -0,0 +1,353 @@
+"""
+Entrega de PDFs do GCS para o navegador
+
+Streaming em pedaços (memória constante por visualização), suporte a
+requisições Range (206, usadas pelo PDF.js) e requisições condicionais
+(ETag/Last-Modified -> 304). PDFs presentes no cache local em disco são
+servidos direto do arquivo, sem passar pelo GCS.
+
+Com DOCUMENT_DELIVERY_MODE=redirect (ou json) a API só entrega uma URL
+assinada V4 e o navegador baixa o PDF direto do bucket.
+
+Com ?page=N, a entrega é da fatia que contém a página (ver page_slices),
+com os mesmos modos, Range e validações de cache.
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Dict, Optional, Tuple
+import logging
+import time
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from backend.config import settings
+from backend.services.gcs_client import gcs_client
+from backend.services.page_slices import page_range, page_slice_service, slice_path
+from backend.services.shared_cache import JSONCodec, SharedCache
+
+logger = logging.getLogger(__name__)
+
+
+class RangeNotSatisfiable(Exception):
+    """Range fora dos limites do arquivo"""
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um header Range de intervalo único
+
+    Args:
+        range_header: Valor do header (ex: "bytes=0-1023", "bytes=-500")
+        size: Tamanho total do arquivo
+
+    Returns:
+        Tupla (início, fim) inclusiva, ou None se o header deve ser ignorado
+
+    Raises:
+        RangeNotSatisfiable: Se o intervalo não intersecta o arquivo
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        # Múltiplos intervalos (multipart/byteranges) não são suportados: enviar tudo
+        return None
+
+    start_text, _, end_text = spec.partition("-")
+    try:
+        if start_text == "":
+            # Sufixo: últimos N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Comparação fraca de ETags (If-None-Match)"""
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class CachedFileResponse(Response):
+    """
+    Resposta a partir de um arquivo do cache local
+
+    Usa a extensão ASGI `http.response.zerocopysend` (sendfile) quando o
+    servidor a oferece; caso contrário lê o arquivo em pedaços numa thread.
+    """
+
+    def __init__(
+        self,
+        file_obj: BinaryIO,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: Dict[str, str],
+        media_type: str
+    ):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.file_obj = file_obj
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        count = self.end - self.start + 1
+        extensions = scope.get("extensions") or {}
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file_obj,
+                    "offset": self.start,
+                    "count": count
+                })
+            else:
+                chunk_size = settings.document_stream_chunk_bytes
+                await anyio.to_thread.run_sync(self.file_obj.seek, self.start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await anyio.to_thread.run_sync(self.file_obj.read, min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": b""})
+        finally:
+            self.file_obj.close()
+        if self.background is not None:
+            await self.background()
+
+
+class DocumentDeliveryService:
+    """Monta as respostas HTTP de /api/document"""
+
+    def __init__(self):
+        # URLs assinadas reaproveitadas até pouco antes de expirarem (no
+        # backend de CACHE_BACKEND, compartilhado entre workers com sqlite/redis)
+        self.signed_urls = SharedCache(
+            "signed_url",
+            max_items=settings.document_signed_url_cache_size,
+            ttl_seconds=max(1, settings.document_signed_url_ttl - settings.document_signed_url_refresh_margin),
+            codec=JSONCodec(Tuple[str, float])
+        )
+
+    async def signed_url(self, document_path: str) -> Tuple[str, float]:
+        """
+        URL assinada para o documento (do cache, ou gerada agora)
+
+        Args:
+            document_path: Caminho do PDF no bucket
+
+        Returns:
+            Tupla (URL, instante de expiração em epoch)
+        """
+        cached = await self.signed_urls.get(document_path)
+        if cached is not None:
+            return cached
+
+        ttl = settings.document_signed_url_ttl
+        expires_at = time.time() + ttl
+        url = await gcs_client.generate_signed_url(
+            document_path,
+            ttl_seconds=ttl,
+            filename=document_path.split('/')[-1]
+        )
+        await self.signed_urls.set(document_path, (url, expires_at))
+        return url, expires_at
+
+    async def build_signed_response(self, document_path: str) -> Response:
+        """
+        Responde com a URL assinada (302 ou JSON, conforme o modo)
+
+        A existência do blob não é verificada aqui (seria uma chamada ao GCS
+        por visualização); um caminho inválido resulta em 404 do próprio GCS.
+
+        Args:
+            document_path: Caminho do PDF no bucket
+
+        Returns:
+            RedirectResponse 302 ou JSONResponse com url e expires_at
+        """
+        try:
+            url, expires_at = await self.signed_url(document_path)
+        except Exception as e:
+            logger.error(f"Erro ao assinar URL do documento: {e}")
+            raise HTTPException(status_code=500, detail=f"Erro ao gerar URL do documento: {str(e)}")
+
+        # O navegador pode reaproveitar o redirecionamento enquanto a URL for válida
+        max_age = max(0, int(expires_at - time.time()) - settings.document_signed_url_refresh_margin)
+        headers = {"Cache-Control": f"private, max-age={max_age}"}
+
+        if settings.document_delivery_mode == "json":
+            return JSONResponse({"url": url, "expires_at": int(expires_at)}, headers=headers)
+        return RedirectResponse(url, status_code=302, headers=headers)
+
+    def _validators(self, blob) -> Dict[str, str]:
+        """Headers de cache derivados da generation do blob"""
+        headers = {
+            "ETag": f'"{blob.generation}"',
+            "Cache-Control": settings.document_cache_control,
+            "Accept-Ranges": "bytes",
+        }
+        if blob.updated:
+            headers["Last-Modified"] = formatdate(blob.updated.timestamp(), usegmt=True)
+        return headers
+
+    def _not_modified(self, request: Request, blob, etag: str) -> bool:
+        """Avalia If-None-Match (prioritário) e If-Modified-Since"""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag)
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and blob.updated:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(blob.updated.timestamp()) <= int(since.timestamp())
+
+        return False
+
+    async def build_response(self, document_path: str, request: Request, page: Optional[int] = None) -> Response:
+        """
+        Responde com o PDF (inteiro ou um intervalo), ou 304 se não mudou
+
+        Args:
+            document_path: Caminho do PDF no bucket
+            request: Requisição HTTP (headers Range e condicionais)
+            page: Página desejada (1-based): entrega só a fatia que a contém
+
+        Returns:
+            Response 200, 206, 304 ou 416 (302/JSON no modo de URL assinada)
+        """
+        if page is not None:
+            return await self.build_page_response(document_path, page, request)
+
+        if settings.document_delivery_mode in ("redirect", "json"):
+            return await self.build_signed_response(document_path)
+
+        try:
+            blob = await gcs_client.get_blob_metadata(document_path)
+        except Exception as e:
+            logger.error(f"Erro ao buscar documento: {e}")
+            raise HTTPException(status_code=404, detail=f"Documento não encontrado: {str(e)}")
+
+        return await self._serve_blob(blob, document_path.split('/')[-1], request)
+
+    async def build_page_response(self, document_path: str, page: int, request: Request) -> Response:
+        """
+        Responde só com a fatia do PDF que contém a página
+
+        Usa a fatia gravada na ingestão; se ainda não existir, gera a partir
+        do PDF completo (e grava para as próximas visualizações).
+
+        Args:
+            document_path: Caminho do PDF original no bucket
+            page: Página desejada (1-based)
+            request: Requisição HTTP
+
+        Returns:
+            Response com a fatia (mesmos modos de entrega do PDF inteiro)
+        """
+        first, last = page_range(page)
+        stem = document_path.split('/')[-1].removesuffix(".pdf")
+        filename = f"{stem}_p{first}.pdf" if first == last else f"{stem}_p{first}-{last}.pdf"
+
+        blob = await page_slice_service.find(document_path, page)
+        if blob is not None:
+            if settings.document_delivery_mode in ("redirect", "json"):
+                return await self.build_signed_response(slice_path(document_path, page))
+            response = await self._serve_blob(blob, filename, request)
+            response.headers["X-Page-Range"] = f"{first}-{last}"
+            return response
+
+        try:
+            content = await page_slice_service.materialize(document_path, page)
+        except Exception as e:
+            logger.error(f"Erro ao gerar fatia de página: {e}")
+            raise HTTPException(status_code=404, detail=f"Documento não encontrado: {str(e)}")
+        if content is None:
+            raise HTTPException(status_code=404, detail=f"Página {page} não existe neste documento")
+
+        # Fatia recém-gerada: sem validadores (a próxima visualização usa o blob gravado)
+        return Response(
+            content=content,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f"inline; filename={filename}",
+                "Cache-Control": settings.document_cache_control,
+                "X-Page-Range": f"{first}-{last}"
+            }
+        )
+
+    async def _serve_blob(self, blob, filename: str, request: Request) -> Response:
+        """Entrega um blob com Range, ETag/Last-Modified e leitura do cache local"""
+        headers = self._validators(blob)
+        headers["Content-Disposition"] = f"inline; filename={filename}"
+
+        if self._not_modified(request, blob, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        size = blob.size or 0
+        byte_range = None
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range.strip() == headers["ETag"]:
+            try:
+                byte_range = parse_range_header(request.headers.get("range"), size)
+            except RangeNotSatisfiable:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+
+        if byte_range is None:
+            start, end, status_code = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        headers["Content-Length"] = str(end - start + 1 if size else 0)
+
+        if size == 0:
+            return Response(content=b"", media_type="application/pdf", headers=headers)
+
+        cached = await gcs_client.open_cached(blob)
+        if cached is not None:
+            return CachedFileResponse(
+                cached,
+                start,
+                end,
+                status_code=status_code,
+                headers=headers,
+                media_type="application/pdf"
+            )
+
+        return StreamingResponse(
+            gcs_client.iter_range(blob, start, end),
+            status_code=status_code,
+            media_type="application/pdf",
+            headers=headers
+        )
+
+
+# Singleton instance
+document_delivery_service = DocumentDeliveryService()
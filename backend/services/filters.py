@@ -0,0 +1,60 @@
+"""
+Avaliação local de filtros de metadata no formato do Pinecone
+
+Usada pelo fallback lexical da busca (modo degradado) e pelo index em
+memória do modo offline.
+"""
+from typing import Dict, Optional
+
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Avalia um filtro de metadata no formato do Pinecone"""
+    if not filter:
+        return True
+
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        present = key in metadata
+        value = metadata.get(key)
+        for op, expected in condition.items():
+            if op == "$exists":
+                ok = present == bool(expected)
+            elif not present:
+                ok = op in ("$ne", "$nin")
+            elif op == "$eq":
+                ok = value == expected
+            elif op == "$ne":
+                ok = value != expected
+            elif op == "$in":
+                ok = value in expected
+            elif op == "$nin":
+                ok = value not in expected
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                # Como no Pinecone, operadores de intervalo só valem para números
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    ok = False
+                elif op == "$gt":
+                    ok = value > expected
+                elif op == "$gte":
+                    ok = value >= expected
+                elif op == "$lt":
+                    ok = value < expected
+                else:
+                    ok = value <= expected
+            else:
+                raise ValueError(f"Operador de filtro não suportado: {op}")
+            if not ok:
+                return False
+
+    return True
@@ -1,10 +1,23 @@
 """
 Cliente Google Cloud Storage
+
+A biblioteca google-cloud-storage é síncrona: todas as chamadas rodam em um
+executor dedicado para não bloquear o event loop. Blobs baixados por inteiro
+ficam em um cache LRU local em disco (blob_cache), chaveado por nome + generation.
+
+O SDK é importado e o client criado só no primeiro uso (ou no warm-up).
 """
-from google.cloud import storage
-from typing import Optional, BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, List, Optional, BinaryIO, Tuple
+import asyncio
+import hashlib
 import logging
+import threading
 from backend.config import settings
+from backend.services.blob_cache import blob_cache
+from backend.services.metrics import count_error, register_cache
 
 logger = logging.getLogger(__name__)
 
@@ -13,44 +26,206 @@ class GCSClient:
     """Cliente para interação com Google Cloud Storage"""
     
     def __init__(self):
-        # Usar Application Default Credentials (ADC) do gcloud CLI
-        # Não requer credenciais explícitas - usa gcloud auth application-default login
-        try:
-            self.client = storage.Client(project=settings.gcs_project_id)
-        except Exception:
-            # Se project_id não estiver configurado, tenta sem especificar
-            logger.warning("Inicializando GCS client sem project_id explícito")
-            self.client = storage.Client()
-        
         self.bucket_name = settings.gcs_bucket_name
-        self.bucket = self.client.bucket(self.bucket_name)
+        self.cache = blob_cache
+        register_cache("blob", blob_cache.stats)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.gcs_max_workers,
+            thread_name_prefix="gcs"
+        )
+        self._client = None
+        self._bucket = None
+        self._lock = threading.Lock()
     
-    async def upload_file(self, file_data: BinaryIO, destination_path: str) -> str:
+    @property
+    def client(self):
+        """Client do SDK (None no modo offline)"""
+        self._connect()
+        return self._client
+    
+    @property
+    def bucket(self):
+        """Bucket configurado (lazy)"""
+        self._connect()
+        return self._bucket
+    
+    def _connect(self) -> None:
+        """Cria o client e o bucket no primeiro uso"""
+        if self._bucket is not None:
+            return
+        
+        with self._lock:
+            if self._bucket is not None:
+                return
+            
+            if settings.offline_mode:
+                from backend.services.offline import LocalBucket
+                logger.warning("🧪 Modo offline: usando bucket local em disco")
+                self._bucket = LocalBucket(
+                    self.bucket_name,
+                    root=f"{settings.offline_data_dir}/gcs/{self.bucket_name}",
+                    latency_ms=settings.offline_gcs_latency_ms
+                )
+                return
+            
+            from google.cloud import storage
+            
+            # Usar Application Default Credentials (ADC) do gcloud CLI
+            # Não requer credenciais explícitas - usa gcloud auth application-default login
+            try:
+                client = storage.Client(project=settings.gcs_project_id)
+            except Exception:
+                # Se project_id não estiver configurado, tenta sem especificar
+                logger.warning("Inicializando GCS client sem project_id explícito")
+                client = storage.Client()
+            
+            self._resize_connection_pool(client)
+            self._client = client
+            self._bucket = client.bucket(self.bucket_name)
+    
+    async def connect(self) -> None:
+        """Cria o client fora do event loop (a busca de credenciais ADC bloqueia)"""
+        await self._run(self._connect)
+    
+    async def _connected_bucket(self):
+        """Bucket para os métodos async: a primeira conexão roda no executor, nunca no event loop"""
+        if self._bucket is None:
+            await self.connect()
+        return self._bucket
+    
+    def _resize_connection_pool(self, client) -> None:
+        """Ajusta o pool HTTP ao número de threads (o padrão do requests é 10)"""
+        try:
+            from requests.adapters import HTTPAdapter
+            adapter = HTTPAdapter(
+                pool_connections=settings.gcs_max_workers,
+                pool_maxsize=settings.gcs_max_workers
+            )
+            client._http.mount("https://", adapter)
+        except Exception as e:
+            logger.warning(f"Não foi possível ajustar o pool de conexões do GCS: {e}")
+    
+    async def _run(self, fn: Callable, *args, **kwargs):
+        """Executa uma chamada bloqueante do SDK no executor do GCS"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+    
+    async def upload_file(
+        self,
+        file_data: BinaryIO,
+        destination_path: str,
+        content_type: Optional[str] = None
+    ) -> str:
         """
         Upload de arquivo para GCS
         
         Args:
             file_data: Dados binários do arquivo
             destination_path: Caminho de destino no bucket
+            content_type: Content-Type do objeto (padrão: detectado pelo SDK)
             
         Returns:
             URL pública do arquivo
         """
         try:
-            blob = self.bucket.blob(destination_path)
-            blob.upload_from_file(file_data, rewind=True)
+            blob = (await self._connected_bucket()).blob(destination_path)
+            await self._run(blob.upload_from_file, file_data, rewind=True, content_type=content_type)
             
             gcs_url = f"gs://{self.bucket_name}/{destination_path}"
             logger.info(f"Arquivo enviado com sucesso: {gcs_url}")
             return gcs_url
         except Exception as e:
+            count_error("gcs", type(e).__name__)
             logger.error(f"Erro ao fazer upload para GCS: {e}")
             raise
     
+    async def upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        destination_path: str,
+        local_file: Optional[BinaryIO] = None,
+        content_type: str = "application/pdf"
+    ) -> Tuple[str, int, str]:
+        """
+        Upload resumable a partir de um fluxo de pedaços, em uma única passada
+        
+        Cada pedaço é enviado ao GCS, gravado em `local_file` (se informado) e
+        incluído no hash enquanto o próximo pedaço ainda está sendo recebido.
+        A memória usada é limitada a settings.gcs_upload_chunk_bytes.
+        
+        Args:
+            chunks: Pedaços do conteúdo (ex: MultipartFileStream.chunks())
+            destination_path: Caminho de destino no bucket
+            local_file: Arquivo local aberto para escrita (cópia para ingestão)
+            content_type: Content-Type do objeto
+            
+        Returns:
+            Tupla (URL gs://, tamanho em bytes, sha256 hexadecimal)
+        """
+        blob = (await self._connected_bucket()).blob(destination_path)
+        writer = await self._run(
+            blob.open, "wb",
+            chunk_size=settings.gcs_upload_chunk_bytes,
+            content_type=content_type
+        )
+        digest = hashlib.sha256()
+        size = 0
+        
+        def write(chunk: bytes) -> None:
+            digest.update(chunk)
+            if local_file is not None:
+                local_file.write(chunk)
+            writer.write(chunk)
+        
+        pending = None
+        try:
+            async for chunk in chunks:
+                if pending is not None:
+                    await pending
+                size += len(chunk)
+                pending = asyncio.ensure_future(self._run(write, chunk))
+            if pending is not None:
+                await pending
+                pending = None
+            # Sem close em caso de erro: a sessão resumable expira sem criar o objeto
+            await self._run(writer.close)
+        except Exception as e:
+            if pending is not None:
+                pending.cancel()
+            count_error("gcs", type(e).__name__)
+            logger.error(f"Erro no upload em streaming para GCS: {e}")
+            raise
+        
+        gcs_url = f"gs://{self.bucket_name}/{destination_path}"
+        logger.info(f"Arquivo enviado com sucesso: {gcs_url} ({size} bytes)")
+        return gcs_url, size, digest.hexdigest()
+    
+    async def seed_cache(self, path: str, local_path: str) -> bool:
+        """
+        Coloca no cache local uma cópia recém-enviada de um blob
+        
+        Args:
+            path: Caminho do arquivo no bucket
+            local_path: Arquivo local com o mesmo conteúdo
+            
+        Returns:
+            True se armazenado
+        """
+        try:
+            blob = await self.get_blob_metadata(path)
+            return await self._run(self.cache.put_file, blob.name, blob.generation, local_path)
+        except Exception as e:
+            logger.warning(f"Não foi possível pré-carregar {path} no cache local: {e}")
+            return False
+    
     async def download_file(self, source_path: str) -> bytes:
         """
         Download de arquivo do GCS
         
+        Consulta primeiro o cache local (validado pela generation e tamanho
+        atuais). Arquivos acima de settings.gcs_slice_threshold_bytes são
+        baixados em fatias de bytes paralelas, todas fixadas na mesma generation.
+        
         Args:
             source_path: Caminho do arquivo no bucket
             
@@ -58,14 +233,160 @@ class GCSClient:
             Conteúdo binário do arquivo
         """
         try:
-            blob = self.bucket.blob(source_path)
-            content = blob.download_as_bytes()
+            blob = (await self._connected_bucket()).blob(source_path)
+            await self._run(blob.reload)
+            
+            cached = await self._run(self.cache.read, blob.name, blob.generation, blob.size)
+            if cached is not None:
+                logger.info(f"Arquivo lido do cache local: {source_path}")
+                return cached
+            
+            if blob.size and blob.size > settings.gcs_slice_threshold_bytes:
+                content = await self._download_slices(blob)
+            else:
+                content = await self._run(blob.download_as_bytes, if_generation_match=blob.generation)
+            
+            await self._run(self.cache.put, blob.name, blob.generation, content)
             logger.info(f"Arquivo baixado com sucesso: {source_path}")
             return content
         except Exception as e:
+            count_error("gcs", type(e).__name__)
             logger.error(f"Erro ao fazer download do GCS: {e}")
             raise
     
+    async def _download_slices(self, blob) -> bytes:
+        """
+        Baixa um blob em intervalos de bytes paralelos
+        
+        Args:
+            blob: Blob com metadata carregada (size, generation)
+            
+        Returns:
+            Conteúdo completo do blob
+        """
+        slice_size = settings.gcs_slice_size_bytes
+        ranges = [
+            (start, min(start + slice_size, blob.size) - 1)
+            for start in range(0, blob.size, slice_size)
+        ]
+        parts = await asyncio.gather(*[
+            self._run(blob.download_as_bytes, start=start, end=end, if_generation_match=blob.generation)
+            for start, end in ranges
+        ])
+        logger.info(f"📦 {blob.name}: {blob.size / 1024 / 1024:.1f} MB em {len(ranges)} fatias paralelas")
+        return b"".join(parts)
+    
+    async def download_files(self, paths: List[str]) -> Dict[str, bytes]:
+        """
+        Baixa vários arquivos concorrentemente
+        
+        Args:
+            paths: Caminhos dos arquivos no bucket
+            
+        Returns:
+            Dicionário caminho -> conteúdo
+        """
+        semaphore = asyncio.Semaphore(settings.gcs_max_concurrent_blobs)
+        
+        async def download(path: str) -> bytes:
+            async with semaphore:
+                return await self.download_file(path)
+        
+        contents = await asyncio.gather(*[download(path) for path in paths])
+        return dict(zip(paths, contents))
+    
+    async def get_blob_metadata(self, path: str):
+        """
+        Carrega a metadata de um blob (size, generation, updated, etag)
+        
+        Args:
+            path: Caminho do arquivo no bucket
+            
+        Returns:
+            Blob com metadata carregada (NotFound se não existir)
+        """
+        blob = (await self._connected_bucket()).blob(path)
+        await self._run(blob.reload)
+        return blob
+    
+    async def open_cached(self, blob) -> Optional[BinaryIO]:
+        """
+        Abre a cópia local de um blob, se estiver no cache
+        
+        Args:
+            blob: Blob com metadata carregada (get_blob_metadata)
+            
+        Returns:
+            Arquivo aberto (o chamador fecha) ou None em caso de miss
+        """
+        return await self._run(self.cache.open, blob.name, blob.generation, blob.size)
+    
+    async def iter_range(
+        self,
+        blob,
+        start: int,
+        end: int,
+        chunk_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Lê um intervalo de bytes de um blob em pedaços, sem carregá-lo inteiro
+        
+        O próximo pedaço é baixado enquanto o atual é enviado ao cliente.
+        Quando o intervalo cobre o blob inteiro, o conteúdo também é gravado
+        no cache local (publicado só se o download terminar completo).
+        
+        Args:
+            blob: Blob com metadata carregada (get_blob_metadata)
+            start: Primeiro byte (inclusivo)
+            end: Último byte (inclusivo)
+            chunk_size: Tamanho de cada pedaço (padrão: settings.document_stream_chunk_bytes)
+            
+        Yields:
+            Pedaços do conteúdo
+        """
+        chunk_size = chunk_size or settings.document_stream_chunk_bytes
+        
+        def fetch(chunk_start: int):
+            chunk_end = min(chunk_start + chunk_size, end + 1) - 1
+            return asyncio.ensure_future(self._run(
+                blob.download_as_bytes,
+                start=chunk_start,
+                end=chunk_end,
+                if_generation_match=blob.generation
+            ))
+        
+        writer = None
+        if start == 0 and blob.size is not None and end == blob.size - 1:
+            writer = await self._run(self.cache.writer, blob.name, blob.generation, blob.size)
+        
+        position = start
+        pending = fetch(position) if position <= end else None
+        completed = False
+        try:
+            while pending is not None:
+                chunk = await pending
+                position += len(chunk)
+                pending = fetch(position) if chunk and position <= end else None
+                if writer is not None:
+                    try:
+                        await self._run(writer.write, chunk)
+                    except OSError as e:
+                        # Falha no disco local não interrompe a entrega
+                        logger.warning(f"Cache local indisponível para {blob.name}: {e}")
+                        await self._run(writer.abort)
+                        writer = None
+                yield chunk
+            completed = True
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if writer is not None:
+                try:
+                    await self._run(writer.commit if completed else writer.abort)
+                except Exception as e:
+                    # A resposta já foi (ou está sendo) enviada: o cache é só um extra
+                    logger.warning(f"Falha ao publicar {blob.name} no cache local: {e}")
+    
     async def file_exists(self, path: str) -> bool:
         """
         Verifica se um arquivo existe no GCS
@@ -77,12 +398,77 @@ class GCSClient:
             True se existe, False caso contrário
         """
         try:
-            blob = self.bucket.blob(path)
-            return blob.exists()
+            blob = (await self._connected_bucket()).blob(path)
+            return await self._run(blob.exists)
         except Exception as e:
             logger.error(f"Erro ao verificar existência do arquivo: {e}")
             return False
     
+    async def files_exist(self, paths: List[str]) -> Dict[str, bool]:
+        """
+        Verifica a existência de vários arquivos concorrentemente
+        
+        Args:
+            paths: Caminhos dos arquivos no bucket
+            
+        Returns:
+            Dicionário caminho -> existe
+        """
+        semaphore = asyncio.Semaphore(settings.gcs_max_concurrent_blobs)
+        
+        async def check(path: str) -> bool:
+            async with semaphore:
+                return await self.file_exists(path)
+        
+        results = await asyncio.gather(*[check(path) for path in paths])
+        return dict(zip(paths, results))
+    
+    def _signing_kwargs(self) -> Dict:
+        """
+        Parâmetros extras para assinar URLs sem chave privada local
+        
+        No Cloud Run as credenciais padrão não têm chave: a assinatura é feita
+        pela API IAM (signBlob) com o e-mail da service account e um token.
+        """
+        from google.auth.credentials import Signing
+        credentials = self.client._credentials
+        if isinstance(credentials, Signing):
+            return {}
+        
+        if not credentials.valid:
+            from google.auth.transport.requests import Request as AuthRequest
+            credentials.refresh(AuthRequest())
+        return {
+            "service_account_email": credentials.service_account_email,
+            "access_token": credentials.token
+        }
+    
+    async def generate_signed_url(self, path: str, ttl_seconds: int, filename: Optional[str] = None) -> str:
+        """
+        Gera uma URL assinada V4 (GET) para download direto do bucket
+        
+        Args:
+            path: Caminho do arquivo no bucket
+            ttl_seconds: Validade da URL em segundos
+            filename: Nome exibido pelo navegador (Content-Disposition inline)
+            
+        Returns:
+            URL assinada
+        """
+        blob = (await self._connected_bucket()).blob(path)
+        kwargs = {
+            "version": "v4",
+            "expiration": timedelta(seconds=ttl_seconds),
+            "method": "GET",
+            "response_type": "application/pdf"
+        }
+        if filename:
+            kwargs["response_disposition"] = f"inline; filename={filename}"
+        if self.client is not None:
+            kwargs.update(await self._run(self._signing_kwargs))
+        
+        return await self._run(blob.generate_signed_url, **kwargs)
+    
     def get_public_url(self, path: str) -> str:
         """
         Retorna URL pública do arquivo
@@ -106,8 +492,9 @@ class GCSClient:
             Lista de nomes de arquivos
         """
         try:
-            blobs = self.bucket.list_blobs(prefix=prefix)
-            return [blob.name for blob in blobs]
+            return await self._run(
+                lambda: [blob.name for blob in self.bucket.list_blobs(prefix=prefix)]
+            )
         except Exception as e:
             logger.error(f"Erro ao listar arquivos: {e}")
             raise
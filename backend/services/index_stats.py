@@ -0,0 +1,132 @@
+"""
+Snapshot das estatísticas do index com atualização em background
+
+`describe_index_stats` é uma chamada remota bloqueante (centenas de ms).
+Uma task em background atualiza o snapshot a cada intervalo e logo após
+ingestões; /api/health e /api/stats leem o snapshot em memória, com o
+horário da última atualização para indicar o quão desatualizado ele está.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+import asyncio
+import logging
+import time
+
+from backend.config import settings
+from backend.services.metrics import count_error
+from backend.services.pinecone_client import pinecone_client
+
+logger = logging.getLogger(__name__)
+
+
+class IndexStatsService:
+    """Mantém o último snapshot de describe_index_stats"""
+
+    def __init__(self):
+        self.stats: Optional[Dict] = None
+        self.refreshed_at: Optional[float] = None
+        self.refresh_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _fetch(self) -> Dict:
+        """Consulta o Pinecone em thread e guarda o resultado"""
+        start = time.perf_counter()
+        try:
+            stats = await asyncio.to_thread(pinecone_client.get_index_stats)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            count_error("pinecone", "stats")
+            raise
+        self.stats = stats
+        self.refreshed_at = time.time()
+        self.refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.last_error = None
+        return stats
+
+    async def refresh(self) -> Dict:
+        """
+        Atualiza o snapshot agora
+
+        Chamadas concorrentes compartilham a mesma consulta ao Pinecone.
+
+        Returns:
+            Estatísticas atualizadas
+
+        Raises:
+            Exception: Erro do Pinecone (o snapshot anterior é mantido)
+        """
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        return await asyncio.shield(self._inflight)
+
+    def request_refresh(self) -> None:
+        """Pede uma atualização antecipada (ex: após uma ingestão)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Loop de atualização: a cada intervalo ou quando solicitado"""
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️  Falha ao atualizar estatísticas do index: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.index_stats_refresh_interval)
+                # Agrupa ingestões em sequência em uma única consulta
+                await asyncio.sleep(settings.index_stats_refresh_debounce)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        """Inicia a task de atualização em background (idempotente)"""
+        if self._task is None and settings.index_stats_refresh_interval > 0:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancela a task de atualização"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+    def snapshot(self) -> Dict:
+        """
+        Último snapshot, sem consultar o Pinecone
+
+        Returns:
+            Estatísticas (total_vectors, dimension, index_fullness, namespaces)
+            mais refreshed_at, age_seconds, stale e last_error
+        """
+        stats = self.stats or {}
+        age = time.time() - self.refreshed_at if self.refreshed_at is not None else None
+        return {
+            "total_vectors": stats.get("total_vectors", 0),
+            "dimension": stats.get("dimension", 0),
+            "index_fullness": stats.get("index_fullness", 0),
+            "namespaces": {
+                name: {"vector_count": ns["vector_count"]}
+                for name, ns in stats.get("namespaces", {}).items()
+            },
+            "refreshed_at": datetime.fromtimestamp(self.refreshed_at).isoformat() if self.refreshed_at else None,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age > settings.index_stats_max_age,
+            "refresh_ms": self.refresh_ms,
+            "last_error": self.last_error
+        }
+
+
+# Singleton instance
+index_stats_service = IndexStatsService()
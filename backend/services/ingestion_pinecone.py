@@ -1,17 +1,23 @@
 """
 Serviço de ingestão de documentos PDF usando Pinecone
 """
-import pdfplumber
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 from io import BytesIO
 from datetime import datetime
+import asyncio
 import hashlib
+import os
 
 from backend.config import settings
 from backend.services.openai_client import openai_client
 from backend.services.gcs_client import gcs_client
 from backend.services.pinecone_client import pinecone_client
+from backend.services.ingestion_profile import IngestionProfile, ingestion_ledger
+from backend.services.dedup import chunk_deduplicator
+from backend.services.catalog import document_catalog
+from backend.services.page_slices import page_slice_service
+from backend.services.lexical import lexical_index
 from backend.models.schemas import DocumentCategory
 
 logger = logging.getLogger(__name__)
@@ -20,20 +26,23 @@ logger = logging.getLogger(__name__)
 class IngestionServicePinecone:
     """Serviço para processamento e ingestão de PDFs no Pinecone"""
     
-    def extract_text_from_pdf(self, pdf_bytes: bytes) -> List[Tuple[int, str]]:
+    def extract_text_from_pdf(self, pdf_bytes: Union[bytes, str]) -> List[Tuple[int, str]]:
         """
         Extrai texto de PDF usando pdfplumber
         
         Args:
-            pdf_bytes: Conteúdo binário do PDF
+            pdf_bytes: Conteúdo binário do PDF ou caminho de um arquivo local
             
         Returns:
             Lista de tuplas (número_página, texto)
         """
+        import pdfplumber  # Pesado: só carregado no caminho de ingestão
+        
         pages_text = []
         
         try:
-            with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+            source = pdf_bytes if isinstance(pdf_bytes, str) else BytesIO(pdf_bytes)
+            with pdfplumber.open(source) as pdf:
                 for i, page in enumerate(pdf.pages, start=1):
                     text = page.extract_text()
                     if text and text.strip():
@@ -101,11 +110,65 @@ class IngestionServicePinecone:
         hash_input = f"{filename}_{category}_{timestamp}"
         return hashlib.md5(hash_input.encode()).hexdigest()
     
+    def build_chunk_records(
+        self,
+        pages_text: List[Tuple[int, str]],
+        document_id: str,
+        filename: str,
+        category: DocumentCategory,
+        gcs_path: str,
+        upload_date: datetime,
+        metadata: Optional[Dict] = None
+    ) -> Tuple[List[str], List[str], List[Dict]]:
+        """
+        Divide as páginas em chunks e monta o id e a metadata de cada um
+        
+        Args:
+            pages_text: Lista de tuplas (número_página, texto)
+            document_id: ID do documento
+            filename: Nome do arquivo
+            category: Categoria do documento
+            gcs_path: Caminho do PDF no GCS
+            upload_date: Data de ingestão
+            metadata: Metadados adicionais (copiados em todos os chunks)
+            
+        Returns:
+            Tupla (ids, textos, metadatas), alinhadas por posição
+        """
+        # upload_ts (epoch em segundos) permite filtros $gte/$lte no Pinecone,
+        # que só aceita operadores de intervalo sobre números
+        upload_iso = upload_date.isoformat()
+        upload_ts = int(upload_date.timestamp())
+        
+        chunk_ids = []
+        all_chunks = []
+        chunk_metadatas = []
+        
+        for page_num, page_text in pages_text:
+            for i, chunk in enumerate(self.chunk_text(page_text)):
+                chunk_ids.append(f"{document_id}_page{page_num}_chunk{i}")
+                all_chunks.append(chunk)
+                chunk_metadatas.append({
+                    "document_id": document_id,
+                    "filename": filename,
+                    "category": category.value,
+                    "page_number": page_num,
+                    "chunk_index": i,
+                    "gcs_path": gcs_path,
+                    "upload_date": upload_iso,
+                    "upload_ts": upload_ts,
+                    "text": chunk,  # Pinecone: texto vai no metadata
+                    **(metadata or {})
+                })
+        
+        return chunk_ids, all_chunks, chunk_metadatas
+    
     async def ingest_pdf(
         self, 
         gcs_path: str, 
         category: DocumentCategory,
-        metadata: Dict = None
+        metadata: Dict = None,
+        local_path: Optional[str] = None
     ) -> Tuple[str, int]:
         """
         Processa e indexa um PDF do GCS no Pinecone
@@ -114,73 +177,180 @@ class IngestionServicePinecone:
             gcs_path: Caminho do PDF no GCS
             category: Categoria do documento
             metadata: Metadados adicionais
+            local_path: Cópia local do PDF (ex: recém-enviado); evita o download do GCS
             
         Returns:
             Tupla (document_id, número_de_chunks)
         """
+        profile = IngestionProfile(gcs_path)
         try:
-            # 1. Download do PDF do GCS
-            logger.info(f"Baixando PDF de: {gcs_path}")
-            pdf_bytes = await gcs_client.download_file(gcs_path)
-            
-            # 2. Extrair texto
-            logger.info("Extraindo texto do PDF...")
-            pages_text = self.extract_text_from_pdf(pdf_bytes)
-            
-            if not pages_text:
-                raise ValueError("Nenhum texto foi extraído do PDF")
-            
-            # 3. Gerar ID do documento
-            filename = gcs_path.split('/')[-1]
-            document_id = self.generate_document_id(filename, category.value)
-            
-            # 4. Processar cada página
-            all_chunks = []
-            chunk_metadatas = []
-            chunk_ids = []
-            
-            for page_num, page_text in pages_text:
-                # Dividir página em chunks
-                chunks = self.chunk_text(page_text)
-                
-                for i, chunk in enumerate(chunks):
-                    chunk_id = f"{document_id}_page{page_num}_chunk{i}"
-                    chunk_ids.append(chunk_id)
-                    all_chunks.append(chunk)
-                    
-                    chunk_metadata = {
-                        "document_id": document_id,
-                        "filename": filename,
-                        "category": category.value,
-                        "page_number": page_num,
-                        "chunk_index": i,
-                        "gcs_path": gcs_path,
-                        "upload_date": datetime.now().isoformat(),
-                        "text": chunk,  # Pinecone: texto vai no metadata
-                        **(metadata or {})
-                    }
-                    chunk_metadatas.append(chunk_metadata)
-            
-            # 5. Gerar embeddings em batch
-            logger.info(f"Gerando embeddings para {len(all_chunks)} chunks...")
-            embeddings = await openai_client.create_embeddings_batch(all_chunks)
-            
-            # 6. Preparar vetores para Pinecone
-            # Formato: [(id, embedding, metadata), ...]
-            vectors = []
-            for chunk_id, embedding, chunk_metadata in zip(chunk_ids, embeddings, chunk_metadatas):
-                vectors.append((chunk_id, embedding, chunk_metadata))
-            
-            # 7. Upsert no Pinecone
-            logger.info(f"Armazenando no Pinecone...")
-            pinecone_client.upsert_vectors(vectors)
-            
-            logger.info(f"Documento {filename} indexado com sucesso: {len(all_chunks)} chunks")
-            return document_id, len(all_chunks)
-            
+            result = await self._ingest(gcs_path, category, metadata, local_path, profile)
+            profile.finish()
+            return result
         except Exception as e:
+            profile.finish(error=e)
             logger.error(f"Erro durante ingestão: {e}")
             raise
+        finally:
+            ingestion_ledger.append(profile)
+    
+    async def _ingest(
+        self,
+        gcs_path: str,
+        category: DocumentCategory,
+        metadata: Optional[Dict],
+        local_path: Optional[str],
+        profile: IngestionProfile
+    ) -> Tuple[str, int]:
+        """Etapas da ingestão, cada uma registrada no perfil (e no ledger)"""
+        # 1. Download do PDF do GCS (ou cópia local já disponível)
+        if local_path:
+            pdf_bytes = local_path
+            profile.bytes = os.path.getsize(local_path)
+        else:
+            logger.info(f"Baixando PDF de: {gcs_path}")
+            with profile.stage("download"):
+                pdf_bytes = await gcs_client.download_file(gcs_path)
+            profile.bytes = len(pdf_bytes)
+        
+        # 2. Extrair texto
+        logger.info("Extraindo texto do PDF...")
+        # pdfplumber é CPU-bound: rodar fora do event loop
+        pages_text = await profile.run_in_thread("extract", self.extract_text_from_pdf, pdf_bytes)
+        profile.pages = len(pages_text)
+        
+        if not pages_text:
+            raise ValueError("Nenhum texto foi extraído do PDF")
+        
+        # Fatias de página (/api/document?page=N) em paralelo com as etapas seguintes
+        slices_task = None
+        if settings.page_slices_enabled:
+            slices_task = asyncio.ensure_future(page_slice_service.write_slices(gcs_path, pdf_bytes))
+        
+        # 3. Gerar ID do documento
+        filename = gcs_path.split('/')[-1]
+        document_id = self.generate_document_id(filename, category.value)
+        profile.document_id = document_id
+        
+        # 4. Dividir as páginas em chunks com metadata
+        upload_date = datetime.now()
+        with profile.stage("chunk"):
+            chunk_ids, all_chunks, chunk_metadatas = self.build_chunk_records(
+                pages_text, document_id, filename, category, gcs_path, upload_date, metadata
+            )
+        
+        # 5. Pular chunks quase duplicados (avisos, contatos, rodapés) acima do limite de cópias
+        dedup_plan = None
+        if settings.dedup_enabled:
+            dedup_plan = await profile.run_in_thread("dedup", self._plan_dedup, chunk_ids, all_chunks, gcs_path)
+            if dedup_plan.skipped:
+                chunk_ids, all_chunks, chunk_metadatas = dedup_plan.apply(
+                    chunk_ids, all_chunks, chunk_metadatas,
+                    vector_bytes=pinecone_client.dimension * 4
+                )
+                profile.dedup_skipped = dedup_plan.skipped
+                profile.dedup_saved_tokens = dedup_plan.skipped_tokens
+                profile.dedup_saved_bytes = dedup_plan.skipped_bytes
+                logger.info(f"♻️  {dedup_plan.skipped} chunks repetidos não serão gravados")
+        
+        # 6. Gerar embeddings em batch
+        logger.info(f"Gerando embeddings para {len(all_chunks)} chunks...")
+        profile.chunks = len(all_chunks)
+        usage: Dict[str, int] = {}
+        with profile.stage("embed"):
+            embeddings = await openai_client.create_embeddings_batch(all_chunks, usage=usage)
+        profile.embedding_tokens = usage.get("tokens", 0)
+        profile.embedding_requests = usage.get("requests", 0)
+        
+        # 7. Preparar vetores para Pinecone
+        # Formato: [(id, embedding, metadata), ...]
+        vectors = []
+        for chunk_id, embedding, chunk_metadata in zip(chunk_ids, embeddings, chunk_metadatas):
+            vectors.append((chunk_id, embedding, chunk_metadata))
+        
+        # 8. Upsert no Pinecone
+        logger.info(f"Armazenando no Pinecone...")
+        upsert_result = await profile.run_in_thread("upsert", pinecone_client.upsert_vectors, vectors)
+        profile.upsert_batches = upsert_result.get("batches", 0)
+        
+        # 9. Registrar as assinaturas só depois do upsert (cópias canônicas gravadas)
+        if dedup_plan is not None:
+            await asyncio.to_thread(chunk_deduplicator.commit, dedup_plan)
+        
+        # 10. Índice lexical local (fallback da busca com OpenAI/Pinecone degradados)
+        if settings.lexical_fallback_enabled:
+            await asyncio.to_thread(lexical_index.add_many, zip(chunk_ids, chunk_metadatas))
+        
+        # 11. Aguardar as fatias de página (falhas só são registradas)
+        if slices_task is not None:
+            with profile.stage("slices"):
+                await slices_task
+        
+        # 12. Catálogo local de documentos (/api/documents)
+        if settings.catalog_enabled:
+            await self._record_in_catalog(
+                document_id, filename, category, gcs_path, len(pages_text), len(all_chunks),
+                upload_date, profile.bytes, (metadata or {}).get("content_sha256")
+            )
+        
+        logger.info(f"Documento {filename} indexado com sucesso: {len(all_chunks)} chunks")
+        return document_id, len(all_chunks)
+    
+    def _plan_dedup(self, chunk_ids: List[str], texts: List[str], gcs_path: str):
+        """
+        Plano de dedup conferido no index: só pula chunks cuja cópia canônica existe
+
+        Se o index de vetores foi apagado ou reconstruído, clusters antigos
+        apontam para vetores que não existem mais; eles são descartados e o
+        plano é refeito.
+        """
+        plan = chunk_deduplicator.plan(chunk_ids, texts, gcs_path)
+        canonical_ids = chunk_deduplicator.skipping_canonicals(plan)
+        if not canonical_ids:
+            return plan
+        missing = set(canonical_ids) - pinecone_client.existing_ids(canonical_ids)
+        if not missing:
+            return plan
+        chunk_deduplicator.forget(missing)
+        return chunk_deduplicator.plan(chunk_ids, texts, gcs_path)
+    
+    async def _record_in_catalog(
+        self,
+        document_id: str,
+        filename: str,
+        category: DocumentCategory,
+        gcs_path: str,
+        page_count: int,
+        chunk_count: int,
+        upload_date: datetime,
+        file_size: int,
+        content_sha256: Optional[str]
+    ) -> None:
+        """Registra o documento no catálogo (falhas não derrubam a ingestão)"""
+        generation, file_updated = None, None
+        try:
+            blob = await gcs_client.get_blob_metadata(gcs_path)
+            generation, file_updated = blob.generation, blob.updated
+        except Exception as e:
+            logger.warning(f"⚠️  Sem metadata do GCS para o catálogo ({gcs_path}): {e}")
+        
+        try:
+            await asyncio.to_thread(
+                document_catalog.record,
+                document_id=document_id,
+                filename=filename,
+                category=category.value,
+                gcs_path=gcs_path,
+                page_count=page_count,
+                chunk_count=chunk_count,
+                upload_date=upload_date,
+                generation=generation,
+                file_size=file_size,
+                content_sha256=content_sha256,
+                file_updated=file_updated
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Falha ao registrar {document_id} no catálogo: {e}")
     
     def get_index_stats(self) -> Dict:
         """
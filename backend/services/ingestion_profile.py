@@ -0,0 +1,271 @@
+"""
+Perfil de cada ingestão e ledger de custo/throughput
+
+Cada execução de `ingest_pdf` produz um registro com tempo de parede e CPU
+por etapa (download, extract, chunk, dedup, embed, upsert), páginas, chunks,
+bytes, tokens de embedding, lotes de upsert e o que a deduplicação poupou. Os registros são anexados a um
+arquivo JSONL com rotação e podem ser agregados (/api/ingest/stats e resumo
+do indexador em massa).
+
+O tempo de CPU é medido na thread que executa a etapa: exato para etapas em
+threads dedicadas (extract, upsert); para etapas no event loop, inclui
+corrotinas concorrentes que rodaram no intervalo.
+"""
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+import asyncio
+import json
+import logging
+import time
+
+from backend.config import settings
+from backend.services.metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("download", "extract", "chunk", "dedup", "embed", "upsert", "slices")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Percentil por vizinho mais próximo"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class IngestionProfile:
+    """Perfil de uma ingestão (um documento)"""
+
+    def __init__(self, gcs_path: str):
+        self.gcs_path = gcs_path
+        self.document_id: Optional[str] = None
+        self.started_at = time.time()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.bytes = 0
+        self.pages = 0
+        self.chunks = 0
+        self.embedding_tokens = 0
+        self.embedding_requests = 0
+        self.upsert_batches = 0
+        # Chunks quase duplicados não gravados (e tokens/bytes poupados)
+        self.dedup_skipped = 0
+        self.dedup_saved_tokens = 0
+        self.dedup_saved_bytes = 0
+        self.status = "running"
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+        self.wall_s = 0.0
+
+    def _add(self, stage: str, wall: float, cpu: float) -> None:
+        entry = self.stages.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0})
+        entry["wall_s"] += wall
+        entry["cpu_s"] += cpu
+        record_stage("ingestion", stage, wall)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Mede uma etapa executada na thread atual (event loop)"""
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+    async def run_in_thread(self, name: str, fn: Callable, *args):
+        """
+        Executa uma etapa bloqueante em thread, medindo a CPU da própria thread
+
+        Returns:
+            Resultado de fn(*args)
+        """
+        cpu = 0.0
+
+        def timed():
+            nonlocal cpu
+            cpu_start = time.thread_time()
+            try:
+                return fn(*args)
+            finally:
+                cpu = time.thread_time() - cpu_start
+
+        wall_start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(timed)
+        finally:
+            self._add(name, time.perf_counter() - wall_start, cpu)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Fecha o perfil (sucesso ou erro)"""
+        self.wall_s = time.perf_counter() - self._start
+        self.status = "error" if error is not None else "ok"
+        self.error = f"{type(error).__name__}: {error}"[:300] if error is not None else None
+        record_stage("ingestion", "total", self.wall_s)
+
+    def to_dict(self) -> Dict:
+        """Registro serializável para o ledger"""
+        return {
+            "t": int(self.started_at),
+            "gcs_path": self.gcs_path,
+            "document_id": self.document_id,
+            "status": self.status,
+            "error": self.error,
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(sum(s["cpu_s"] for s in self.stages.values()), 4),
+            "stages": {
+                name: {key: round(value, 4) for key, value in values.items()}
+                for name, values in self.stages.items()
+            },
+            "bytes": self.bytes,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "embedding_tokens": self.embedding_tokens,
+            "embedding_requests": self.embedding_requests,
+            "upsert_batches": self.upsert_batches,
+            "dedup_skipped": self.dedup_skipped,
+            "dedup_saved_tokens": self.dedup_saved_tokens,
+            "dedup_saved_bytes": self.dedup_saved_bytes
+        }
+
+
+def summarize(records: List[Dict], top_n: int = 10) -> Dict:
+    """
+    Agrega registros do ledger
+
+    Args:
+        records: Registros (IngestionProfile.to_dict)
+        top_n: Número de documentos mais lentos listados
+
+    Returns:
+        Totais, throughput, estatísticas por etapa (ordenadas pelo tempo total)
+        e os documentos mais lentos
+    """
+    ok = [r for r in records if r.get("status") == "ok"]
+    wall_total = sum(r.get("wall_s", 0) for r in ok)
+
+    stages = {}
+    for name in {stage for r in records for stage in r.get("stages", {})}:
+        walls = [r["stages"][name]["wall_s"] for r in records if name in r.get("stages", {})]
+        cpus = [r["stages"][name]["cpu_s"] for r in records if name in r.get("stages", {})]
+        stages[name] = {
+            "count": len(walls),
+            "wall_total_s": round(sum(walls), 3),
+            "wall_mean_s": round(sum(walls) / len(walls), 4),
+            "wall_p50_s": round(_percentile(walls, 50), 4),
+            "wall_p95_s": round(_percentile(walls, 95), 4),
+            "cpu_total_s": round(sum(cpus), 3)
+        }
+    ranked_stages = dict(sorted(stages.items(), key=lambda item: item[1]["wall_total_s"], reverse=True))
+
+    slowest = sorted(records, key=lambda r: r.get("wall_s", 0), reverse=True)[:top_n]
+
+    return {
+        "documents": len(records),
+        "succeeded": len(ok),
+        "failed": len(records) - len(ok),
+        "totals": {
+            "bytes": sum(r.get("bytes", 0) for r in ok),
+            "pages": sum(r.get("pages", 0) for r in ok),
+            "chunks": sum(r.get("chunks", 0) for r in ok),
+            "embedding_tokens": sum(r.get("embedding_tokens", 0) for r in ok),
+            "embedding_requests": sum(r.get("embedding_requests", 0) for r in ok),
+            "upsert_batches": sum(r.get("upsert_batches", 0) for r in ok),
+            "dedup_skipped": sum(r.get("dedup_skipped", 0) for r in ok),
+            "dedup_saved_tokens": sum(r.get("dedup_saved_tokens", 0) for r in ok),
+            "dedup_saved_bytes": sum(r.get("dedup_saved_bytes", 0) for r in ok),
+            "wall_s": round(wall_total, 3),
+            "cpu_s": round(sum(r.get("cpu_s", 0) for r in ok), 3)
+        },
+        # Soma dos tempos por documento (ingestões concorrentes contam em paralelo)
+        "throughput": {
+            "pages_per_s": round(sum(r.get("pages", 0) for r in ok) / wall_total, 2) if wall_total else 0.0,
+            "chunks_per_s": round(sum(r.get("chunks", 0) for r in ok) / wall_total, 2) if wall_total else 0.0
+        },
+        "stages": ranked_stages,
+        "slowest_documents": [
+            {
+                "gcs_path": r.get("gcs_path"),
+                "wall_s": r.get("wall_s"),
+                "status": r.get("status"),
+                "pages": r.get("pages"),
+                "chunks": r.get("chunks"),
+                "slowest_stage": max(r["stages"], key=lambda s: r["stages"][s]["wall_s"]) if r.get("stages") else None
+            }
+            for r in slowest
+        ]
+    }
+
+
+class IngestionLedger:
+    """Ledger append-only dos perfis de ingestão (JSONL com rotação)"""
+
+    def __init__(self):
+        self.path = Path(settings.ingest_ledger_path)
+        self._handler: Optional[RotatingFileHandler] = None
+        # Registros deste processo (resumo do indexador em massa)
+        self.recent: Deque[Dict] = deque(maxlen=settings.ingest_ledger_recent_size)
+
+    def _get_handler(self) -> RotatingFileHandler:
+        """Abre o arquivo do ledger sob demanda"""
+        if self._handler is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._handler = RotatingFileHandler(
+                self.path,
+                maxBytes=settings.ingest_ledger_max_bytes,
+                backupCount=settings.ingest_ledger_backup_count,
+                encoding="utf-8"
+            )
+        return self._handler
+
+    def append(self, profile: IngestionProfile) -> None:
+        """
+        Registra o perfil de uma ingestão
+
+        Args:
+            profile: Perfil finalizado
+        """
+        record = profile.to_dict()
+        self.recent.append(record)
+        if not settings.ingest_ledger_enabled:
+            return
+
+        try:
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+            self._get_handler().handle(logging.makeLogRecord({"msg": line}))
+        except Exception as e:
+            # O ledger nunca deve derrubar uma ingestão
+            logger.warning(f"⚠️  Falha ao registrar ingestão no ledger: {e}")
+
+    def records(self, limit: int = 1000, since: Optional[float] = None) -> List[Dict]:
+        """
+        Lê os registros mais recentes do ledger (arquivo atual + rotacionados)
+
+        Args:
+            limit: Número máximo de registros
+            since: Só registros iniciados a partir deste epoch
+
+        Returns:
+            Registros, do mais antigo para o mais recente
+        """
+        files = [Path(f"{self.path}.{i}") for i in range(settings.ingest_ledger_backup_count, 0, -1)] + [self.path]
+        records: Deque[Dict] = deque(maxlen=limit)
+        for file_path in files:
+            if not file_path.exists():
+                continue
+            with open(file_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Linha truncada
+                    if since is None or record.get("t", 0) >= since:
+                        records.append(record)
+        return list(records)
+
+
+# Singleton instance
+ingestion_ledger = IngestionLedger()
@@ -0,0 +1,156 @@
+"""
+Índice lexical em memória (BM25) para a busca em modo degradado
+
+Quando a OpenAI ou o Pinecone estão indisponíveis não há como gerar o
+embedding ou consultar o index vetorial. Este índice guarda os chunks que
+a instância já viu (resultados de buscas e documentos ingeridos por ela) e
+responde por sobreposição de termos, no mesmo formato de resposta do
+Pinecone, para que `_process_results` seja reaproveitado.
+"""
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import math
+import re
+import threading
+import unicodedata
+
+from backend.config import settings
+from backend.services.filters import matches_filter
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# BM25
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Termos em minúsculas e sem acentos (com 2+ caracteres)"""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    return [token for token in _TOKEN.findall(normalized) if len(token) > 1]
+
+
+class LexicalIndex:
+    """Índice invertido limitado (LRU por chunk)"""
+
+    def __init__(self, max_chunks: int):
+        """
+        Args:
+            max_chunks: Número máximo de chunks mantidos (os menos recentes saem)
+        """
+        self.max_chunks = max_chunks
+        # chunk_id -> (metadata, frequência dos termos, número de termos)
+        self._chunks: "OrderedDict[str, Tuple[Dict, Counter, int]]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, chunk_id: str, metadata: Dict) -> None:
+        """
+        Indexa (ou renova) um chunk
+
+        Args:
+            chunk_id: ID do vetor no Pinecone
+            metadata: Metadata do chunk (com o campo "text")
+        """
+        if self.max_chunks <= 0:
+            return
+        with self._lock:
+            if chunk_id in self._chunks:
+                self._chunks.move_to_end(chunk_id)
+                return
+
+        terms = Counter(tokenize(metadata.get("text", "")))
+        if not terms:
+            return
+
+        with self._lock:
+            if chunk_id in self._chunks:
+                return
+            length = sum(terms.values())
+            self._chunks[chunk_id] = (metadata, terms, length)
+            self._total_length += length
+            for term in terms:
+                self._postings.setdefault(term, set()).add(chunk_id)
+            while len(self._chunks) > self.max_chunks:
+                self._evict()
+
+    def add_many(self, chunks: Iterable[Tuple[str, Dict]]) -> None:
+        """Indexa pares (chunk_id, metadata), ex: os chunks de uma ingestão"""
+        for chunk_id, metadata in chunks:
+            self.add(chunk_id, metadata)
+
+    def add_matches(self, matches: Iterable[Dict]) -> None:
+        """Indexa os matches de uma resposta do Pinecone (com metadata)"""
+        self.add_many(
+            (match["id"], match["metadata"])
+            for match in matches
+            if match.get("id") and match.get("metadata")
+        )
+
+    def _evict(self) -> None:
+        """Remove o chunk menos recente (chamado com o lock)"""
+        chunk_id, (_, terms, length) = self._chunks.popitem(last=False)
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.discard(chunk_id)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, top_k: int, filter: Optional[Dict] = None) -> Dict:
+        """
+        Busca por BM25 entre os chunks indexados
+
+        Args:
+            query: Query em linguagem natural
+            top_k: Número de resultados
+            filter: Filtro no formato do Pinecone (avaliado sobre a metadata)
+
+        Returns:
+            {"matches": [{"id", "score", "metadata"}]}, score normalizado em [0, 1]
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            total = len(self._chunks)
+            if not total or not query_terms:
+                return {"matches": []}
+            average_length = self._total_length / total
+
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id in postings:
+                    _, terms, length = self._chunks[chunk_id]
+                    frequency = terms[term]
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (_K1 + 1) / (
+                        frequency + _K1 * (1 - _B + _B * length / average_length)
+                    )
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            matches = []
+            best = ranked[0][1] if ranked else 1.0
+            for chunk_id, score in ranked:
+                metadata = self._chunks[chunk_id][0]
+                if not matches_filter(metadata, filter):
+                    continue
+                matches.append({"id": chunk_id, "score": score / best, "metadata": metadata})
+                if len(matches) >= top_k:
+                    break
+
+        return {"matches": matches}
+
+    def stats(self) -> Dict:
+        return {"chunks": len(self._chunks), "terms": len(self._postings), "max_chunks": self.max_chunks}
+
+
+# Singleton instance
+lexical_index = LexicalIndex(settings.lexical_fallback_max_chunks if settings.lexical_fallback_enabled else 0)
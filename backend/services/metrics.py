@@ -0,0 +1,274 @@
+"""
+Métricas Prometheus (/metrics) e header Server-Timing
+
+Histogramas por etapa de busca e de ingestão, latência HTTP por rota,
+contadores de erros de APIs externas e, lidos no momento do scrape, hits/misses
+dos caches e profundidade das filas. As etapas medidas durante uma requisição
+também vão para o header Server-Timing (visível no devtools do navegador).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SEARCH_STAGE_SECONDS = Histogram(
+    "agrofinder_search_stage_seconds",
+    "Duração de cada etapa da busca",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+INGESTION_STAGE_SECONDS = Histogram(
+    "agrofinder_ingestion_stage_seconds",
+    "Duração de cada etapa da ingestão de um PDF",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "agrofinder_http_request_duration_seconds",
+    "Latência das requisições HTTP",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "agrofinder_http_requests_in_flight",
+    "Requisições HTTP em andamento"
+)
+
+EXTERNAL_API_ERRORS = Counter(
+    "agrofinder_external_api_errors_total",
+    "Erros em chamadas a serviços externos",
+    ["service", "error"]
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "agrofinder_admission_rejections_total",
+    "Requisições recusadas (429) pelo controle de admissão",
+    ["route_class", "reason"]
+)
+
+HEDGED_REQUESTS = Counter(
+    "agrofinder_hedged_requests_total",
+    "Tentativas extras (hedging) enviadas e quantas responderam primeiro",
+    ["dependency", "outcome"]
+)
+
+CIRCUIT_STATE = Gauge(
+    "agrofinder_circuit_state",
+    "Estado do circuit breaker (0 = fechado, 1 = meio aberto, 2 = aberto)",
+    ["dependency"]
+)
+
+SEARCH_FALLBACKS = Counter(
+    "agrofinder_search_fallbacks_total",
+    "Buscas respondidas em modo degradado",
+    ["mode"]
+)
+
+_CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+_PIPELINES = {
+    "search": SEARCH_STAGE_SECONDS,
+    "ingestion": INGESTION_STAGE_SECONDS,
+}
+
+# Etapas medidas na requisição atual (para o Server-Timing)
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(pipeline: str, stage: str, seconds: float) -> None:
+    """
+    Registra a duração de uma etapa
+
+    Args:
+        pipeline: "search" ou "ingestion"
+        stage: Nome da etapa (ex: "embedding", "pinecone")
+        seconds: Duração em segundos
+    """
+    _PIPELINES[pipeline].labels(stage=stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str) -> Iterator[None]:
+    """Mede o bloco e registra com record_stage (também em caso de erro)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(pipeline, stage, time.perf_counter() - start)
+
+
+def count_error(service: str, error: str) -> None:
+    """
+    Conta um erro de serviço externo
+
+    Args:
+        service: "openai", "pinecone" ou "gcs"
+        error: Tipo do erro (ex: "rate_limit", nome da exceção)
+    """
+    EXTERNAL_API_ERRORS.labels(service=service, error=error).inc()
+
+
+def count_rejection(route_class: str, reason: str) -> None:
+    """
+    Conta uma requisição recusada pelo controle de admissão
+
+    Args:
+        route_class: "search" ou "ingest"
+        reason: "queue_full" ou "queue_timeout"
+    """
+    ADMISSION_REJECTIONS.labels(route_class=route_class, reason=reason).inc()
+
+
+def count_hedge(dependency: str, outcome: str) -> None:
+    """
+    Conta uma tentativa hedged
+
+    Args:
+        dependency: "openai" ou "pinecone"
+        outcome: "sent" (disparada) ou "won" (respondeu primeiro)
+    """
+    HEDGED_REQUESTS.labels(dependency=dependency, outcome=outcome).inc()
+
+
+def set_circuit_state(dependency: str, state: str) -> None:
+    """
+    Publica o estado do circuit breaker de uma dependência
+
+    Args:
+        dependency: "openai" ou "pinecone"
+        state: "closed", "half_open" ou "open"
+    """
+    CIRCUIT_STATE.labels(dependency=dependency).set(_CIRCUIT_STATES[state])
+
+
+def count_fallback(mode: str) -> None:
+    """
+    Conta uma busca respondida em modo degradado
+
+    Args:
+        mode: "stale_cache" ou "lexical"
+    """
+    SEARCH_FALLBACKS.labels(mode=mode).inc()
+
+
+class _RuntimeCollector:
+    """Lê o estado de caches e filas no momento do scrape (sem custo no caminho quente)"""
+
+    def __init__(self):
+        self.caches: Dict[str, Callable[[], Dict]] = {}
+        self.queues: Dict[str, Callable[[], int]] = {}
+
+    def collect(self):
+        requests = CounterMetricFamily(
+            "agrofinder_cache_requests",
+            "Consultas aos caches por resultado",
+            labels=["cache", "result"]
+        )
+        entries = GaugeMetricFamily(
+            "agrofinder_cache_entries",
+            "Entradas atualmente nos caches",
+            labels=["cache"]
+        )
+        for name, stats in self.caches.items():
+            data = stats()
+            requests.add_metric([name, "hit"], data.get("hits", 0))
+            requests.add_metric([name, "miss"], data.get("misses", 0))
+            entries.add_metric([name], data.get("size", data.get("entries", 0)))
+        yield requests
+        yield entries
+
+        depth = GaugeMetricFamily(
+            "agrofinder_queue_depth",
+            "Pedidos aguardando em filas internas",
+            labels=["queue"]
+        )
+        for name, size in self.queues.items():
+            depth.add_metric([name], size())
+        yield depth
+
+
+_collector = _RuntimeCollector()
+REGISTRY.register(_collector)
+
+
+def register_cache(name: str, stats: Callable[[], Dict]) -> None:
+    """
+    Expõe hits/misses de um cache
+
+    Args:
+        name: Nome do cache no label `cache`
+        stats: Função que retorna um dicionário com hits, misses e size/entries
+    """
+    _collector.caches[name] = stats
+
+
+def register_queue(name: str, depth: Callable[[], int]) -> None:
+    """
+    Expõe a profundidade de uma fila
+
+    Args:
+        name: Nome da fila no label `queue`
+        depth: Função que retorna o número de itens aguardando
+    """
+    _collector.queues[name] = depth
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Exposição no formato texto do Prometheus
+
+    Returns:
+        Tupla (corpo, content-type)
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latência por rota, requisições em andamento e Server-Timing"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+                entries.append(f"app;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _request_timings.reset(token)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code)
+            ).observe(time.perf_counter() - start)
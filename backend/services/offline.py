@@ -0,0 +1,513 @@
+"""
+Serviços substitutos locais (modo offline)
+
+Permitem rodar a API e testes de carga sem consumir cota da OpenAI, do
+Pinecone ou do GCS:
+
+- OfflineOpenAI: embeddings determinísticos por feature hashing
+- InMemoryIndex: index vetorial em memória com filtros no formato Pinecone
+- LocalBucket: bucket GCS em um diretório local
+- LocalRedis: servidor Redis em memória (CACHE_BACKEND=redis)
+
+Cada substituto tem uma latência artificial configurável, para simular o
+custo de rede dos serviços reais. Ative com OFFLINE_MODE=true.
+"""
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+
+from backend.services.filters import matches_filter
+
+EMBEDDING_DIMENSION = 1536
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def hashing_embedding(text: str, dimension: int = EMBEDDING_DIMENSION) -> List[float]:
+    """
+    Embedding determinístico por feature hashing de palavras e bigramas
+
+    Textos com vocabulário parecido ficam próximos no espaço de cosseno,
+    o suficiente para exercitar busca, rerank e deduplicação.
+
+    Args:
+        text: Texto de entrada
+        dimension: Dimensão do vetor
+
+    Returns:
+        Vetor normalizado (norma L2 = 1)
+    """
+    vector = np.zeros(dimension, dtype=np.float32)
+    words = _TOKEN.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dimension] += 1.0 if (value >> 63) & 1 else -1.0
+
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+    else:
+        vector /= norm
+    return vector.tolist()
+
+
+class _Obj:
+    """Objeto simples com atributos (imita os modelos de resposta do SDK)"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _RawEmbeddingResponse:
+    """Imita o retorno de `embeddings.with_raw_response.create`"""
+
+    def __init__(self, response: _Obj, headers: Dict[str, str]):
+        self._response = response
+        self.headers = headers
+
+    def parse(self) -> _Obj:
+        return self._response
+
+
+class _OfflineEmbeddings:
+    """Imita `AsyncOpenAI().embeddings`"""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+        self.with_raw_response = self
+        self.calls = 0
+
+    async def create(self, model: str, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+        data = [
+            _Obj(index=i, embedding=hashing_embedding(text), object="embedding")
+            for i, text in enumerate(texts)
+        ]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        response = _Obj(data=data, model=model, usage=_Obj(prompt_tokens=tokens, total_tokens=tokens))
+        return _RawEmbeddingResponse(response, headers={})
+
+
+class OfflineOpenAI:
+    """Substituto local do cliente AsyncOpenAI (somente embeddings)"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.embeddings = _OfflineEmbeddings(latency_ms / 1000)
+
+
+class InMemoryIndex:
+    """Substituto local de `pinecone.Index` (namespace padrão, métrica cosseno)"""
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, latency_ms: float = 0):
+        self.dimension = dimension
+        self.latency_seconds = latency_ms / 1000
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._metadata: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._matrix: Optional[Tuple[List[str], np.ndarray]] = None
+
+    def _delay(self) -> None:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def upsert(self, vectors: List, **kwargs) -> Dict:
+        self._delay()
+        with self._lock:
+            for item in vectors:
+                if isinstance(item, dict):
+                    vector_id, values, metadata = item["id"], item["values"], item.get("metadata")
+                else:
+                    vector_id, values, metadata = (tuple(item) + (None,))[:3]
+                vector = np.asarray(values, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                self._vectors[vector_id] = vector / norm if norm else vector
+                self._metadata[vector_id] = dict(metadata or {})
+            self._matrix = None
+        return {"upserted_count": len(vectors)}
+
+    def _get_matrix(self) -> Tuple[List[str], np.ndarray]:
+        if self._matrix is None:
+            ids = list(self._vectors)
+            matrix = np.stack([self._vectors[i] for i in ids]) if ids else np.empty((0, self.dimension), np.float32)
+            self._matrix = (ids, matrix)
+        return self._matrix
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        filter: Optional[Dict] = None,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        **kwargs
+    ) -> Dict:
+        self._delay()
+        with self._lock:
+            ids, matrix = self._get_matrix()
+            if not ids:
+                return {"matches": [], "namespace": ""}
+
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            scores = matrix @ (query / norm if norm else query)
+
+            if filter:
+                mask = np.fromiter(
+                    (matches_filter(self._metadata[i], filter) for i in ids),
+                    dtype=bool,
+                    count=len(ids)
+                )
+                scores = np.where(mask, scores, -np.inf)
+
+            order = np.argsort(-scores)[:top_k]
+            matches = []
+            for position in order:
+                if scores[position] == -np.inf:
+                    break
+                vector_id = ids[position]
+                match = {"id": vector_id, "score": float(scores[position])}
+                if include_metadata:
+                    match["metadata"] = dict(self._metadata[vector_id])
+                if include_values:
+                    match["values"] = self._vectors[vector_id].tolist()
+                matches.append(match)
+
+        return {"matches": matches, "namespace": ""}
+
+    def fetch(self, ids: List[str], **kwargs) -> Dict:
+        self._delay()
+        with self._lock:
+            vectors = {
+                vector_id: {
+                    "id": vector_id,
+                    "values": self._vectors[vector_id].tolist(),
+                    "metadata": dict(self._metadata[vector_id])
+                }
+                for vector_id in ids if vector_id in self._vectors
+            }
+        return {"vectors": vectors, "namespace": ""}
+
+    def update(self, id: str, set_metadata: Optional[Dict] = None, values: Optional[List[float]] = None, **kwargs) -> Dict:
+        self._delay()
+        with self._lock:
+            if id not in self._vectors:
+                return {}
+            if set_metadata:
+                self._metadata[id].update(set_metadata)
+            if values is not None:
+                self._vectors[id] = np.asarray(values, dtype=np.float32)
+                self._matrix = None
+        return {}
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, **kwargs) -> Dict:
+        self._delay()
+        with self._lock:
+            if delete_all:
+                self._vectors.clear()
+                self._metadata.clear()
+            else:
+                for vector_id in ids or []:
+                    self._vectors.pop(vector_id, None)
+                    self._metadata.pop(vector_id, None)
+            self._matrix = None
+        return {}
+
+    def describe_index_stats(self, **kwargs) -> Dict:
+        self._delay()
+        count = len(self._vectors)
+        return {
+            "dimension": self.dimension,
+            "index_fullness": 0.0,
+            "total_vector_count": count,
+            "namespaces": {"": {"vector_count": count}} if count else {}
+        }
+
+
+class LocalBlob:
+    """Substituto local de `google.cloud.storage.Blob`"""
+
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.size: Optional[int] = None
+        self.generation: Optional[int] = None
+        self.updated: Optional[datetime] = None
+        self.etag: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.crc32c: Optional[str] = None
+
+    @property
+    def path(self) -> Path:
+        return self.bucket.root / self.name
+
+    def _load_properties(self) -> None:
+        stat = self.path.stat()
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns // 1000
+        self.updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        self.etag = f"{self.generation:x}"
+        self.content_type = "application/pdf" if self.name.endswith(".pdf") else "application/octet-stream"
+
+    def exists(self, **kwargs) -> bool:
+        self.bucket._delay()
+        return self.path.is_file()
+
+    def reload(self, **kwargs) -> None:
+        self.bucket._delay()
+        if not self.path.is_file():
+            from google.api_core.exceptions import NotFound
+            raise NotFound(f"Blob não encontrado: {self.name}")
+        self._load_properties()
+
+    def upload_from_file(self, file_obj: BinaryIO, rewind: bool = False, **kwargs) -> None:
+        self.bucket._delay()
+        if rewind:
+            file_obj.seek(0)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = file_obj.read(1024 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+        tmp_path.replace(self.path)
+        self._load_properties()
+
+    def open(self, mode: str = "rb", **kwargs):
+        """
+        Leitura ("rb", o arquivo local) ou escrita em streaming ("wb", como o
+        BlobWriter: o objeto só aparece no close)
+        """
+        if mode == "wb":
+            return _LocalBlobWriter(self)
+        if mode != "rb":
+            raise ValueError(f"modo não suportado: {mode}")
+        self.bucket._delay()
+        if not self.path.is_file():
+            from google.api_core.exceptions import NotFound
+            raise NotFound(f"Blob não encontrado: {self.name}")
+        return open(self.path, "rb")
+
+    def upload_from_string(self, data: bytes, **kwargs) -> None:
+        from io import BytesIO
+        self.upload_from_file(BytesIO(data if isinstance(data, bytes) else data.encode()))
+
+    def generate_signed_url(self, expiration=None, **kwargs) -> str:
+        """URL local com validade (sem assinatura real)"""
+        seconds = int(expiration.total_seconds()) if expiration else 3600
+        return f"{self.path.resolve().as_uri()}?X-Goog-Expires={seconds}"
+
+    def download_as_bytes(self, start: Optional[int] = None, end: Optional[int] = None, **kwargs) -> bytes:
+        """Download completo ou de um intervalo de bytes (end inclusivo, como no GCS)"""
+        self.bucket._delay()
+        if not self.path.is_file():
+            from google.api_core.exceptions import NotFound
+            raise NotFound(f"Blob não encontrado: {self.name}")
+        with open(self.path, "rb") as f:
+            if start:
+                f.seek(start)
+            if end is not None:
+                return f.read(end - (start or 0) + 1)
+            return f.read()
+
+
+class _LocalBlobWriter:
+    """Escritor incremental de LocalBlob (arquivo temporário + rename no close)"""
+
+    def __init__(self, blob: LocalBlob):
+        self.blob = blob
+        blob.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = blob.path.with_name(blob.path.name + ".tmp")
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, data: bytes) -> int:
+        return self._file.write(data)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.blob.bucket._delay()
+        self._file.close()
+        self._tmp_path.replace(self.blob.path)
+
+
+class LocalBucket:
+    """Substituto local de `google.cloud.storage.Bucket` em um diretório"""
+
+    def __init__(self, name: str, root: str, latency_ms: float = 0):
+        self.name = name
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.latency_seconds = latency_ms / 1000
+
+    def _delay(self) -> None:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        blob = LocalBlob(self, name)
+        if not blob.exists():
+            return None
+        blob._load_properties()
+        return blob
+
+    def list_blobs(self, prefix: Optional[str] = None, **kwargs) -> List[LocalBlob]:
+        self._delay()
+        blobs = []
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.name.endswith(".tmp"):
+                continue
+            name = path.relative_to(self.root).as_posix()
+            if prefix and not name.startswith(prefix):
+                continue
+            blob = LocalBlob(self, name)
+            blob._load_properties()
+            blobs.append(blob)
+        return blobs
+
+
+class LocalRedis:
+    """
+    Substituto local de `redis.asyncio.Redis` (só os comandos usados pelo
+    backend de cache: MGET, SET com EX e INCR), em memória do processo
+    """
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_seconds = latency_ms / 1000
+        # chave -> (valor, instante de expiração em monotonic ou 0)
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+
+    async def _delay(self) -> None:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+    def _get(self, name: str) -> Optional[bytes]:
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    async def get(self, name: str) -> Optional[bytes]:
+        await self._delay()
+        return self._get(name)
+
+    async def mget(self, *names: str) -> List[Optional[bytes]]:
+        await self._delay()
+        return [self._get(name) for name in names]
+
+    async def set(self, name: str, value: bytes, ex: Optional[int] = None) -> bool:
+        await self._delay()
+        self._data[name] = (bytes(value), time.monotonic() + ex if ex else 0)
+        return True
+
+    async def incr(self, name: str) -> int:
+        await self._delay()
+        value = int(self._get(name) or 0) + 1
+        self._data[name] = (str(value).encode("ascii"), self._data.get(name, (b"", 0))[1])
+        return value
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def make_sample_pdf(pages: List[str]) -> bytes:
+    """
+    Gera um PDF mínimo com uma página de texto por item (Helvetica)
+
+    Suficiente para o pdfplumber extrair o texto, sem dependências extras.
+
+    Args:
+        pages: Texto de cada página (quebras de linha viram novas linhas)
+
+    Returns:
+        Conteúdo binário do PDF
+    """
+    def escape(line: str) -> str:
+        line = line.encode("latin-1", "replace").decode("latin-1")
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects: List[bytes] = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+
+    for text in pages:
+        lines = []
+        for paragraph in text.split("\n"):
+            # Quebra simples em ~90 caracteres por linha
+            words, current = paragraph.split(), ""
+            for word in words:
+                if len(current) + len(word) + 1 > 90:
+                    lines.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}".strip()
+            lines.append(current)
+
+        commands = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines[:70]:
+            commands.append(f"({escape(line)}) Tj T*")
+        commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1")
+
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append(
+            f"{content_id} 0 obj\n<< /Length {len(stream)} >>\nstream\n".encode("latin-1")
+            + stream + b"\nendstream\nendobj\n"
+        )
+        objects.append(
+            f"{page_id} 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>\nendobj\n".encode("latin-1")
+        )
+        page_ids.append(page_id)
+
+    header = [
+        b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n",
+        (
+            f"2 0 obj\n<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] "
+            f"/Count {len(page_ids)} >>\nendobj\n"
+        ).encode("latin-1"),
+        f"{font_id} 0 obj\n<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>\nendobj\n".encode("latin-1"),
+    ]
+
+    all_objects = header + objects
+    # Ordenar por número do objeto para a tabela xref
+    all_objects.sort(key=lambda obj: int(obj.split(b" ", 1)[0]))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj in all_objects:
+        offsets.append(len(output))
+        output += obj
+
+    xref_offset = len(output)
+    output += f"xref\n0 {len(all_objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("latin-1")
+    output += (
+        f"trailer\n<< /Size {len(all_objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+    ).encode("latin-1")
+    return bytes(output)
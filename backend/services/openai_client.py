@@ -1,86 +1,333 @@
 """
 Cliente OpenAI para embeddings e chat
+
+O SDK (openai + httpx) é importado só quando o client é criado, no primeiro
+uso ou no warm-up em background.
 """
-from openai import AsyncOpenAI
-from typing import List
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set
+from functools import partial
+import asyncio
 import logging
 from backend.config import settings
-import httpx
+from backend.services.metrics import count_error, register_queue
+from backend.services.rate_limiter import AdaptiveRateLimiter, Priority, estimate_tokens
+from backend.services.reranking import mmr_rerank
 
 logger = logging.getLogger(__name__)
 
 
+class EmbeddingBatcher:
+    """
+    Agrupa pedidos concorrentes de embedding de um único texto
+    
+    Pedidos que chegam dentro de uma janela curta (ou até atingir o máximo
+    de itens) viram uma única chamada a `embeddings.create`. Textos
+    idênticos, pendentes ou já em voo, compartilham o mesmo resultado.
+    """
+    
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        window_seconds: float,
+        max_items: int
+    ):
+        """
+        Args:
+            embed_batch: Função que gera embeddings para uma lista de textos
+            window_seconds: Tempo máximo de espera para formar um lote
+            max_items: Tamanho máximo do lote (dispara o envio imediato)
+        """
+        self._embed_batch = embed_batch
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+    
+    @property
+    def queue_depth(self) -> int:
+        """Textos aguardando o envio do próximo lote"""
+        return len(self._pending)
+    
+    async def embed(self, text: str) -> List[float]:
+        """
+        Retorna o embedding de um texto, agrupado com pedidos concorrentes
+        
+        Args:
+            text: Texto para criar embedding
+            
+        Returns:
+            Embedding do texto
+        """
+        future = self._inflight.get(text) or self._pending.get(text)
+        
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[text] = future
+            
+            if len(self._pending) >= self.max_items:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+        
+        # shield: o cancelamento de um chamador não cancela o lote compartilhado
+        return await asyncio.shield(future)
+    
+    def _flush(self) -> None:
+        """Envia os textos pendentes como um lote"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        if not self._pending:
+            return
+        
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    @staticmethod
+    def _fail(batch: Dict[str, asyncio.Future], error: BaseException) -> None:
+        """Propaga o erro para os futures do lote ainda não resolvidos"""
+        for future in batch.values():
+            if not future.done():
+                future.set_exception(error)
+                # Evita o aviso de exceção não lida se todos os chamadores desistiram
+                future.exception()
+    
+    async def _run(self, batch: Dict[str, asyncio.Future]) -> None:
+        """Executa a chamada em lote e resolve o future de cada texto"""
+        texts = list(batch)
+        try:
+            embeddings = await self._embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Lote de {len(texts)} textos retornou {len(embeddings)} embeddings")
+            for text, embedding in zip(texts, embeddings):
+                if not batch[text].done():
+                    batch[text].set_result(embedding)
+        except Exception as e:
+            self._fail(batch, e)
+        finally:
+            # Task cancelada (ex: shutdown): nenhum chamador fica esperando o timeout
+            self._fail(batch, RuntimeError("Lote de embeddings interrompido antes da resposta"))
+            for text in texts:
+                if self._inflight.get(text) is batch[text]:
+                    del self._inflight[text]
+
+
 class OpenAIClient:
     """Cliente para interação com OpenAI API"""
     
     def __init__(self):
-        # Usar AsyncOpenAI com timeout maior
-        self.client = AsyncOpenAI(
-            api_key=settings.openai_api_key,
-            timeout=httpx.Timeout(120.0, connect=30.0),  # 120s total, 30s para conectar
-            max_retries=3
-        )
+        self._client = None
         self.embedding_model = settings.openai_embedding_model
         self.chat_model = settings.openai_chat_model
+        self.rate_limiter = AdaptiveRateLimiter(
+            requests_per_minute=settings.openai_rpm_limit,
+            tokens_per_minute=settings.openai_tpm_limit,
+            max_concurrency=settings.openai_max_concurrency,
+            min_concurrency=settings.openai_min_concurrency,
+            bulk_reserve_ratio=settings.openai_bulk_reserve_ratio,
+            interactive_slots=settings.openai_interactive_slots
+        )
+        self.batcher = EmbeddingBatcher(
+            partial(self.create_embeddings_batch, priority=Priority.INTERACTIVE),
+            window_seconds=settings.embedding_batch_window_ms / 1000,
+            max_items=settings.embedding_batch_max_items
+        )
+        register_queue("embedding_batch", lambda: self.batcher.queue_depth)
+        register_queue("openai_interactive", lambda: self.rate_limiter.stats()["waiting_interactive"])
+        register_queue("openai_bulk", lambda: self.rate_limiter.stats()["waiting_bulk"])
+    
+    @property
+    def client(self):
+        """Lazy loading do client (import do SDK incluído)"""
+        if self._client is None:
+            if settings.offline_mode:
+                from backend.services.offline import OfflineOpenAI
+                logger.warning("🧪 Modo offline: usando embeddings locais (hashing)")
+                self._client = OfflineOpenAI(latency_ms=settings.offline_openai_latency_ms)
+            else:
+                from openai import AsyncOpenAI
+                import httpx
+                # Usar AsyncOpenAI com timeout maior. Os retries são feitos em _embed,
+                # coordenados com o rate limiter, e não pelo SDK
+                self._client = AsyncOpenAI(
+                    api_key=settings.openai_api_key,
+                    timeout=httpx.Timeout(120.0, connect=30.0),  # 120s total, 30s para conectar
+                    max_retries=0
+                )
+        return self._client
     
-    async def create_embedding(self, text: str) -> List[float]:
+    async def create_embedding(self, text: str, batch: bool = True) -> List[float]:
         """
         Cria embedding para um texto usando OpenAI
         
+        Com o micro-batching ativo, chamadas concorrentes são agrupadas em uma
+        única requisição à API (ver EmbeddingBatcher).
+        
         Args:
             text: Texto para criar embedding
+            batch: Usar o micro-batching (False para uma requisição própria,
+                ex: tentativa hedged, que não deve reaproveitar o lote em voo)
             
         Returns:
             Lista de floats representando o embedding
         """
+        if batch and settings.embedding_batch_enabled:
+            return await self.batcher.embed(text)
+        
         try:
             logger.info(f"🤖 Chamando OpenAI API para embedding ({len(text)} caracteres)...")
-            response = await self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
+            embeddings = await self._embed([text], Priority.INTERACTIVE)
             logger.info(f"✅ Embedding recebido da OpenAI")
-            return response.data[0].embedding
+            return embeddings[0]
         except Exception as e:
             logger.error(f"❌ Erro ao criar embedding: {e}")
             raise
     
-    async def create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    async def create_embeddings_batch(
+        self,
+        texts: List[str],
+        priority: Priority = Priority.BULK,
+        usage: Optional[Dict[str, int]] = None
+    ) -> List[List[float]]:
         """
         Cria embeddings para múltiplos textos em batch
         
+        Lotes grandes são divididos em requisições de até
+        settings.embedding_request_max_inputs textos, que passam pelo rate
+        limiter individualmente (pedidos interativos podem intercalar).
+        
         Args:
             texts: Lista de textos para criar embeddings
+            priority: Fila de prioridade (BULK para ingestão, INTERACTIVE para busca)
+            usage: Acumulador opcional de consumo ("tokens", "requests")
             
         Returns:
             Lista de embeddings
         """
         try:
             logger.info(f"🤖 Criando embeddings para {len(texts)} textos...")
-            response = await self.client.embeddings.create(
-                model=self.embedding_model,
-                input=texts
-            )
-            logger.info(f"✅ {len(response.data)} embeddings recebidos da OpenAI")
-            return [item.embedding for item in response.data]
+            step = max(1, settings.embedding_request_max_inputs)
+            parts = await asyncio.gather(*[
+                self._embed(texts[i:i + step], priority, usage)
+                for i in range(0, len(texts), step)
+            ])
+            embeddings = [embedding for part in parts for embedding in part]
+            logger.info(f"✅ {len(embeddings)} embeddings recebidos da OpenAI")
+            return embeddings
         except Exception as e:
             logger.error(f"❌ Erro ao criar embeddings em batch: {e}")
             raise
     
-    async def rerank_results(self, query: str, results: List[str]) -> List[int]:
+    async def _embed(
+        self,
+        texts: List[str],
+        priority: Priority,
+        usage: Optional[Dict[str, int]] = None
+    ) -> List[List[float]]:
         """
-        Rerank resultados usando GPT-4o (opcional, para melhorar relevância)
+        Executa uma chamada a embeddings.create sob o rate limiter
+        
+        Respostas 429 reduzem a concorrência e pausam o limitador pelo tempo
+        indicado nos headers; erros de conexão/servidor usam backoff exponencial.
         
         Args:
-            query: Query original do usuário
-            results: Lista de textos dos resultados
+            texts: Textos da requisição
+            priority: Fila de prioridade
+            usage: Acumulador opcional de consumo ("tokens", "requests")
             
         Returns:
-            Lista de índices ordenados por relevância
+            Lista de embeddings, na ordem dos textos
         """
-        # Implementação simplificada - pode ser expandida futuramente
-        # Por enquanto, retorna a ordem original
-        return list(range(len(results)))
+        from openai import APIConnectionError, InternalServerError, RateLimitError
+        
+        tokens = sum(estimate_tokens(text) for text in texts)
+        max_retries = settings.openai_max_retries
+        # Busca: timeout curto por requisição (o deadline da busca cancela antes disso)
+        request_options = {"timeout": settings.openai_interactive_timeout} if priority == Priority.INTERACTIVE else {}
+        
+        for attempt in range(max_retries + 1):
+            backoff = 0.0
+            async with self.rate_limiter.acquire(tokens, priority):
+                try:
+                    raw = await self.client.embeddings.with_raw_response.create(
+                        model=self.embedding_model,
+                        input=texts,
+                        **request_options
+                    )
+                except RateLimitError as e:
+                    count_error("openai", "rate_limit")
+                    # A pausa é aplicada pelo próprio limitador no próximo acquire
+                    self.rate_limiter.on_rate_limited(e.response.headers)
+                    if attempt == max_retries:
+                        raise
+                    continue
+                except (APIConnectionError, InternalServerError) as e:
+                    count_error("openai", type(e).__name__)
+                    if attempt == max_retries:
+                        raise
+                    backoff = min(8.0, 0.5 * 2 ** attempt)
+                    logger.warning(f"⚠️  Falha temporária na OpenAI ({type(e).__name__}), nova tentativa em {backoff:.1f}s")
+                else:
+                    self.rate_limiter.on_success(raw.headers)
+                    response = raw.parse()
+                    if usage is not None:
+                        usage["tokens"] = usage.get("tokens", 0) + response.usage.total_tokens
+                        usage["requests"] = usage.get("requests", 0) + 1
+                    if len(response.data) != len(texts):
+                        raise ValueError(
+                            f"OpenAI retornou {len(response.data)} embeddings para {len(texts)} textos"
+                        )
+                    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            
+            await asyncio.sleep(backoff)
+        
+        raise RuntimeError("Número máximo de tentativas excedido")  # inalcançável
+    
+    async def rerank_results(
+        self,
+        query_embedding: List[float],
+        candidate_embeddings: Sequence[Sequence[float]],
+        top_k: int,
+        lambda_mult: Optional[float] = None,
+        dedup_threshold: Optional[float] = None
+    ) -> List[int]:
+        """
+        Rerank local dos candidatos por Maximal Marginal Relevance (sem LLM)
+        
+        Equilibra relevância e diversidade e remove chunks quase duplicados,
+        usando os embeddings já retornados pelo Pinecone (include_values=True).
+        
+        Args:
+            query_embedding: Embedding da query
+            candidate_embeddings: Embeddings dos candidatos, em ordem de score
+                (de preferência a matriz float32 de `query(values_matrix=True)`)
+            top_k: Número de resultados a manter
+            lambda_mult: Peso da relevância (padrão: settings.rerank_lambda)
+            dedup_threshold: Limiar de cosseno para duplicatas (padrão: settings.rerank_dedup_threshold)
+            
+        Returns:
+            Lista de índices dos candidatos, ordenados pelo rerank
+        """
+        if lambda_mult is None:
+            lambda_mult = settings.rerank_lambda
+        if dedup_threshold is None:
+            dedup_threshold = settings.rerank_dedup_threshold
+        
+        return mmr_rerank(
+            query_embedding,
+            candidate_embeddings,
+            top_k=top_k,
+            lambda_mult=lambda_mult,
+            dedup_threshold=dedup_threshold
+        )
 
 
 # Singleton instance
@@ -0,0 +1,173 @@
+"""
+Fatias de página dos PDFs (um PDF pequeno por página ou grupo de páginas)
+
+Cada resultado de busca aponta para uma página, mas o PDF original pode
+ter dezenas de MB. Com PAGE_SLICES_ENABLED, a ingestão grava no bucket uma
+fatia por grupo de PAGE_SLICE_PAGES páginas, sob o prefixo
+PAGE_SLICE_PREFIX espelhando o caminho original:
+
+    pdfs/anuncio/catalogo.pdf  ->  _pages/pdfs/anuncio/catalogo.pdf/0003.pdf
+
+e /api/document/{path}?page=N entrega só a fatia. Documentos sem fatias
+(indexados antes, ou com a opção desligada) têm a fatia gerada na primeira
+visualização a partir do PDF completo e gravada em background.
+
+O corte usa pypdf, importado só ao gerar ou ler fatias: instâncias que
+só buscam não pagam o import no cold start.
+"""
+from io import BytesIO
+from typing import List, Optional, Set, Tuple, Union
+import asyncio
+import logging
+
+from backend.config import settings
+from backend.services.gcs_client import gcs_client
+
+logger = logging.getLogger(__name__)
+
+
+def page_range(page: int) -> Tuple[int, int]:
+    """Primeira e última página (1-based) da fatia que contém `page`"""
+    size = max(1, settings.page_slice_pages)
+    first = (page - 1) // size * size + 1
+    return first, first + size - 1
+
+
+def slice_path(gcs_path: str, page: int) -> str:
+    """Caminho no bucket da fatia que contém `page`"""
+    first, _ = page_range(page)
+    return f"{settings.page_slice_prefix.strip('/')}/{gcs_path}/{first:04d}.pdf"
+
+
+def is_page_slice(blob_name: str) -> bool:
+    """Se o blob é uma fatia (ex: para não indexá-la como documento)"""
+    return blob_name.startswith(settings.page_slice_prefix.strip("/") + "/")
+
+
+def _reader(pdf: Union[bytes, str]):
+    from pypdf import PdfReader  # Pesado: só carregado ao cortar PDFs
+    return PdfReader(BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf)
+
+
+def _write(reader, first: int, last: int) -> bytes:
+    """PDF só com as páginas [first, last] (1-based, inclusivas)"""
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    for index in range(first - 1, min(last, len(reader.pages))):
+        writer.add_page(reader.pages[index])
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def split_pdf(pdf: Union[bytes, str]) -> List[Tuple[int, bytes]]:
+    """
+    Corta o PDF em fatias de PAGE_SLICE_PAGES páginas (CPU-bound)
+
+    Args:
+        pdf: Conteúdo do PDF ou caminho de um arquivo local
+
+    Returns:
+        Lista de (primeira página, conteúdo da fatia)
+    """
+    reader = _reader(pdf)
+    size = max(1, settings.page_slice_pages)
+    return [
+        (first, _write(reader, first, first + size - 1))
+        for first in range(1, len(reader.pages) + 1, size)
+    ]
+
+
+def extract_slice(pdf: Union[bytes, str], page: int) -> Optional[bytes]:
+    """
+    Fatia que contém `page`, ou None se a página não existe (CPU-bound)
+    """
+    reader = _reader(pdf)
+    if page > len(reader.pages):
+        return None
+    first, last = page_range(page)
+    return _write(reader, first, last)
+
+
+class PageSliceService:
+    """Gravação e leitura das fatias de página no bucket"""
+
+    def __init__(self):
+        # Gravações em background (fatias geradas sob demanda)
+        self._pending: Set[asyncio.Task] = set()
+
+    async def _upload(self, gcs_path: str, first: int, content: bytes) -> None:
+        await gcs_client.upload_file(BytesIO(content), slice_path(gcs_path, first), content_type="application/pdf")
+
+    async def write_slices(self, gcs_path: str, pdf: Union[bytes, str]) -> int:
+        """
+        Gera e grava todas as fatias de um PDF (ingestão)
+
+        Falhas são registradas e não interrompem a ingestão: a fatia
+        ausente é gerada na primeira visualização.
+
+        Args:
+            gcs_path: Caminho do PDF original no bucket
+            pdf: Conteúdo do PDF ou caminho de um arquivo local
+
+        Returns:
+            Número de fatias gravadas
+        """
+        try:
+            slices = await asyncio.to_thread(split_pdf, pdf)
+            semaphore = asyncio.Semaphore(settings.gcs_max_concurrent_blobs)
+
+            async def upload(first: int, content: bytes) -> None:
+                async with semaphore:
+                    await self._upload(gcs_path, first, content)
+
+            await asyncio.gather(*[upload(first, content) for first, content in slices])
+            logger.info(f"📑 {len(slices)} fatias de página gravadas para {gcs_path}")
+            return len(slices)
+        except Exception as e:
+            logger.warning(f"⚠️  Falha ao gravar fatias de página de {gcs_path}: {e}")
+            return 0
+
+    async def find(self, gcs_path: str, page: int):
+        """
+        Blob da fatia que contém `page`, se já existir
+
+        Returns:
+            Blob com metadata carregada, ou None
+        """
+        try:
+            return await gcs_client.get_blob_metadata(slice_path(gcs_path, page))
+        except Exception:
+            return None
+
+    async def materialize(self, gcs_path: str, page: int) -> Optional[bytes]:
+        """
+        Gera a fatia a partir do PDF completo e a grava em background
+
+        Args:
+            gcs_path: Caminho do PDF original no bucket
+            page: Página solicitada (1-based)
+
+        Returns:
+            Conteúdo da fatia, ou None se a página não existe
+
+        Raises:
+            Exception: PDF original ausente ou ilegível
+        """
+        pdf_bytes = await gcs_client.download_file(gcs_path)
+        content = await asyncio.to_thread(extract_slice, pdf_bytes, page)
+        if content is not None:
+            first, _ = page_range(page)
+            task = asyncio.ensure_future(self._upload(gcs_path, first, content))
+            self._pending.add(task)
+            task.add_done_callback(self._upload_done)
+        return content
+
+    def _upload_done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️  Falha ao gravar fatia de página sob demanda: {task.exception()}")
+
+
+# Singleton instance
+page_slice_service = PageSliceService()
@@ -1,13 +1,21 @@
 """
 Cliente Pinecone para vector search
+
+O SDK só é importado e o client só é criado no primeiro uso (ou pelo
+warm-up em background), para não pesar no cold start da API.
 """
-from pinecone import Pinecone, ServerlessSpec
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Optional, Set
+import asyncio
 import logging
 from datetime import datetime
+import threading
 import time
 
 from backend.config import settings
+from backend.services.metrics import count_error
+from backend.services.reranking import to_matrix
 
 logger = logging.getLogger(__name__)
 
@@ -16,43 +24,74 @@ class PineconeClient:
     """Cliente para interação com Pinecone Vector Database"""
     
     def __init__(self):
-        """Inicializa cliente Pinecone"""
-        try:
-            logger.info(f"🔌 Inicializando Pinecone client para região: {settings.pinecone_environment}")
-            self.pc = Pinecone(api_key=settings.pinecone_api_key)
-            self.index_name = settings.pinecone_index_name
-            self.dimension = 1536  # OpenAI text-embedding-3-small
-            self._index = None
-            logger.info("✅ Pinecone client inicializado")
-        except Exception as e:
-            logger.error(f"❌ Erro ao inicializar Pinecone: {e}")
-            raise
+        """Prepara o cliente Pinecone (conexão criada sob demanda)"""
+        self.index_name = settings.pinecone_index_name
+        self.dimension = 1536  # OpenAI text-embedding-3-small
+        self._pc = None
+        self._index = None
+        self._lock = threading.Lock()
+        # Queries da busca não disputam threads com a ingestão (pdfplumber, upserts)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.pinecone_max_workers,
+            thread_name_prefix="pinecone"
+        )
+        
+        if settings.offline_mode:
+            from backend.services.offline import InMemoryIndex
+            logger.warning("🧪 Modo offline: usando index vetorial em memória")
+            self._index = InMemoryIndex(self.dimension, latency_ms=settings.offline_pinecone_latency_ms)
+    
+    @property
+    def pc(self):
+        """Lazy loading do client (import do SDK incluído)"""
+        if self._pc is None and not settings.offline_mode:
+            with self._lock:
+                if self._pc is None:
+                    try:
+                        from pinecone import Pinecone
+                        logger.info(f"🔌 Inicializando Pinecone client para região: {settings.pinecone_environment}")
+                        self._pc = Pinecone(api_key=settings.pinecone_api_key)
+                        logger.info("✅ Pinecone client inicializado")
+                    except Exception as e:
+                        logger.error(f"❌ Erro ao inicializar Pinecone: {e}")
+                        raise
+        return self._pc
     
     @property
     def index(self):
         """Lazy loading do index"""
         if self._index is None:
-            # Verificar se index existe, senão criar
-            existing_indexes = self.pc.list_indexes()
-            
-            if self.index_name not in [idx['name'] for idx in existing_indexes]:
-                logger.info(f"Criando index Pinecone: {self.index_name}")
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=self.dimension,
-                    metric='cosine',
-                    spec=ServerlessSpec(
-                        cloud='aws',
-                        region='us-east-1'
-                    )
-                )
-                logger.info(f"Index {self.index_name} criado com sucesso")
-            
-            self._index = self.pc.Index(self.index_name)
-            logger.info(f"Conectado ao index: {self.index_name}")
+            pc = self.pc
+            with self._lock:
+                if self._index is None:
+                    self._index = self._connect_index(pc)
         
         return self._index
     
+    def _connect_index(self, pc):
+        """Obtém o handle do index, criando-o se não existir"""
+        from pinecone import ServerlessSpec
+        
+        # Verificar se index existe, senão criar
+        existing_indexes = pc.list_indexes()
+        
+        if self.index_name not in [idx['name'] for idx in existing_indexes]:
+            logger.info(f"Criando index Pinecone: {self.index_name}")
+            pc.create_index(
+                name=self.index_name,
+                dimension=self.dimension,
+                metric='cosine',
+                spec=ServerlessSpec(
+                    cloud='aws',
+                    region='us-east-1'
+                )
+            )
+            logger.info(f"Index {self.index_name} criado com sucesso")
+        
+        index = pc.Index(self.index_name)
+        logger.info(f"Conectado ao index: {self.index_name}")
+        return index
+    
     def upsert_vectors(
         self,
         vectors: List[tuple]
@@ -60,17 +99,27 @@ class PineconeClient:
         """
         Insere ou atualiza vetores no Pinecone
         
+        Envia lotes de até settings.pinecone_upsert_batch_size vetores
+        (o Pinecone limita o tamanho de cada requisição).
+        
         Args:
             vectors: Lista de tuplas (id, embedding, metadata)
             
         Returns:
-            Resposta do Pinecone
+            Dicionário com upserted_count e batches
         """
         try:
-            response = self.index.upsert(vectors=vectors)
-            logger.info(f"Upsert de {len(vectors)} vetores realizado com sucesso")
-            return response
+            step = max(1, settings.pinecone_upsert_batch_size)
+            upserted = 0
+            batches = 0
+            for i in range(0, len(vectors), step):
+                response = self.index.upsert(vectors=vectors[i:i + step])
+                upserted += response.get("upserted_count", 0) or 0
+                batches += 1
+            logger.info(f"Upsert de {len(vectors)} vetores realizado com sucesso ({batches} lote(s))")
+            return {"upserted_count": upserted, "batches": batches}
         except Exception as e:
+            count_error("pinecone", type(e).__name__)
             logger.error(f"Erro ao fazer upsert no Pinecone: {e}")
             raise
     
@@ -80,7 +129,9 @@ class PineconeClient:
         top_k: int = 10,
         filter: Optional[Dict] = None,
         include_metadata: bool = True,
-        timeout: int = 30
+        include_values: bool = False,
+        timeout: float = 30,
+        values_matrix: bool = False
     ) -> Dict:
         """
         Busca vetores similares no Pinecone
@@ -90,10 +141,15 @@ class PineconeClient:
             top_k: Número de resultados
             filter: Filtros de metadata
             include_metadata: Se deve incluir metadata nos resultados
+            include_values: Se deve incluir os vetores (necessário para o rerank)
             timeout: Timeout em segundos
+            values_matrix: Com include_values, empacotar os vetores numa matriz
+                float32 nesta thread (junto da desserialização da resposta),
+                em vez de deixar a conversão das listas para o rerank
             
         Returns:
-            Resultados da busca
+            Resultados da busca (com values_matrix: {"matches", "values_matrix"},
+            matriz (n, d) na ordem dos matches)
         """
         try:
             logger.info(f"🔍 Iniciando query no Pinecone (top_k={top_k})...")
@@ -104,16 +160,52 @@ class PineconeClient:
                 top_k=top_k,
                 filter=filter,
                 include_metadata=include_metadata,
-                include_values=False  # Não precisamos dos vetores de volta
+                include_values=include_values,
+                _request_timeout=timeout
             )
             
+            if include_values and values_matrix:
+                matches = results.get("matches", [])
+                results = {"matches": matches, "values_matrix": to_matrix([match.get("values") for match in matches])}
+            
             elapsed = time.time() - start_time
             logger.info(f"✅ Query retornou {len(results.get('matches', []))} resultados em {elapsed:.2f}s")
             return results
         except Exception as e:
+            count_error("pinecone", type(e).__name__)
             logger.error(f"❌ Erro ao fazer query no Pinecone: {type(e).__name__}: {str(e)}")
             raise
     
+    async def query_async(self, **kwargs) -> Dict:
+        """
+        Executa `query` no executor dedicado, sem bloquear o event loop
+        
+        Args:
+            **kwargs: Mesmos argumentos de query
+            
+        Returns:
+            Resultados da busca
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.query, **kwargs))
+    
+    def update_metadata(self, vector_id: str, metadata: Dict) -> Dict:
+        """
+        Atualiza campos de metadata de um vetor, sem alterar o embedding
+        
+        Args:
+            vector_id: ID do vetor
+            metadata: Campos a definir/sobrescrever
+            
+        Returns:
+            Resposta do Pinecone
+        """
+        try:
+            return self.index.update(id=vector_id, set_metadata=metadata)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar metadata de {vector_id}: {e}")
+            raise
+    
     def delete(self, ids: List[str]) -> Dict:
         """
         Deleta vetores por ID
@@ -132,10 +224,30 @@ class PineconeClient:
             logger.error(f"Erro ao deletar do Pinecone: {e}")
             raise
     
+    def existing_ids(self, ids: List[str], batch_size: int = 100) -> Set[str]:
+        """
+        IDs que existem no index (fetch em lotes)
+        
+        Args:
+            ids: IDs a conferir
+            batch_size: IDs por requisição de fetch
+            
+        Returns:
+            Subconjunto de `ids` presente no index
+        """
+        found: Set[str] = set()
+        for i in range(0, len(ids), batch_size):
+            response = self.index.fetch(ids=ids[i:i + batch_size])
+            found.update(response["vectors"].keys())
+        return found
+    
     def delete_all(self, namespace: Optional[str] = None) -> Dict:
         """
         Deleta todos os vetores (use com cuidado!)
         
+        O índice de dedup também é zerado: as cópias canônicas que ele
+        referencia deixam de existir.
+        
         Args:
             namespace: Namespace específico (opcional)
             
@@ -145,6 +257,8 @@ class PineconeClient:
         try:
             response = self.index.delete(delete_all=True, namespace=namespace or "")
             logger.warning("Todos os vetores foram deletados do index")
+            from backend.services.dedup import chunk_deduplicator
+            chunk_deduplicator.reset()
             return response
         except Exception as e:
             logger.error(f"Erro ao deletar todos os vetores: {e}")
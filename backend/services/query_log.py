@@ -0,0 +1,133 @@
+"""
+Log de queries de busca (append-only, com rotação)
+
+Cada linha é um JSON compacto:
+{"t": 1718000000, "q": "trator usado", "f": {"top_k": 10}, "ms": 412.3, "ids": ["..."]}
+
+A escrita e a rotação do arquivo rodam numa thread (QueueListener): a busca
+só enfileira a linha, sem I/O de disco no event loop.
+"""
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import logging
+import queue
+import threading
+import time
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLog:
+    """Registro compacto das buscas realizadas, usado no warm-up de instâncias"""
+
+    def __init__(self):
+        self.path = Path(settings.query_log_path)
+        self._handler: Optional[QueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+        self._lock = threading.Lock()
+
+    def _get_handler(self) -> QueueHandler:
+        """Abre o arquivo de log e inicia a thread de escrita sob demanda"""
+        if self._handler is None:
+            with self._lock:
+                if self._handler is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    file_handler = RotatingFileHandler(
+                        self.path,
+                        maxBytes=settings.query_log_max_bytes,
+                        backupCount=settings.query_log_backup_count,
+                        encoding="utf-8"
+                    )
+                    records: queue.SimpleQueue = queue.SimpleQueue()
+                    self._listener = QueueListener(records, file_handler)
+                    self._listener.start()
+                    self._handler = QueueHandler(records)
+        return self._handler
+
+    def close(self) -> None:
+        """Grava as linhas pendentes e fecha o arquivo (shutdown)"""
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+            self._handler = None
+            self._listener = None
+
+    def record(
+        self,
+        query: str,
+        filters: Dict,
+        latency_ms: float,
+        result_ids: List[str]
+    ) -> None:
+        """
+        Registra uma busca no log
+
+        Args:
+            query: Query do usuário
+            filters: Parâmetros da busca (top_k, category, datas) sem valores nulos
+            latency_ms: Latência total da busca
+            result_ids: IDs dos documentos retornados
+        """
+        if not settings.query_log_enabled:
+            return
+
+        entry = {
+            "t": int(time.time()),
+            "q": query,
+            "f": filters,
+            "ms": round(latency_ms, 1),
+            "ids": result_ids
+        }
+
+        try:
+            line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+            handler = self._get_handler()
+            handler.handle(logging.makeLogRecord({"msg": line}))
+        except Exception as e:
+            # O log de queries nunca deve derrubar uma busca
+            logger.warning(f"⚠️  Falha ao registrar query no log: {e}")
+
+    def top_queries(self, limit: int) -> List[Dict]:
+        """
+        Retorna as queries mais frequentes (arquivo atual + rotacionados)
+
+        Args:
+            limit: Número máximo de queries
+
+        Returns:
+            Lista de {"query", "filters", "count"} ordenada por frequência
+        """
+        counter: Counter = Counter()
+        files = [self.path] + [
+            Path(f"{self.path}.{i}") for i in range(1, settings.query_log_backup_count + 1)
+        ]
+
+        for file_path in files:
+            if not file_path.exists():
+                continue
+            with open(file_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Linha truncada
+                    key = json.dumps([entry.get("q"), entry.get("f") or {}], sort_keys=True)
+                    counter[key] += 1
+
+        top = []
+        for key, count in counter.most_common(limit):
+            query, filters = json.loads(key)
+            if query:
+                top.append({"query": query, "filters": filters, "count": count})
+        return top
+
+
+# Singleton instance
+query_log = QueryLog()
@@ -0,0 +1,294 @@
+"""
+Limitador de taxa adaptativo para chamadas à OpenAI
+
+Combina dois token buckets (requisições/min e tokens/min), sincronizados
+com os headers `x-ratelimit-*` da resposta, e um limite de concorrência
+ajustado por AIMD (aumento aditivo a cada sucesso, redução multiplicativa
+a cada 429). Pedidos interativos (busca) sempre passam à frente dos pedidos
+em lote (ingestão), que também não podem consumir a reserva final do bucket
+nem as vagas de concorrência reservadas à busca: mesmo com o limite AIMD em
+1, uma busca nunca espera atrás de uma requisição de lote em andamento.
+"""
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Dict, Mapping, Optional
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Filas de prioridade (menor valor = maior prioridade)"""
+    INTERACTIVE = 0
+    BULK = 1
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Converte durações da OpenAI ("1s", "6m0s", "120ms") em segundos
+
+    Args:
+        value: Valor do header x-ratelimit-reset-*
+
+    Returns:
+        Duração em segundos ou None se não reconhecida
+    """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Token bucket com reabastecimento contínuo"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def available(self) -> float:
+        """Unidades disponíveis agora"""
+        self._refill()
+        return self.level
+
+    def take(self, amount: float) -> None:
+        """Consome unidades (pode deixar o nível negativo, ex: após correção por header)"""
+        self._refill()
+        self.level -= amount
+
+    def seconds_until(self, amount: float) -> float:
+        """Tempo estimado até haver `amount` unidades disponíveis"""
+        missing = amount - self.available()
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second if self.refill_per_second > 0 else 1.0
+
+    def sync(self, remaining: float, limit: Optional[float] = None) -> None:
+        """Ajusta o nível (e a capacidade) a partir do que o servidor informou"""
+        if limit:
+            self.capacity = limit
+            self.refill_per_second = limit / 60.0
+        self._refill()
+        self.level = min(self.level, remaining)
+
+
+class AdaptiveRateLimiter:
+    """Limitador compartilhado de RPM/TPM com concorrência AIMD e prioridades"""
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        bulk_reserve_ratio: float = 0.1,
+        interactive_slots: int = 1
+    ):
+        """
+        Args:
+            requests_per_minute: Cota de requisições por minuto
+            tokens_per_minute: Cota de tokens por minuto
+            max_concurrency: Teto de requisições simultâneas
+            min_concurrency: Piso do limite de concorrência após 429s
+            bulk_reserve_ratio: Fração dos buckets reservada a pedidos interativos
+            interactive_slots: Vagas de concorrência que pedidos em lote não ocupam
+        """
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.bulk_reserve_ratio = bulk_reserve_ratio
+        self.interactive_slots = max(1, interactive_slots)
+        self.concurrency_limit = float(max_concurrency)
+        self._in_flight: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.rate_limited_count = 0
+        self._waiting: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._changed: Optional[asyncio.Event] = None
+        self._changed_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._blocked_until = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        """Requisições em andamento (todas as prioridades)"""
+        return sum(self._in_flight.values())
+
+    @property
+    def queue_depth(self) -> int:
+        """Pedidos aguardando liberação (todas as prioridades)"""
+        return sum(self._waiting.values())
+
+    def _notify(self) -> None:
+        """Acorda os pedidos em espera para reavaliarem a capacidade"""
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def _wait_time(self, tokens: float, priority: Priority) -> Optional[float]:
+        """
+        Tempo a esperar antes de liberar o pedido (0 = liberar agora)
+
+        Returns:
+            Segundos de espera, ou None se só um evento (liberação) resolve
+        """
+        # Prioridade estrita: lote só passa sem interativos aguardando
+        if any(self._waiting[p] for p in Priority if p < priority):
+            return None
+
+        limit = int(self.concurrency_limit)
+        if priority == Priority.BULK:
+            # Lote fica fora das vagas reservadas (mas sempre com ao menos uma)
+            if self.in_flight >= max(1, limit - self.interactive_slots):
+                return None
+        elif self._in_flight[priority] >= self.interactive_slots and self.in_flight >= limit:
+            # Interativos sempre têm as próprias vagas, ocupe o lote o que ocupar
+            return None
+
+        now = time.monotonic()
+        if self._blocked_until > now:
+            return self._blocked_until - now
+
+        reserve = self.bulk_reserve_ratio if priority == Priority.BULK else 0.0
+        request_need = 1 + reserve * self.requests.capacity
+        # Um único pedido maior que o bucket inteiro precisa passar com o bucket cheio
+        token_need = min(tokens, self.tokens.capacity) + reserve * self.tokens.capacity
+        return max(self.requests.seconds_until(request_need), self.tokens.seconds_until(token_need))
+
+    @asynccontextmanager
+    async def acquire(self, tokens: float, priority: Priority = Priority.BULK) -> AsyncIterator[None]:
+        """
+        Aguarda capacidade e reserva uma vaga para uma requisição
+
+        Args:
+            tokens: Estimativa de tokens da requisição
+            priority: Fila de prioridade do pedido
+        """
+        self._waiting[priority] += 1
+        try:
+            while True:
+                wait = self._wait_time(tokens, priority)
+                if wait == 0:
+                    break
+                loop = asyncio.get_running_loop()
+                if self._changed is None or self._changed_loop is not loop:
+                    self._changed = asyncio.Event()
+                    self._changed_loop = loop
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=wait if wait is not None else 1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiting[priority] -= 1
+            if priority == Priority.INTERACTIVE:
+                self._notify()
+
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._in_flight[priority] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[priority] -= 1
+            self._notify()
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """
+        Registra uma resposta bem-sucedida (aumento aditivo da concorrência)
+
+        Args:
+            headers: Headers da resposta, para sincronizar os buckets
+        """
+        self.concurrency_limit = min(
+            float(self.max_concurrency),
+            self.concurrency_limit + 1.0 / max(self.concurrency_limit, 1.0)
+        )
+        if headers:
+            self.update_from_headers(headers)
+
+    def on_rate_limited(self, headers: Optional[Mapping[str, str]] = None) -> float:
+        """
+        Registra um 429 (redução multiplicativa da concorrência)
+
+        Args:
+            headers: Headers da resposta de erro
+
+        Returns:
+            Segundos a aguardar antes de tentar novamente
+        """
+        self.rate_limited_count += 1
+        self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+
+        retry_after = None
+        if headers:
+            self.update_from_headers(headers)
+            try:
+                retry_after = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = max(
+                    parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                    parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or 0
+                ) or None
+
+        delay = retry_after if retry_after else 1.0
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        logger.warning(
+            f"⚠️  Rate limit da OpenAI: concorrência reduzida para {int(self.concurrency_limit)}, "
+            f"pausa de {delay:.1f}s"
+        )
+        return delay
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """
+        Sincroniza os buckets com os headers x-ratelimit-* da OpenAI
+
+        Args:
+            headers: Headers da resposta
+        """
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                bucket.sync(float(remaining), float(limit) if limit else None)
+            except ValueError:
+                continue
+        self._notify()
+
+    def stats(self) -> Dict:
+        """
+        Retorna o estado atual do limitador
+
+        Returns:
+            Dicionário com concorrência, filas e níveis dos buckets
+        """
+        return {
+            "concurrency_limit": int(self.concurrency_limit),
+            "in_flight": self.in_flight,
+            "in_flight_interactive": self._in_flight[Priority.INTERACTIVE],
+            "waiting_interactive": self._waiting[Priority.INTERACTIVE],
+            "waiting_bulk": self._waiting[Priority.BULK],
+            "requests_available": round(self.requests.available(), 1),
+            "tokens_available": round(self.tokens.available()),
+            "rate_limited_total": self.rate_limited_count
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa grosseira de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
@@ -0,0 +1,261 @@
+"""
+Deadlines, requisições hedged e circuit breakers para dependências externas
+
+Cada dependência da busca (embedding na OpenAI, query no Pinecone) tem um
+DependencyGuard com:
+
+- Latência observada (janela móvel) para estimar o p95.
+- Hedging: se a primeira tentativa passa do p95, uma segunda é disparada e
+  vale a que responder primeiro (a outra é cancelada).
+- Circuit breaker: após falhas consecutivas, as chamadas falham na hora
+  (sem esperar timeouts) até um período de recuperação; então uma única
+  chamada de teste decide se o circuito fecha de novo.
+
+Tudo respeita o Deadline da requisição: ao esgotar, as tentativas em voo
+são canceladas e DeadlineExceeded é levantado.
+"""
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import asyncio
+import logging
+import time
+
+from backend.config import settings
+from backend.services.metrics import count_error, count_hedge, set_circuit_state
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Modo degradado da busca atual ("stale_cache" | "lexical"), lido pelo endpoint
+search_degraded: ContextVar[Optional[str]] = ContextVar("search_degraded", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """O orçamento de tempo da requisição acabou"""
+
+
+class CircuitOpenError(RuntimeError):
+    """Dependência marcada como degradada: chamada recusada sem tentar"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuito de {name} aberto (nova tentativa em {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class Deadline:
+    """Instante limite de uma requisição, propagado pelas etapas"""
+
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: Orçamento a partir de agora
+        """
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Segundos restantes (0 se esgotado)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class LatencyTracker:
+    """Janela móvel de latências de uma dependência"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Percentil da janela, ou None com poucas amostras"""
+        if len(self.samples) < settings.hedge_min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Circuit breaker por falhas consecutivas (closed -> open -> half_open)"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        set_circuit_state(name, self.state)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning(f"⚡ Circuito de {self.name}: {self.state} -> {state}")
+            self.state = state
+            set_circuit_state(self.name, state)
+
+    def allow(self) -> bool:
+        """Se uma chamada pode ser feita agora (em half_open, só uma por vez)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def retry_in(self) -> float:
+        """Segundos até a próxima chamada de teste"""
+        return max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at))
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self._probe_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def on_abandoned(self) -> None:
+        """Chamada cancelada pelo cliente: não conta como sucesso nem falha"""
+        self._probe_in_flight = False
+
+
+class DependencyGuard:
+    """Hedging + circuit breaker + deadline para uma dependência"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = LatencyTracker(settings.hedge_latency_window)
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.circuit_failure_threshold,
+            recovery_seconds=settings.circuit_recovery_seconds
+        )
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes da segunda tentativa (p95 observado), ou None sem hedging"""
+        if not settings.hedge_enabled:
+            return None
+        p = self.latency.percentile(settings.hedge_percentile)
+        if p is None:
+            return None
+        return min(max(p, settings.hedge_min_delay_ms / 1000), settings.hedge_max_delay_ms / 1000)
+
+    async def call(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        deadline: Deadline,
+        hedge: Optional[Callable[[], Awaitable[T]]] = None
+    ) -> T:
+        """
+        Executa a chamada dentro do deadline, com hedging e circuit breaker
+
+        Args:
+            primary: Fábrica da primeira tentativa
+            deadline: Deadline da requisição
+            hedge: Fábrica da tentativa extra (padrão: primary)
+
+        Returns:
+            Resultado da tentativa que terminou primeiro com sucesso
+
+        Raises:
+            CircuitOpenError: Circuito aberto (falha imediata)
+            DeadlineExceeded: Nenhuma tentativa terminou dentro do deadline
+            Exception: Erro da última tentativa, se todas falharem
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+
+        hedge = hedge or primary
+        delay = self.hedge_delay()
+        started: Dict[asyncio.Future, float] = {asyncio.ensure_future(primary()): time.monotonic()}
+        first_start = time.monotonic()
+        hedge_task: Optional[asyncio.Future] = None
+        error: Optional[BaseException] = None
+
+        try:
+            while started:
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    self.latency.record(time.monotonic() - first_start)
+                    count_error(self.name, "deadline")
+                    self.breaker.on_failure()
+                    raise DeadlineExceeded(f"{self.name}: deadline de {deadline.budget:.1f}s esgotado")
+
+                wait = remaining
+                if delay is not None and hedge_task is None:
+                    wait = min(wait, max(0.0, first_start + delay - time.monotonic()))
+
+                done, _ = await asyncio.wait(started, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    task_start = started.pop(task)
+                    if task.exception() is None:
+                        self.latency.record(time.monotonic() - task_start)
+                        self.breaker.on_success()
+                        if task is hedge_task:
+                            self.hedges_won += 1
+                            count_hedge(self.name, "won")
+                        return task.result()
+                    error = task.exception()
+
+                if not done and delay is not None and hedge_task is None and deadline.remaining() > 0:
+                    self.hedges_sent += 1
+                    count_hedge(self.name, "sent")
+                    hedge_task = asyncio.ensure_future(hedge())
+                    started[hedge_task] = time.monotonic()
+
+            # Todas as tentativas falharam
+            self.breaker.on_failure()
+            raise error
+        except asyncio.CancelledError:
+            self.breaker.on_abandoned()
+            raise
+        finally:
+            for task in started:
+                task.cancel()
+                # Evita o aviso de exceção não lida de tentativas abandonadas
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def stats(self) -> Dict:
+        """
+        Estado da dependência
+
+        Returns:
+            Circuito, falhas consecutivas, p95 observado e hedges
+        """
+        p95 = self.latency.percentile(95)
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "samples": len(self.latency.samples),
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won
+        }
+
+
+# Singleton instances
+openai_guard = DependencyGuard("openai")
+pinecone_guard = DependencyGuard("pinecone")
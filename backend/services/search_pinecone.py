@@ -1,87 +1,526 @@
 """
 Serviço de busca semântica usando Pinecone
 """
+import asyncio
+import base64
+import binascii
+import hashlib
 import logging
-from typing import List, Optional
+import secrets
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 from backend.config import settings
+from backend.services.cache import TTLCache
+from backend.services.lexical import lexical_index
+from backend.services.metrics import count_fallback, record_stage, register_cache
 from backend.services.openai_client import openai_client
 from backend.services.pinecone_client import pinecone_client
+from backend.services.resilience import Deadline, openai_guard, pinecone_guard, search_degraded
+from backend.services.shared_cache import Float32Codec, JSONCodec, SharedCache
 from backend.models.schemas import SearchResult, DocumentCategory
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=4096)
+def _parse_date(value: str) -> datetime:
+    """Parse de ISO 8601 com cache (todos os chunks de um documento compartilham a data)"""
+    return datetime.fromisoformat(value)
+
+
+def _parse_upload_date(value: Optional[str]) -> datetime:
+    """Converte o upload_date da metadata, usando a data atual se ausente"""
+    return _parse_date(value) if value else datetime.now()
+
+
+def _to_page_number(value) -> Optional[int]:
+    """Pinecone devolve números da metadata como float"""
+    return int(value) if value is not None else None
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou de outra busca (query/filtros diferentes)"""
+
+
+class CursorExpired(InvalidCursor):
+    """Sessão do cursor expirou ou saiu da memória: refazer a busca"""
+
+
+def _encode_cursor(session_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{session_id}:{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+# Cursor da primeira página, ainda sem sessão: "~{emitido em}.{busca}.{página 1}"
+_PENDING_PREFIX = "~"
+
+
+def _digest(value) -> str:
+    digest = hashlib.blake2b(repr(value).encode("utf-8"), digest_size=12).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii")
+
+
+def _result_key(result: SearchResult) -> tuple:
+    return (result.document_id, result.page_number, result.chunk_text)
+
+
+def _pending_session(search_key: tuple, first_page: List[SearchResult]) -> str:
+    """Resumo da busca e da página 1 exibida (a lista profunda precisa começar por ela)"""
+    page_digest = _digest([_result_key(result) for result in first_page])
+    return f"{_PENDING_PREFIX}{int(time.time())}.{_digest(search_key)}.{page_digest}"
+
+
+def _parse_pending_session(session_id: str) -> Tuple[int, str, str]:
+    try:
+        issued_at, search_digest, page_digest = session_id[len(_PENDING_PREFIX):].split(".")
+        return int(issued_at), search_digest, page_digest
+    except ValueError:
+        raise InvalidCursor("Cursor inválido")
+
+
+def _session_bytes(ranked: List[SearchResult]) -> int:
+    """Tamanho estimado de uma sessão (textos + overhead fixo por resultado)"""
+    return sum(
+        len(result.chunk_text) + len(result.filename) + 2 * len(result.gcs_url) + 512
+        for result in ranked
+    )
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        session_id, offset = raw.rsplit(":", 1)
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Cursor inválido")
+    if offset < 0 or not session_id:
+        raise InvalidCursor("Cursor inválido")
+    return session_id, offset
+
+
 class SearchServicePinecone:
     """Serviço para busca semântica usando Pinecone"""
     
+    def __init__(self):
+        # Embeddings de query são determinísticos: sem TTL. Ambos no backend
+        # de CACHE_BACKEND (compartilhado entre workers com sqlite/redis)
+        self.embedding_cache = SharedCache("query_embedding", settings.embedding_cache_size, codec=Float32Codec())
+        self.results_cache = SharedCache(
+            "search_results",
+            settings.search_cache_size,
+            settings.search_cache_ttl,
+            codec=JSONCodec(List[SearchResult])
+        )
+        # Sessões de paginação: lista ranqueada profunda + a busca a que
+        # pertence (sempre no processo, limitadas em número e em bytes)
+        self.cursor_sessions = TTLCache(
+            settings.search_cursor_sessions,
+            settings.search_cursor_ttl,
+            settings.search_cursor_max_bytes
+        )
+        register_cache("search_cursor", self.cursor_sessions.stats)
+    
     async def search(
         self,
         query: str,
         top_k: int = 10,
         category: Optional[DocumentCategory] = None,
         date_from: Optional[datetime] = None,
-        date_to: Optional[datetime] = None
+        date_to: Optional[datetime] = None,
+        deadline: Optional[Deadline] = None
     ) -> List[SearchResult]:
         """
         Realiza busca semântica usando Pinecone
         
+        Embedding e query no Pinecone respeitam o deadline, com hedging e
+        circuit breaker (ver resilience). Se uma das dependências falhar, a
+        busca responde do cache (mesmo expirado) ou do índice lexical local,
+        e marca o modo degradado em `search_degraded`.
+        
         Args:
             query: Query de busca em linguagem natural
             top_k: Número de resultados a retornar
             category: Filtro opcional por categoria
             date_from: Filtro opcional de data inicial
             date_to: Filtro opcional de data final
+            deadline: Orçamento de tempo (padrão: settings.search_deadline_ms)
             
         Returns:
             Lista de resultados ordenados por relevância
         """
         try:
-            import time
             start_time = time.time()
+            deadline = deadline or Deadline(settings.search_deadline_ms / 1000)
+            search_degraded.set(None)
             
-            # 1. Gerar embedding da query
-            logger.info(f"🔍 Gerando embedding para query: '{query[:50]}...'")
-            embed_start = time.time()
-            query_embedding = await openai_client.create_embedding(query)
-            embed_time = time.time() - embed_start
-            logger.info(f"⏱️  Embedding gerado em {embed_time:.2f}s")
+            cache_key = self._results_cache_key(query, top_k, category, date_from, date_to)
+            cached_results = await self.results_cache.get(cache_key)
+            if cached_results is not None:
+                record_stage("search", "cache", time.time() - start_time)
+                logger.info(f"⚡ Resultados servidos do cache para query: '{query[:50]}...'")
+                return cached_results
             
-            # 2. Preparar filtros Pinecone
+            # Preparar filtros Pinecone
             pinecone_filter = self._build_pinecone_filter(category, date_from, date_to)
             if pinecone_filter:
                 logger.info(f"🔎 Filtros aplicados: {pinecone_filter}")
             
-            # 3. Buscar no Pinecone
-            logger.info(f"📊 Buscando no Pinecone (top_k={top_k})...")
-            pinecone_start = time.time()
-            
-            results = pinecone_client.query(
-                query_vector=query_embedding,
-                top_k=top_k,
-                filter=pinecone_filter,
-                include_metadata=True
-            )
+            try:
+                # 1. Gerar embedding da query (ou reaproveitar do cache)
+                embed_start = time.time()
+                query_embedding = await self._get_query_embedding(query, deadline)
+                embed_time = time.time() - embed_start
+                record_stage("search", "embedding", embed_time)
+                logger.info(f"⏱️  Embedding obtido em {embed_time:.2f}s")
+                
+                # 2. Buscar no Pinecone (com over-fetch quando o rerank está ativo)
+                fetch_k = self._candidate_count(top_k)
+                logger.info(f"📊 Buscando no Pinecone (top_k={fetch_k})...")
+                pinecone_start = time.time()
+                
+                results = await self._query_index(query_embedding, fetch_k, pinecone_filter, deadline)
+                
+                pinecone_time = time.time() - pinecone_start
+                record_stage("search", "pinecone", pinecone_time)
+                logger.info(f"⏱️  Busca no Pinecone em {pinecone_time:.2f}s")
+            except Exception as e:
+                fallback = await self._degraded_results(cache_key, query, top_k, pinecone_filter, e)
+                if fallback is None:
+                    raise
+                record_stage("search", "fallback", time.time() - start_time)
+                return fallback
             
-            pinecone_time = time.time() - pinecone_start
-            logger.info(f"⏱️  Busca no Pinecone em {pinecone_time:.2f}s")
+            # 3. Rerank local (MMR + remoção de quase-duplicatas)
+            rerank_start = time.time()
+            matches = results.get("matches", [])
+            if settings.rerank_enabled and matches:
+                # Vetores já em float32, empacotados na thread da query
+                order = await openai_client.rerank_results(
+                    query_embedding,
+                    results["values_matrix"],
+                    top_k=top_k
+                )
+                matches = [matches[i] for i in order]
+            else:
+                matches = matches[:top_k]
+            rerank_time = time.time() - rerank_start
+            record_stage("search", "rerank", rerank_time)
             
             # 4. Processar resultados
             process_start = time.time()
-            search_results = self._process_results(results)
+            search_results = self._process_results({"matches": matches})
             process_time = time.time() - process_start
+            record_stage("search", "processing", process_time)
             
             total_time = time.time() - start_time
+            record_stage("search", "total", total_time)
             logger.info(f"✅ {len(search_results)} resultados em {total_time:.2f}s total")
-            logger.info(f"   └─ Embedding: {embed_time:.2f}s | Pinecone: {pinecone_time:.2f}s | Processamento: {process_time:.2f}s")
+            logger.info(f"   └─ Embedding: {embed_time:.2f}s | Pinecone: {pinecone_time:.2f}s | Rerank: {rerank_time * 1000:.1f}ms | Processamento: {process_time:.2f}s")
             
+            await self.results_cache.set(cache_key, search_results)
+            # Chunks vistos alimentam o fallback lexical
+            lexical_index.add_matches(matches)
             return search_results
             
         except Exception as e:
             logger.error(f"❌ Erro durante busca: {e}")
             raise
     
+    async def search_page(
+        self,
+        query: str,
+        top_k: int = 10,
+        category: Optional[DocumentCategory] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[List[SearchResult], Optional[str]]:
+        """
+        Primeira página de uma busca paginável
+        
+        Busca só a página pedida, como `search`. Se ela vier cheia, devolve
+        um cursor sem sessão (amarrado à query e aos filtros): a lista
+        profunda só é ranqueada quando o cursor for usado, em `next_page`.
+        
+        Args:
+            query: Query de busca em linguagem natural
+            top_k: Tamanho da página
+            category: Filtro opcional por categoria
+            date_from: Filtro opcional de data inicial
+            date_to: Filtro opcional de data final
+            deadline: Orçamento de tempo (padrão: settings.search_deadline_ms)
+            
+        Returns:
+            Tupla (resultados da página, next_cursor ou None)
+        """
+        results = await self.search(query, top_k, category, date_from, date_to, deadline)
+        next_cursor = None
+        if settings.search_cursor_enabled and len(results) >= top_k and top_k < settings.search_cursor_depth:
+            search_key = self._results_cache_key(query, None, category, date_from, date_to)
+            next_cursor = _encode_cursor(_pending_session(search_key, results), top_k)
+        return results, next_cursor
+    
+    async def next_page(
+        self,
+        cursor: str,
+        query: str,
+        top_k: int = 10,
+        category: Optional[DocumentCategory] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[List[SearchResult], Optional[str]]:
+        """
+        Página seguinte de uma busca
+        
+        No primeiro uso do cursor, ranqueia até search_cursor_depth
+        resultados (embedding em cache, uma query no Pinecone), mantendo os
+        da primeira página nas mesmas posições, e guarda a lista numa
+        sessão. As páginas seguintes saem da sessão, sem OpenAI nem
+        Pinecone. Query e filtros devem ser os mesmos da primeira página; o
+        tamanho da página pode mudar.
+        
+        Args:
+            cursor: next_cursor da página anterior
+            query: Query de busca
+            top_k: Tamanho da página
+            category: Filtro de categoria da busca original
+            date_from: Data inicial da busca original
+            date_to: Data final da busca original
+            deadline: Orçamento de tempo da busca profunda
+            
+        Returns:
+            Tupla (resultados da página, next_cursor ou None)
+            
+        Raises:
+            InvalidCursor: Cursor malformado ou de outra busca
+            CursorExpired: Sessão ou cursor expirado, ou página 1 diferente da
+                exibida (refazer a busca sem cursor)
+        """
+        start_time = time.perf_counter()
+        session_id, offset = _decode_cursor(cursor)
+        search_key = self._results_cache_key(query, None, category, date_from, date_to)
+        
+        if session_id.startswith(_PENDING_PREFIX):
+            issued_at, search_digest, page_digest = _parse_pending_session(session_id)
+            if search_digest != _digest(search_key):
+                raise InvalidCursor("Cursor pertence a outra busca (query ou filtros diferentes)")
+            if time.time() - issued_at > settings.search_cursor_ttl:
+                raise CursorExpired("Cursor expirado, refaça a busca")
+            ranked = await self._rank_deep(query, offset, category, date_from, date_to, deadline, page_digest)
+            session_id = None
+            if offset + top_k < len(ranked):
+                session_id = secrets.token_urlsafe(12)
+                if not self.cursor_sessions.set(session_id, (search_key, ranked), size=_session_bytes(ranked)):
+                    session_id = None  # Maior que search_cursor_max_bytes: sem páginas seguintes
+            record_stage("search", "cursor_deep", time.perf_counter() - start_time)
+        else:
+            session = self.cursor_sessions.get(session_id)
+            if session is None:
+                raise CursorExpired("Cursor expirado, refaça a busca")
+            session_key, ranked = session
+            if session_key != search_key:
+                raise InvalidCursor("Cursor pertence a outra busca (query ou filtros diferentes)")
+            record_stage("search", "cursor", time.perf_counter() - start_time)
+        
+        end = offset + top_k
+        next_cursor = _encode_cursor(session_id, end) if session_id and end < len(ranked) else None
+        return ranked[offset:end], next_cursor
+    
+    async def _rank_deep(
+        self,
+        query: str,
+        shown: int,
+        category: Optional[DocumentCategory],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+        deadline: Optional[Deadline],
+        page_digest: str
+    ) -> List[SearchResult]:
+        """
+        Lista ranqueada profunda, com os `shown` primeiros iguais à primeira página
+        
+        O MMR com mais candidatos pode reordenar o topo; para a paginação não
+        repetir nem pular resultados, a primeira página é mantida e os demais
+        vêm da busca profunda sem os já exibidos. Se a página 1 recalculada
+        não for a que o cliente recebeu (cache invalidado por uma ingestão ou
+        expirado), os offsets do cursor não valem mais.
+        
+        Raises:
+            CursorExpired: Página 1 mudou desde a emissão do cursor
+        """
+        deadline = deadline or Deadline(settings.search_deadline_ms / 1000)
+        first_page = await self.search(query, shown, category, date_from, date_to, deadline)
+        if _digest([_result_key(result) for result in first_page]) != page_digest:
+            raise CursorExpired("Resultados mudaram desde a primeira página, refaça a busca")
+        deep = await self.search(
+            query, max(shown, settings.search_cursor_depth), category, date_from, date_to, deadline
+        )
+        seen = {_result_key(result) for result in first_page}
+        return first_page + [result for result in deep if _result_key(result) not in seen]
+    
+    async def _get_query_embedding(self, query: str, deadline: Deadline) -> List[float]:
+        """
+        Retorna o embedding da query, consultando o cache antes da OpenAI
+        
+        A primeira tentativa passa pelo micro-batching; a tentativa hedged é
+        uma requisição própria.
+        
+        Args:
+            query: Query de busca
+            deadline: Deadline da busca
+            
+        Returns:
+            Embedding da query
+        """
+        embedding = await self.embedding_cache.get(query)
+        if embedding is not None:
+            return embedding
+        
+        logger.info(f"🔍 Gerando embedding para query: '{query[:50]}...'")
+        embedding = await openai_guard.call(
+            lambda: openai_client.create_embedding(query),
+            deadline,
+            hedge=lambda: openai_client.create_embedding(query, batch=False)
+        )
+        await self.embedding_cache.set(query, embedding)
+        return embedding
+    
+    async def _query_index(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        pinecone_filter: Optional[dict],
+        deadline: Deadline
+    ) -> dict:
+        """
+        Query no Pinecone fora do event loop, dentro do deadline (com hedging)
+        
+        Returns:
+            Resposta do Pinecone
+        """
+        def attempt():
+            return pinecone_client.query_async(
+                query_vector=query_embedding,
+                top_k=top_k,
+                filter=pinecone_filter,
+                include_metadata=True,
+                include_values=settings.rerank_enabled,
+                values_matrix=settings.rerank_enabled,
+                timeout=max(deadline.remaining(), 0.1)
+            )
+        
+        return await pinecone_guard.call(attempt, deadline)
+    
+    async def _degraded_results(
+        self,
+        cache_key: tuple,
+        query: str,
+        top_k: int,
+        pinecone_filter: Optional[dict],
+        error: Exception
+    ) -> Optional[List[SearchResult]]:
+        """
+        Resultados em modo degradado: cache expirado ou índice lexical local
+        
+        Args:
+            cache_key: Chave do cache de resultados
+            query: Query de busca
+            top_k: Número de resultados
+            pinecone_filter: Filtros da busca (aplicados também no lexical)
+            error: Falha que levou ao fallback
+            
+        Returns:
+            Resultados, ou None se não houver fallback disponível
+        """
+        stale = await self.results_cache.get_stale(cache_key)
+        if stale is not None:
+            mode, results = "stale_cache", stale
+        elif len(lexical_index):
+            mode = "lexical"
+            results = self._process_results(lexical_index.search(query, top_k, pinecone_filter))
+        else:
+            return None
+        
+        logger.warning(f"⚠️  Busca em modo degradado ({mode}) após falha: {type(error).__name__}: {error}")
+        search_degraded.set(mode)
+        count_fallback(mode)
+        return results
+    
+    def _results_cache_key(
+        self,
+        query: str,
+        top_k: Optional[int],
+        category: Optional[DocumentCategory],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+    ) -> tuple:
+        """Chave do cache de resultados para uma combinação de parâmetros"""
+        return (
+            query,
+            top_k,
+            category.value if category else None,
+            date_from.isoformat() if date_from else None,
+            date_to.isoformat() if date_to else None
+        )
+    
+    async def invalidate_results(self) -> None:
+        """
+        Expira resultados em cache (ex: após indexar novos documentos)
+        
+        Com backend compartilhado, vale para todos os workers. As entradas
+        continuam disponíveis como fallback em modo degradado.
+        """
+        await self.results_cache.expire_all()
+    
+    async def warm_up(self, hot_queries: List[Dict]) -> int:
+        """
+        Pré-computa embeddings e resultados das queries mais frequentes
+        
+        Args:
+            hot_queries: Lista de {"query", "filters"} (ver QueryLog.top_queries)
+            
+        Returns:
+            Número de queries aquecidas com sucesso
+        """
+        warmed = 0
+        for item in hot_queries:
+            filters = item.get("filters") or {}
+            try:
+                await self.search(
+                    query=item["query"],
+                    top_k=filters.get("top_k", settings.top_k_results),
+                    category=DocumentCategory(filters["category"]) if filters.get("category") else None,
+                    date_from=datetime.fromisoformat(filters["date_from"]) if filters.get("date_from") else None,
+                    date_to=datetime.fromisoformat(filters["date_to"]) if filters.get("date_to") else None,
+                    # Conexões ainda frias: orçamento do warm-up, não o da requisição
+                    deadline=Deadline(settings.query_warmup_timeout)
+                )
+                warmed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️  Warm-up falhou para '{item.get('query', '')[:50]}': {e}")
+        
+        logger.info(f"🔥 Warm-up concluído: {warmed}/{len(hot_queries)} queries em cache")
+        return warmed
+    
+    def _candidate_count(self, top_k: int) -> int:
+        """
+        Número de candidatos a buscar no Pinecone para o rerank
+        
+        Args:
+            top_k: Número de resultados a retornar
+            
+        Returns:
+            Quantidade de candidatos (top_k se o rerank estiver desativado)
+        """
+        if not settings.rerank_enabled:
+            return top_k
+        return max(top_k, min(top_k * settings.rerank_fetch_multiplier, settings.rerank_max_candidates))
+    
     def _build_pinecone_filter(
         self,
         category: Optional[DocumentCategory],
@@ -94,9 +533,12 @@ class SearchServicePinecone:
         Pinecone usa formato:
         {
             "category": {"$eq": "anuncio"},
-            "upload_date": {"$gte": "2024-01-01"}
+            "upload_ts": {"$gte": 1704067200}
         }
         
+        Operadores de intervalo só funcionam com números, por isso as datas
+        são comparadas pelo campo numérico upload_ts (epoch em segundos).
+        
         Args:
             category: Filtro de categoria
             date_from: Data inicial
@@ -110,14 +552,13 @@ class SearchServicePinecone:
         if category:
             filters["category"] = {"$eq": category.value}
         
-        # Filtros de data (se implementado no metadata)
-        if date_from:
-            filters["upload_date"] = filters.get("upload_date", {})
-            filters["upload_date"]["$gte"] = date_from.isoformat()
-        
-        if date_to:
-            filters["upload_date"] = filters.get("upload_date", {})
-            filters["upload_date"]["$lte"] = date_to.isoformat()
+        if date_from or date_to:
+            date_range = {}
+            if date_from:
+                date_range["$gte"] = int(date_from.timestamp())
+            if date_to:
+                date_range["$lte"] = int(date_to.timestamp())
+            filters["upload_ts"] = date_range
         
         return filters if filters else None
     
@@ -125,6 +566,9 @@ class SearchServicePinecone:
         """
         Processa resultados do Pinecone para formato da API
         
+        A metadata vem do nosso próprio index (escrita na ingestão), então os
+        resultados são construídos sem revalidação (model_construct).
+        
         Args:
             pinecone_results: Resultados brutos do Pinecone
             
@@ -142,16 +586,18 @@ class SearchServicePinecone:
             # Converter GCS path para URL da API
             gcs_path = metadata.get("gcs_path", "")
             api_url = f"/api/document/{gcs_path}" if gcs_path else ""
+            page_number = _to_page_number(metadata.get("page_number"))
             
-            result = SearchResult(
+            result = SearchResult.model_construct(
                 document_id=metadata.get("document_id", ""),
                 filename=metadata.get("filename", ""),
                 category=DocumentCategory(metadata.get("category", "anuncio")),
                 chunk_text=metadata.get("text", ""),
                 similarity_score=round(score, 4),
-                upload_date=datetime.fromisoformat(metadata.get("upload_date", datetime.now().isoformat())),
-                page_number=metadata.get("page_number"),
-                gcs_url=api_url
+                upload_date=_parse_upload_date(metadata.get("upload_date")),
+                page_number=page_number,
+                gcs_url=api_url,
+                page_url=f"{api_url}?page={page_number}" if api_url and page_number else None
             )
             search_results.append(result)
         
@@ -0,0 +1,123 @@
+"""
+Serialização rápida das respostas de busca (orjson + compressão)
+
+Os resultados já são construídos a partir de metadata confiável do nosso
+próprio index, então a resposta é serializada direto para bytes, sem a
+revalidação do `response_model` feita pelo FastAPI.
+"""
+from typing import Any, List, Optional
+import gzip
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from backend.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele, só gzip
+    brotli = None
+
+
+def _default(obj: Any) -> Any:
+    """Serializa modelos Pydantic construídos com model_construct"""
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    Serializa um payload para JSON com orjson
+
+    Args:
+        payload: Dicionário/lista contendo tipos nativos ou modelos Pydantic
+
+    Returns:
+        JSON em bytes
+    """
+    return orjson.dumps(payload, default=_default)
+
+
+def search_response_bytes(
+    query: str,
+    results: List[BaseModel],
+    processing_time_ms: float,
+    next_cursor: Optional[str] = None
+) -> bytes:
+    """
+    Serializa uma SearchResponse diretamente para bytes
+
+    Args:
+        query: Query original
+        results: Lista de SearchResult
+        processing_time_ms: Tempo de processamento
+        next_cursor: Cursor da próxima página (None na última)
+
+    Returns:
+        JSON em bytes, no mesmo formato de SearchResponse
+    """
+    return dumps({
+        "query": query,
+        "results": results,
+        "total_results": len(results),
+        "processing_time_ms": processing_time_ms,
+        "next_cursor": next_cursor
+    })
+
+
+def _choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Escolhe br ou gzip a partir do header Accept-Encoding"""
+    if not accept_encoding:
+        return None
+
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        quality = 1.0
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def json_response(body: bytes, accept_encoding: Optional[str] = None, status_code: int = 200) -> Response:
+    """
+    Monta a resposta HTTP, comprimindo payloads grandes
+
+    Args:
+        body: JSON já serializado
+        accept_encoding: Valor do header Accept-Encoding da requisição
+        status_code: Status HTTP
+
+    Returns:
+        Response com Content-Encoding negociado
+    """
+    headers = {"Vary": "Accept-Encoding"}
+
+    if len(body) >= settings.response_compression_min_bytes:
+        encoding = _choose_encoding(accept_encoding)
+        if encoding == "br":
+            body = brotli.compress(body, quality=settings.response_brotli_quality)
+            headers["Content-Encoding"] = "br"
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=settings.response_gzip_level)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers
+    )
@@ -0,0 +1,401 @@
+"""
+Caches de busca com backend plugável (embeddings de query, resultados, URLs assinadas)
+
+Com vários workers do uvicorn por instância e várias instâncias, cada
+processo com os próprios caches começa frio e acerta pouco. CACHE_BACKEND
+escolhe onde as entradas ficam:
+
+- memory: LRU no processo (padrão)
+- sqlite: arquivo local em WAL, compartilhado pelos workers do mesmo host
+- redis: servidor Redis (ou compatível), compartilhado entre instâncias;
+  no modo offline, o substituto em memória `offline.LocalRedis`
+
+Em todos os backends os valores são gravados em binário: embeddings como
+float32 (6 KB por query de 1536 dimensões, contra ~50 KB como lista de
+floats Python) e os demais valores como JSON via pydantic. Entradas
+expiradas continuam disponíveis em `get_stale` (modo degradado) até saírem
+pelo limite de itens (ou pelo TTL da chave, no Redis).
+
+Falhas do backend compartilhado nunca falham a busca: a leitura conta como
+miss e a gravação é descartada.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import struct
+import threading
+import time
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from backend.config import settings
+from backend.services.cache import TTLCache
+from backend.services.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Float32Codec:
+    """Vetores como float32 little-endian"""
+
+    def encode(self, value) -> bytes:
+        return np.asarray(value, dtype="<f4").tobytes()
+
+    def decode(self, data: bytes):
+        return np.frombuffer(data, dtype="<f4").tolist()
+
+
+class JSONCodec:
+    """Qualquer tipo suportado pelo pydantic, serializado como JSON"""
+
+    def __init__(self, type_: Any):
+        self.adapter = TypeAdapter(type_)
+
+    def encode(self, value) -> bytes:
+        return self.adapter.dump_json(value)
+
+    def decode(self, data: bytes):
+        return self.adapter.validate_json(data)
+
+
+class MemoryStore:
+    """LRU no processo (TTLCache de bytes)"""
+
+    backend = "memory"
+
+    def __init__(self, max_items: int, ttl_seconds: float):
+        self._cache = TTLCache(max_items, ttl_seconds)
+
+    async def get(self, key: str, stale: bool = False) -> Optional[bytes]:
+        return self._cache.get_stale(key) if stale else self._cache.get(key)
+
+    async def set(self, key: str, data: bytes) -> None:
+        self._cache.set(key, data)
+
+    async def expire_all(self) -> None:
+        self._cache.expire_all()
+
+    def size(self) -> Optional[int]:
+        return len(self._cache)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_entries_stored ON cache_entries (namespace, stored_at);
+"""
+
+# Gravações entre duas podas do limite de itens (o limite é aproximado)
+_SQLITE_PRUNE_EVERY = 64
+# Threads (e conexões) dedicadas ao arquivo SQLite
+_SQLITE_THREADS = 4
+
+
+class _SQLiteDatabase:
+    """Arquivo SQLite dos caches (threads próprias, uma conexão por thread, WAL)"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._executor = ThreadPoolExecutor(max_workers=_SQLITE_THREADS, thread_name_prefix="sqlite-cache")
+
+    async def run(self, fn: Callable, *args):
+        """Executa fn numa thread do banco (abertura, schema e consultas nunca no event loop)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Timeout curto: leituras em WAL não bloqueiam, e uma gravação que
+            # espera demais pelo lock é só descartada
+            conn = sqlite3.connect(self.path, timeout=1)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SQLITE_SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteStore:
+    """
+    Tabela SQLite compartilhada pelos workers do host
+
+    Leituras e gravações rodam nas threads do banco: abrir a conexão,
+    criar o schema ou esperar pelo lock do arquivo não bloqueia o event
+    loop. O tamanho é recontado nas podas (a cada _SQLITE_PRUNE_EVERY
+    gravações), para `stats` não consultar o banco. Os instantes de
+    expiração são epoch (comparáveis entre processos).
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, database: _SQLiteDatabase, namespace: str, max_items: int, ttl_seconds: float):
+        self.database = database
+        self.namespace = namespace
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        self._size: Optional[int] = None
+
+    def _get(self, key: str, stale: bool) -> Optional[bytes]:
+        row = self.database.connection().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if not stale and expires_at and expires_at < time.time():
+            return None
+        return value
+
+    async def get(self, key: str, stale: bool = False) -> Optional[bytes]:
+        return await self.database.run(self._get, key, stale)
+
+    def _set(self, key: str, data: bytes) -> None:
+        now = time.time()
+        conn = self.database.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, stored_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, data, now + self.ttl_seconds if self.ttl_seconds else 0, now)
+            )
+            self._writes += 1
+            if self._writes % _SQLITE_PRUNE_EVERY == 0:
+                # Mais antigas primeiro, acima do limite
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM cache_entries WHERE namespace = ? "
+                    "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_items)
+                )
+            elif self._size is not None:
+                return
+            self._size = conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    async def set(self, key: str, data: bytes) -> None:
+        if self.max_items > 0:
+            await self.database.run(self._set, key, data)
+
+    def _expire_all(self) -> None:
+        conn = self.database.connection()
+        with conn:
+            conn.execute("UPDATE cache_entries SET expires_at = -1 WHERE namespace = ?", (self.namespace,))
+
+    async def expire_all(self) -> None:
+        await self.database.run(self._expire_all)
+
+    def size(self) -> Optional[int]:
+        return self._size
+
+
+# Cabeçalho dos valores no Redis: expiração (epoch, 0 = nunca) e época do namespace
+_REDIS_HEADER = struct.Struct("<dq")
+
+
+class RedisStore:
+    """
+    Chaves em um servidor Redis, compartilhadas entre instâncias
+
+    A validade fica no cabeçalho do valor e a chave vive mais
+    CACHE_REDIS_STALE_TTL segundos, para servir `get_stale`. `expire_all`
+    incrementa a época do namespace (um INCR, sem varrer chaves): entradas
+    gravadas em épocas anteriores passam a contar como expiradas. O limite
+    de itens fica a cargo da política de memória do servidor
+    (maxmemory-policy allkeys-lru).
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, namespace: str, ttl_seconds: float):
+        self.client = client
+        self.prefix = f"{settings.cache_redis_prefix}:{namespace}:"
+        self.epoch_key = f"{self.prefix}epoch"
+        self.ttl_seconds = ttl_seconds
+        # Última época vista (as gravações seguem um miss, que acabou de lê-la)
+        self._epoch = 0
+
+    def _key(self, key: str) -> str:
+        return self.prefix + hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def get(self, key: str, stale: bool = False) -> Optional[bytes]:
+        raw, epoch = await self.client.mget(self._key(key), self.epoch_key)
+        self._epoch = int(epoch or 0)
+        if raw is None:
+            return None
+        expires_at, written_epoch = _REDIS_HEADER.unpack_from(raw)
+        if not stale and ((expires_at and expires_at < time.time()) or written_epoch < self._epoch):
+            return None
+        return raw[_REDIS_HEADER.size:]
+
+    async def set(self, key: str, data: bytes) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else 0
+        await self.client.set(
+            self._key(key),
+            _REDIS_HEADER.pack(expires_at, self._epoch) + data,
+            ex=int(self.ttl_seconds) + settings.cache_redis_stale_ttl
+        )
+
+    async def expire_all(self) -> None:
+        self._epoch = await self.client.incr(self.epoch_key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+_sqlite_database: Optional[_SQLiteDatabase] = None
+_redis_client = None
+
+
+def _redis():
+    """Client Redis compartilhado pelos caches (criado na primeira chamada)"""
+    global _redis_client
+    if _redis_client is None:
+        if settings.offline_mode:
+            from backend.services.offline import LocalRedis
+            logger.warning("🧪 Modo offline: usando Redis em memória para os caches")
+            _redis_client = LocalRedis(latency_ms=settings.offline_redis_latency_ms)
+        else:
+            import redis.asyncio as redis
+            _redis_client = redis.Redis.from_url(settings.cache_redis_url)
+    return _redis_client
+
+
+def _make_store(namespace: str, max_items: int, ttl_seconds: float):
+    """Store do namespace no backend configurado em CACHE_BACKEND"""
+    global _sqlite_database
+    backend = settings.cache_backend
+    if backend == "memory":
+        return MemoryStore(max_items, ttl_seconds)
+    if backend == "sqlite":
+        if _sqlite_database is None:
+            _sqlite_database = _SQLiteDatabase(settings.cache_sqlite_path)
+        return SQLiteStore(_sqlite_database, namespace, max_items, ttl_seconds)
+    if backend == "redis":
+        return RedisStore(_redis(), namespace, ttl_seconds)
+    raise ValueError(f"CACHE_BACKEND inválido: {backend} (use memory, sqlite ou redis)")
+
+
+class SharedCache:
+    """Cache de um tipo de valor sobre o backend configurado"""
+
+    def __init__(self, namespace: str, max_items: int, ttl_seconds: float = 0, codec=None):
+        """
+        Args:
+            namespace: Nome do cache (prefixo das chaves e label nas métricas)
+            max_items: Número máximo de entradas (0 = cache desligado)
+            ttl_seconds: Tempo de vida de cada entrada (0 = sem expiração)
+            codec: Codificação dos valores (padrão: JSON)
+        """
+        self.namespace = namespace
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.codec = codec or JSONCodec(Any)
+        self.store = _make_store(namespace, max_items, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        register_cache(namespace, self.stats)
+
+    def _key(self, key: Hashable) -> str:
+        return key if isinstance(key, str) else repr(key)
+
+    async def _read(self, key: Hashable, stale: bool) -> Optional[Any]:
+        if self.max_items <= 0:
+            return None
+        try:
+            data = await self.store.get(self._key(key), stale)
+            return self.codec.decode(data) if data is not None else None
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️  Falha ao ler o cache {self.namespace} ({self.store.backend}): {e}")
+            return None
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Busca uma entrada válida no cache
+
+        Args:
+            key: Chave da entrada (str, ou tupla de valores simples)
+
+        Returns:
+            Valor armazenado ou None se ausente/expirado
+        """
+        value = await self._read(key, stale=False)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Busca uma entrada mesmo que expirada (fallback em modo degradado)"""
+        return await self._read(key, stale=True)
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        """
+        Armazena uma entrada (falhas do backend são só registradas)
+
+        Args:
+            key: Chave da entrada
+            value: Valor a armazenar
+        """
+        if self.max_items <= 0:
+            return
+        try:
+            await self.store.set(self._key(key), self.codec.encode(value))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️  Falha ao gravar no cache {self.namespace} ({self.store.backend}): {e}")
+
+    async def expire_all(self) -> None:
+        """Marca todas as entradas como expiradas, em todos os workers que compartilham o backend"""
+        try:
+            await self.store.expire_all()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️  Falha ao expirar o cache {self.namespace} ({self.store.backend}): {e}")
+
+    def stats(self) -> Dict:
+        """
+        Retorna estatísticas de uso do cache (hits e misses deste processo)
+
+        Returns:
+            Dicionário com backend, tamanho (se conhecido), hits, misses e erros
+        """
+        stats = {
+            "backend": self.store.backend,
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+        try:
+            size = self.store.size()
+        except Exception:
+            size = None
+        if size is not None:
+            stats["size"] = size
+        return stats
@@ -0,0 +1,149 @@
+"""
+Leitura em streaming de uploads multipart/form-data
+
+O UploadFile do FastAPI só chega ao endpoint depois que o corpo inteiro foi
+recebido e copiado para um arquivo temporário. Aqui o corpo é interpretado
+à medida que chega, para que o envio ao GCS comece enquanto o cliente ainda
+está transmitindo o arquivo.
+"""
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+import os
+
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+
+class MultipartError(ValueError):
+    """Corpo multipart inválido ou sem o campo de arquivo esperado"""
+
+
+class MultipartFileStream:
+    """Extrai um campo de arquivo de um corpo multipart sem bufferizá-lo"""
+
+    def __init__(self, request: Request, field_name: str = "file"):
+        """
+        Args:
+            request: Requisição com corpo multipart/form-data
+            field_name: Nome do campo do formulário com o arquivo
+
+        Raises:
+            MultipartError: Se o Content-Type não for multipart com boundary
+        """
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise MultipartError("Envie o arquivo como multipart/form-data")
+
+        self.field_name = field_name
+        self.filename: Optional[str] = None
+        self.size = 0
+        self._body = request.stream()
+        self._body_done = False
+        self._events: Deque[Tuple[str, object]] = deque()
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    # Callbacks do parser (chamados de forma síncrona dentro de write)
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        self._events.append(("part", self._headers))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._events.append(("data", bytes(data[start:end])))
+
+    def _on_part_end(self) -> None:
+        self._events.append(("end", None))
+
+    async def _next_event(self) -> Optional[Tuple[str, object]]:
+        """Próximo evento do parser, lendo mais do corpo quando necessário"""
+        while not self._events:
+            if self._body_done:
+                return None
+            try:
+                chunk = await self._body.__anext__()
+            except StopAsyncIteration:
+                chunk = b""
+            if chunk:
+                self._parser.write(chunk)
+            else:
+                self._body_done = True
+                self._parser.finalize()
+        return self._events.popleft()
+
+    async def open(self) -> str:
+        """
+        Avança até o início do campo de arquivo
+
+        Returns:
+            Nome do arquivo enviado pelo cliente (sem diretórios)
+
+        Raises:
+            MultipartError: Se o campo não estiver presente
+        """
+        while True:
+            event = await self._next_event()
+            if event is None:
+                raise MultipartError(f"Campo '{self.field_name}' não encontrado no formulário")
+
+            kind, payload = event
+            if kind != "part":
+                continue
+
+            _, disposition = parse_options_header(payload.get(b"content-disposition", b""))
+            if disposition.get(b"name", b"").decode("utf-8", "replace") != self.field_name:
+                continue
+            if b"filename" not in disposition:
+                raise MultipartError(f"Campo '{self.field_name}' não contém um arquivo")
+
+            filename = disposition[b"filename"].decode("utf-8", "replace")
+            self.filename = os.path.basename(filename.replace("\\", "/"))
+            return self.filename
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """
+        Conteúdo do arquivo em pedaços, na ordem em que chega do cliente
+
+        Yields:
+            Pedaços do arquivo
+        """
+        while True:
+            event = await self._next_event()
+            if event is None:
+                raise MultipartError("Corpo multipart terminou no meio do arquivo")
+
+            kind, payload = event
+            if kind == "end":
+                return
+            if kind == "data":
+                self.size += len(payload)
+                yield payload
+
+    async def drain(self) -> None:
+        """Consome o restante do corpo (campos após o arquivo)"""
+        while await self._next_event() is not None:
+            pass
@@ -0,0 +1,121 @@
+"""
+Warm-up em background e sinal de prontidão
+
+Logo após o startup, em paralelo: cria os clients (imports pesados incluídos),
+abre o handle do index Pinecone, estabelece as conexões TLS com OpenAI,
+Pinecone e GCS (um embedding de teste, describe_index_stats e um GET de
+metadata) e, por fim, aquece os caches com as queries mais frequentes.
+/api/ready responde 503 até o warm-up terminar.
+"""
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import time
+
+from backend.config import settings
+from backend.services.gcs_client import gcs_client
+from backend.services.index_stats import index_stats_service
+from backend.services.openai_client import openai_client
+from backend.services.query_log import query_log
+from backend.services.search_pinecone import search_service_pinecone
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupService:
+    """Executa o warm-up uma vez por processo e expõe o estado de prontidão"""
+
+    def __init__(self):
+        self.state = "pending"  # pending | warming | ready
+        self.steps: Dict[str, Dict] = {}
+        self.duration_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self) -> asyncio.Task:
+        """
+        Agenda o warm-up em background (idempotente)
+
+        Returns:
+            Task do warm-up
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable]) -> None:
+        """Executa uma etapa, registrando duração e erro (sem interromper as demais)"""
+        start = time.perf_counter()
+        try:
+            await fn()
+            self.steps[name] = {"ok": True}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️  Warm-up de {name} falhou: {e}")
+            self.steps[name] = {"ok": False, "error": str(e)}
+        self.steps[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _warm_openai(self) -> None:
+        await openai_client.create_embedding("warm-up")
+
+    async def _warm_pinecone(self) -> None:
+        # describe_index_stats abre a conexão e já preenche o snapshot de /api/stats
+        await index_stats_service.refresh()
+
+    async def _warm_gcs(self) -> None:
+        await gcs_client.connect()
+        await gcs_client.file_exists("__warmup__")
+
+    async def _warm_hot_queries(self) -> None:
+        """Lê as queries mais frequentes do log e preenche os caches de busca"""
+        if settings.query_warmup_top_n <= 0:
+            return
+        hot_queries = await asyncio.to_thread(query_log.top_queries, settings.query_warmup_top_n)
+        if not hot_queries:
+            logger.info("🔥 Nenhuma query no log para warm-up")
+            return
+        logger.info(f"🔥 Aquecendo {len(hot_queries)} queries frequentes...")
+        await search_service_pinecone.warm_up(hot_queries)
+
+    async def run(self) -> None:
+        """Executa todas as etapas e marca a instância como pronta"""
+        if not settings.startup_warmup_enabled:
+            self.state = "ready"
+            return
+
+        self.state = "warming"
+        start = time.perf_counter()
+        logger.info("🔥 Warm-up de conexões iniciado")
+        try:
+            await asyncio.gather(
+                self._step("openai", self._warm_openai),
+                self._step("pinecone", self._warm_pinecone),
+                self._step("gcs", self._warm_gcs)
+            )
+            await self._step("hot_queries", self._warm_hot_queries)
+        finally:
+            self.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.state = "ready"
+        logger.info(f"✅ Warm-up concluído em {self.duration_ms:.0f}ms")
+
+    def status(self) -> Dict:
+        """
+        Estado atual do warm-up
+
+        Returns:
+            Dicionário com estado, duração e resultado de cada etapa
+        """
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "duration_ms": self.duration_ms,
+            "steps": self.steps
+        }
+
+
+# Singleton instance
+warmup_service = WarmupService()
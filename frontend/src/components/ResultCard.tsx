@@ -147,7 +147,7 @@ export const ResultCard = ({ result, index }: ResultCardProps) => {
 
         {/* Botão Ver PDF - Responsivo */}
         <a
-          href={result.gcs_url}
+          href={result.page_url ?? result.gcs_url}
           target="_blank"
           rel="noopener noreferrer"
           className="w-full sm:w-auto inline-flex items-center justify-center gap-2 px-4 sm:px-5 py-2 sm:py-2.5 text-xs sm:text-sm text-white bg-primary-600 hover:bg-primary-700 rounded-lg font-medium transition-all duration-200 hover:shadow-lg hover:scale-105"
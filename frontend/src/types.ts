@@ -24,6 +24,7 @@ export interface SearchResult {
   upload_date: string;
   page_number?: number;
   gcs_url: string;
+  page_url?: string;
 }
 
 export interface SearchResponse {
@@ -0,0 +1,157 @@
+"""
+Script para preencher o campo numérico `upload_ts` nos vetores já indexados
+
+Vetores indexados antes da introdução de `upload_ts` só têm `upload_date`
+(string ISO), que o Pinecone não consegue comparar com $gte/$lte. Este
+script encontra esses vetores com o filtro `{"upload_ts": {"$exists": false}}`
+e atualiza apenas a metadata, em lotes paralelos, sem gerar embeddings.
+
+Uso:
+    python scripts/backfill_upload_ts.py
+    python scripts/backfill_upload_ts.py --dry-run
+    python scripts/backfill_upload_ts.py --batch-size 500 --workers 16
+"""
+import argparse
+import random
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.pinecone_client import pinecone_client
+
+
+def random_unit_vector(dimension: int):
+    """Vetor qualquer para a query (só o filtro importa aqui)"""
+    vector = [random.gauss(0, 1) for _ in range(dimension)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def to_upload_ts(upload_date: str):
+    """Converte o upload_date ISO da metadata em epoch (segundos)"""
+    try:
+        return int(datetime.fromisoformat(upload_date).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def find_missing(batch_size: int, skipped_documents: set):
+    """
+    Vetores ainda sem upload_ts, exceto os de documentos sem data válida
+
+    O Pinecone não filtra por ID de vetor: a exclusão é por document_id,
+    que compartilha o mesmo upload_date em todos os chunks.
+    """
+    missing_filter = {"upload_ts": {"$exists": False}}
+    if skipped_documents:
+        missing_filter = {"$and": [missing_filter, {"document_id": {"$nin": sorted(skipped_documents)}}]}
+    results = pinecone_client.query(
+        query_vector=random_unit_vector(pinecone_client.dimension),
+        top_k=batch_size,
+        filter=missing_filter,
+        include_metadata=True
+    )
+    return results.get("matches", [])
+
+
+def backfill(batch_size: int, workers: int, dry_run: bool, max_retries: int):
+    """
+    Atualiza upload_ts em lotes até não restarem vetores sem o campo
+
+    O index é eventualmente consistente: vetores recém-atualizados ainda
+    podem aparecer na query. Quando um lote só traz IDs já tratados, a query
+    é repetida com backoff exponencial (até max_retries vezes) antes de
+    encerrar; vetores novos no meio do caminho reiniciam a contagem.
+    """
+    print("=" * 70)
+    print("🕒 AgroFinder - Backfill de upload_ts no Pinecone")
+    print("=" * 70)
+    print()
+
+    seen = set()
+    skipped_documents = set()
+    updated = 0
+    skipped = 0
+    failed = 0
+    retries = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            matches = find_missing(batch_size, skipped_documents)
+            if not matches:
+                break
+
+            # IDs já tratados (atualização ainda não propagada, sem data ou com erro)
+            batch = [m for m in matches if m["id"] not in seen]
+            if not batch:
+                if dry_run or retries >= max_retries:
+                    break
+                delay = 2 ** retries
+                retries += 1
+                print(f"   ⏳ Só vetores já tratados; aguardando propagação ({delay}s, tentativa {retries}/{max_retries})")
+                time.sleep(delay)
+                continue
+            retries = 0
+
+            updates = []
+            for match in batch:
+                seen.add(match["id"])
+                metadata = match.get("metadata") or {}
+                upload_ts = to_upload_ts(metadata.get("upload_date"))
+                if upload_ts is None:
+                    skipped += 1
+                    if metadata.get("document_id"):
+                        skipped_documents.add(metadata["document_id"])
+                    continue
+                updates.append((match["id"], {"upload_ts": upload_ts}))
+
+            if dry_run:
+                updated += len(updates)
+            else:
+                futures = [
+                    executor.submit(pinecone_client.update_metadata, vector_id, metadata)
+                    for vector_id, metadata in updates
+                ]
+                for future in futures:
+                    try:
+                        future.result()
+                        updated += 1
+                    except Exception as e:
+                        print(f"   ❌ Erro: {str(e)[:100]}")
+                        failed += 1
+
+            print(f"   📦 Lote: {len(batch)} vetores | atualizados: {updated} | sem data: {skipped} | erros: {failed}")
+
+            if dry_run:
+                # Sem atualizar, a query retornaria sempre os mesmos vetores
+                break
+
+    # Verificação final, sem excluir nada: o que ainda está sem upload_ts
+    remaining = len(find_missing(1000, set()))
+
+    print()
+    print("=" * 70)
+    print("📈 RESUMO")
+    print("=" * 70)
+    label = "A atualizar (dry-run)" if dry_run else "Atualizados"
+    print(f"✅ {label}: {updated}")
+    print(f"⚠️  Sem upload_date válido: {skipped} vetores vistos ({len(skipped_documents)} documentos excluídos da busca)")
+    print(f"❌ Erros: {failed}")
+    limit = "+" if remaining >= 1000 else ""
+    print(f"🕒 Ainda sem upload_ts: {remaining}{limit} (inclui os sem data, os com erro e atualizações não propagadas)")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill de upload_ts no Pinecone")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Vetores por query (máx. 1000)")
+    parser.add_argument("--workers", type=int, default=8, help="Updates paralelos")
+    parser.add_argument("--dry-run", action="store_true", help="Só contar o primeiro lote, sem atualizar")
+    parser.add_argument("--max-retries", type=int, default=5, help="Novas queries (com backoff) quando só vêm vetores já tratados")
+    args = parser.parse_args()
+
+    backfill(min(args.batch_size, 1000), args.workers, args.dry_run, args.max_retries)
@@ -0,0 +1,354 @@
+"""
+Micro-benchmarks dos caminhos quentes de ingestão e busca
+
+Roda offline (sem OpenAI/Pinecone/GCS), sobre PDFs gerados com tamanhos e
+densidades de texto variados, e mede:
+
+    - extract_text_from_pdf (pdfplumber)
+    - chunk_text
+    - build_chunk_records (ids + metadata dos chunks)
+    - _build_pinecone_filter
+    - _process_results
+    - serialização da resposta (orjson, com e sem gzip)
+
+Os resultados podem ser salvos em JSON e comparados com uma execução
+anterior; o modo de comparação sai com código 1 se alguma mediana piorar
+além da tolerância.
+
+Uso:
+    python scripts/benchmark_hot_paths.py --output baseline.json
+    python scripts/benchmark_hot_paths.py --output atual.json --compare baseline.json
+    python scripts/benchmark_hot_paths.py --current atual.json --compare baseline.json
+    python scripts/benchmark_hot_paths.py --filter chunk --min-time 0.5
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+# Credenciais fictícias: nenhum serviço externo é chamado neste benchmark
+for _var in ("OPENAI_API_KEY", "PINECONE_API_KEY", "GCS_BUCKET_NAME"):
+    os.environ.setdefault(_var, "benchmark")
+
+from backend.models.schemas import DocumentCategory
+from backend.services.ingestion_pinecone import ingestion_service_pinecone
+from backend.services.offline import make_sample_pdf
+from backend.services.search_pinecone import search_service_pinecone
+from backend.services.serialization import json_response, search_response_bytes
+
+WORDS = (
+    "vendo trator massey ferguson ano 2015 revisado pneus novos soja milho "
+    "colheitadeira plantadeira hectares fazenda gado nelore bezerros leite "
+    "orgânico certificado adubo calcário irrigação pivô contato whatsapp "
+    "preço negociável entrega região sul minas goiás mato grosso safra"
+).split()
+
+# Perfis de documento: (páginas, palavras por página)
+# Uma página cheia do PDF gerado comporta ~900 palavras (70 linhas de 90 caracteres)
+PDF_PROFILES: Dict[str, Tuple[int, int]] = {
+    "small_sparse": (1, 80),
+    "small_dense": (2, 850),
+    "medium_dense": (10, 850),
+    "large_sparse": (40, 120),
+    "large_dense": (20, 850),
+}
+
+RESULT_COUNTS = (10, 50)
+
+
+def make_text(rng: random.Random, num_words: int) -> str:
+    """Texto pseudo-aleatório com vocabulário de anúncios"""
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+
+def make_pdf(pages: int, words_per_page: int, seed: int = 7) -> bytes:
+    """Gera um PDF com o número de páginas e a densidade pedidos"""
+    rng = random.Random(seed)
+    return make_sample_pdf([make_text(rng, words_per_page) for _ in range(pages)])
+
+
+def make_matches(num_results: int, chunk_chars: int = 1000, seed: int = 7) -> dict:
+    """Gera resultados no formato retornado pelo Pinecone"""
+    rng = random.Random(seed)
+    base_date = datetime(2024, 5, 1, 10, 30)
+    matches = []
+
+    for i in range(num_results):
+        document = i // 5
+        upload_date = base_date + timedelta(days=document)
+        matches.append({
+            "id": f"doc{document}_page{i % 5 + 1}_chunk0",
+            "score": 0.9 - i * 0.01,
+            "metadata": {
+                "document_id": f"doc{document:032d}",
+                "filename": f"anuncio_{document}.pdf",
+                "category": "anuncio" if document % 2 else "organico",
+                "page_number": float(i % 5 + 1),
+                "chunk_index": 0.0,
+                "gcs_path": f"anuncios/anuncio_{document}.pdf",
+                "upload_date": upload_date.isoformat(),
+                "upload_ts": float(int(upload_date.timestamp())),
+                "text": make_text(rng, chunk_chars // 7)[:chunk_chars]
+            }
+        })
+
+    return {"matches": matches}
+
+
+def measure(fn: Callable[[], object], min_time: float, min_iterations: int, warmup: int = 3) -> Dict:
+    """
+    Executa fn até atingir o tempo e o número de iterações mínimos
+
+    Returns:
+        Estatísticas em microssegundos (mediana, p95, média, mínimo) e iterações
+    """
+    for _ in range(warmup):
+        fn()
+    gc.collect()
+
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < min_iterations or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+    n = len(samples)
+    return {
+        "median_us": round(samples[n // 2] * 1e6, 3),
+        "p95_us": round(samples[min(n - 1, int(n * 0.95))] * 1e6, 3),
+        "mean_us": round(sum(samples) / n * 1e6, 3),
+        "min_us": round(samples[0] * 1e6, 3),
+        "iterations": n
+    }
+
+
+def build_benchmarks() -> Dict[str, Tuple[Callable[[], object], Dict]]:
+    """
+    Prepara os dados e as funções medidas
+
+    Returns:
+        {nome: (função, parâmetros)}; parâmetros com "slow" usam menos iterações
+    """
+    ingestion = ingestion_service_pinecone
+    benchmarks: Dict[str, Tuple[Callable[[], object], Dict]] = {}
+    upload_date = datetime(2024, 5, 1, 10, 30)
+
+    for name, (pages, words) in PDF_PROFILES.items():
+        pdf_bytes = make_pdf(pages, words)
+        pages_text = ingestion.extract_text_from_pdf(pdf_bytes)
+        params = {
+            "pages": pages,
+            "words_per_page": words,
+            "pdf_bytes": len(pdf_bytes),
+            "text_chars": sum(len(text) for _, text in pages_text)
+        }
+
+        benchmarks[f"extract_text_from_pdf[{name}]"] = (
+            lambda pdf_bytes=pdf_bytes: ingestion.extract_text_from_pdf(pdf_bytes), {**params, "slow": True}
+        )
+        benchmarks[f"chunk_text[{name}]"] = (
+            lambda pages_text=pages_text: [ingestion.chunk_text(text) for _, text in pages_text], params
+        )
+        benchmarks[f"build_chunk_records[{name}]"] = (
+            lambda pages_text=pages_text: ingestion.build_chunk_records(
+                pages_text, "0" * 32, "anuncio.pdf", DocumentCategory.ANUNCIO,
+                "anuncios/anuncio.pdf", upload_date
+            ),
+            params
+        )
+
+    date_from = datetime(2024, 1, 1)
+    date_to = datetime(2024, 12, 31)
+    filters = {
+        "none": (None, None, None),
+        "category": (DocumentCategory.ANUNCIO, None, None),
+        "category_dates": (DocumentCategory.ANUNCIO, date_from, date_to),
+    }
+    for name, args in filters.items():
+        benchmarks[f"build_pinecone_filter[{name}]"] = (
+            lambda args=args: search_service_pinecone._build_pinecone_filter(*args), {}
+        )
+
+    for count in RESULT_COUNTS:
+        pinecone_results = make_matches(count)
+        results = search_service_pinecone._process_results(pinecone_results)
+        params = {"results": count}
+        benchmarks[f"process_results[{count}]"] = (
+            lambda pinecone_results=pinecone_results: search_service_pinecone._process_results(pinecone_results),
+            params
+        )
+        benchmarks[f"serialize_response[{count}]"] = (
+            lambda results=results: json_response(search_response_bytes("trator usado", results, 123.45)),
+            params
+        )
+        benchmarks[f"serialize_response_gzip[{count}]"] = (
+            lambda results=results: json_response(search_response_bytes("trator usado", results, 123.45), "gzip"),
+            params
+        )
+
+    return benchmarks
+
+
+def git_revision() -> Optional[str]:
+    """Commit atual (para identificar a execução no JSON)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict:
+    """Executa os benchmarks selecionados e imprime os resultados"""
+    benchmarks = build_benchmarks()
+    if args.filter:
+        benchmarks = {name: b for name, b in benchmarks.items() if args.filter in name}
+
+    print("=" * 78)
+    print("⏱️  Micro-benchmarks - caminhos quentes de ingestão e busca")
+    print("=" * 78)
+    print(f"{'benchmark':<44} {'mediana':>10} {'p95':>10} {'iter':>8}")
+
+    results = {}
+    for name, (fn, params) in benchmarks.items():
+        if params.pop("slow", False):
+            # pdfplumber leva segundos em PDFs grandes: poucas amostras bastam
+            stats = measure(fn, 0, args.slow_iterations, warmup=1)
+        else:
+            stats = measure(fn, args.min_time, args.min_iterations)
+        stats["params"] = params
+        results[name] = stats
+        print(f"{name:<44} {format_us(stats['median_us']):>10} {format_us(stats['p95_us']):>10} {stats['iterations']:>8}")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "min_time": args.min_time,
+            "min_iterations": args.min_iterations,
+            "slow_iterations": args.slow_iterations
+        },
+        "benchmarks": results
+    }
+
+
+def format_us(value: float) -> str:
+    """Formata microssegundos na unidade mais legível"""
+    if value >= 1000:
+        return f"{value / 1000:.2f} ms"
+    return f"{value:.1f} µs"
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_delta_us: float) -> List[str]:
+    """
+    Compara medianas com uma execução anterior
+
+    Args:
+        current: Resultado atual
+        baseline: Resultado de referência
+        threshold: Piora relativa tolerada (0.10 = 10%)
+        min_delta_us: Diferença absoluta mínima para contar como regressão (ruído)
+
+    Returns:
+        Nomes dos benchmarks com regressão
+    """
+    regressions = []
+    current_benchmarks = current["benchmarks"]
+    baseline_benchmarks = baseline["benchmarks"]
+
+    print()
+    print("=" * 78)
+    print(f"📊 Comparação com {baseline['meta'].get('git_revision') or 'baseline'} "
+          f"(tolerância: {threshold:.0%}, ruído: {min_delta_us:.0f} µs)")
+    print("=" * 78)
+    print(f"{'benchmark':<44} {'antes':>10} {'agora':>10} {'variação':>9}")
+
+    for name, stats in current_benchmarks.items():
+        before = baseline_benchmarks.get(name)
+        if before is None:
+            print(f"{name:<44} {'-':>10} {format_us(stats['median_us']):>10} {'novo':>9}")
+            continue
+
+        old, new = before["median_us"], stats["median_us"]
+        if before.get("params") != stats.get("params"):
+            # Entrada gerada diferente (ex: perfil de PDF alterado): números não comparáveis
+            print(f"{name:<44} {format_us(old):>10} {format_us(new):>10} {'entrada≠':>9}")
+            continue
+        change = (new - old) / old if old else 0.0
+        if change > threshold and new - old > min_delta_us:
+            status = "❌"
+            regressions.append(name)
+        elif change < -threshold and old - new > min_delta_us:
+            status = "✅"
+        else:
+            status = "  "
+        print(f"{name:<44} {format_us(old):>10} {format_us(new):>10} {change:>+8.1%} {status}")
+
+    missing = set(baseline_benchmarks) - set(current_benchmarks)
+    if missing:
+        print(f"\n{len(missing)} benchmark(s) da referência não executado(s) nesta rodada")
+
+    print()
+    if regressions:
+        print(f"❌ {len(regressions)} regressão(ões): {', '.join(regressions)}")
+    else:
+        print("✅ Nenhuma regressão acima da tolerância")
+    return regressions
+
+
+def load(path: str) -> Dict:
+    """Lê um resultado salvo em JSON"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos quentes")
+    parser.add_argument("--output", help="Arquivo para salvar os resultados em JSON")
+    parser.add_argument("--compare", help="Resultado de referência (JSON) para detectar regressões")
+    parser.add_argument("--current", help="Comparar este resultado salvo em vez de executar")
+    parser.add_argument("--filter", help="Executar só benchmarks cujo nome contém este texto")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Tempo mínimo por benchmark (s)")
+    parser.add_argument("--min-iterations", type=int, default=20)
+    parser.add_argument("--slow-iterations", type=int, default=3, help="Iterações da extração de PDF")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Piora relativa tolerada")
+    parser.add_argument("--min-delta-us", type=float, default=2.0, help="Diferença absoluta ignorada (µs)")
+    args = parser.parse_args()
+
+    if args.current and not args.compare:
+        parser.error("--current requer --compare")
+
+    # pdfplumber/serviços logam a cada chamada
+    logging.disable(logging.INFO)
+
+    current = load(args.current) if args.current else run(args)
+
+    if args.output and not args.current:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        regressions = compare(current, load(args.compare), args.threshold, args.min_delta_us)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
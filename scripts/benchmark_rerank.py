@@ -0,0 +1,122 @@
+"""
+Benchmark do rerank MMR local
+
+Reproduz as duas etapas do caminho real de `search()`:
+
+- empacotamento: `pinecone_client.query(values_matrix=True)` converte as
+  listas de floats dos matches numa matriz float32, na thread da query
+  (conta na etapa "pinecone" das métricas)
+- rerank: `rerank_results` -> `mmr_rerank` sobre essa matriz, no event loop
+  (etapa "rerank")
+
+Falha se o p99 do rerank ultrapassar o orçamento por query. O total das
+duas etapas também é reportado.
+
+Uso:
+    python scripts/benchmark_rerank.py
+    python scripts/benchmark_rerank.py --candidates 100 --top-k 10 --budget-ms 5
+"""
+import argparse
+import sys
+import os
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.reranking import mmr_rerank, to_matrix
+
+
+def make_candidates(num_candidates: int, dimension: int, seed: int = 42):
+    """Gera query e candidatos sintéticos, com alguns quase-duplicados"""
+    rng = np.random.default_rng(seed)
+    query = rng.standard_normal(dimension).astype(np.float32)
+    candidates = rng.standard_normal((num_candidates, dimension)).astype(np.float32)
+
+    # Aproximar candidatos da query e criar duplicatas, como em anúncios repetidos
+    candidates += query * 0.5
+    candidates[1::10] = candidates[0::10][:len(candidates[1::10])] + 0.001
+
+    matches = [{"id": f"c{i}", "values": row} for i, row in enumerate(candidates.tolist())]
+    return query.tolist(), matches
+
+
+def percentile(samples, pct: float) -> float:
+    """Percentil simples (em ms) de uma lista de amostras em segundos"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do rerank MMR")
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lambda-mult", type=float, default=0.7)
+    parser.add_argument("--dedup-threshold", type=float, default=0.97)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="Orçamento de p99 por query")
+    args = parser.parse_args()
+
+    query, matches = make_candidates(args.candidates, args.dimension)
+
+    def pack():
+        # Mesma conversão de pinecone_client.query(values_matrix=True)
+        return to_matrix([match.get("values") for match in matches])
+
+    def rerank(values_matrix):
+        # Mesma chamada de search() -> rerank_results
+        return mmr_rerank(
+            query,
+            values_matrix,
+            top_k=args.top_k,
+            lambda_mult=args.lambda_mult,
+            dedup_threshold=args.dedup_threshold
+        )
+
+    # Aquecimento (BLAS, caches)
+    for _ in range(10):
+        rerank(pack())
+
+    samples, pack_samples, total_samples = [], [], []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        values_matrix = pack()
+        packed = time.perf_counter()
+        selected = rerank(values_matrix)
+        end = time.perf_counter()
+        pack_samples.append(packed - start)
+        samples.append(end - packed)
+        total_samples.append(end - start)
+
+    p50 = percentile(samples, 50)
+    p95 = percentile(samples, 95)
+    p99 = percentile(samples, 99)
+
+    print("=" * 70)
+    print("🧮 Benchmark - Rerank MMR")
+    print("=" * 70)
+    print(f"Candidatos: {args.candidates} x {args.dimension} | top_k={args.top_k} | iterações={args.iterations}")
+    print(f"Selecionados: {len(selected)}")
+    print(f"Rerank         p50: {p50:.3f} ms | p95: {p95:.3f} ms | p99: {p99:.3f} ms")
+    print(
+        f"Empacotamento  p50: {percentile(pack_samples, 50):.3f} ms | "
+        f"p99: {percentile(pack_samples, 99):.3f} ms (thread da query no Pinecone)"
+    )
+    print(
+        f"Total          p50: {percentile(total_samples, 50):.3f} ms | "
+        f"p99: {percentile(total_samples, 99):.3f} ms"
+    )
+    print(f"Orçamento (p99): {args.budget_ms:.2f} ms")
+
+    if p99 > args.budget_ms:
+        print("❌ Orçamento excedido")
+        sys.exit(1)
+
+    print("✅ Dentro do orçamento")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark da serialização das respostas de busca
+
+Compara o caminho anterior (SearchResult validado por match, fromisoformat
+a cada chunk e revalidação do response_model pelo FastAPI) com o caminho
+rápido (model_construct + orjson + compressão), usando resultados com
+chunks de tamanho realista. Roda offline, sem OpenAI/Pinecone.
+
+Uso:
+    python scripts/benchmark_serialization.py
+    python scripts/benchmark_serialization.py --results 50 --chunk-chars 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Credenciais fictícias: nenhum serviço externo é chamado neste benchmark
+for _var in ("OPENAI_API_KEY", "PINECONE_API_KEY", "GCS_BUCKET_NAME"):
+    os.environ.setdefault(_var, "benchmark")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from backend.models.schemas import SearchResult, SearchResponse, DocumentCategory
+from backend.services.search_pinecone import search_service_pinecone
+from backend.services.serialization import search_response_bytes, json_response
+
+WORDS = (
+    "vendo trator massey ferguson ano 2015 revisado pneus novos soja milho "
+    "colheitadeira plantadeira hectares fazenda gado nelore bezerros leite "
+    "orgânico certificado adubo calcário irrigação pivô contato whatsapp"
+).split()
+
+
+def make_matches(num_results: int, chunk_chars: int, seed: int = 7) -> dict:
+    """Gera resultados no formato retornado pelo Pinecone"""
+    rng = random.Random(seed)
+    base_date = datetime(2024, 5, 1, 10, 30)
+    matches = []
+
+    for i in range(num_results):
+        text = []
+        while sum(len(w) + 1 for w in text) < chunk_chars:
+            text.append(rng.choice(WORDS))
+        document = i // 5
+        matches.append({
+            "id": f"doc{document}_page{i % 5 + 1}_chunk0",
+            "score": 0.9 - i * 0.01,
+            "metadata": {
+                "document_id": f"doc{document:032d}",
+                "filename": f"anuncio_{document}.pdf",
+                "category": "anuncio" if document % 2 else "organico",
+                "page_number": float(i % 5 + 1),
+                "chunk_index": 0.0,
+                "gcs_path": f"anuncios/anuncio_{document}.pdf",
+                "upload_date": (base_date + timedelta(days=document)).isoformat(),
+                "text": " ".join(text)
+            }
+        })
+
+    return {"matches": matches}
+
+
+def legacy_process_results(pinecone_results: dict):
+    """Reprodução do _process_results anterior (validação por resultado)"""
+    results = []
+    for match in pinecone_results.get("matches", []):
+        metadata = match.get("metadata", {})
+        gcs_path = metadata.get("gcs_path", "")
+        api_url = f"/api/document/{gcs_path}" if gcs_path else ""
+        # Pinecone devolve números como float; a validação do modelo converte para int
+        page_number = metadata.get("page_number")
+        page_number = int(page_number) if page_number is not None else None
+        results.append(SearchResult(
+            document_id=metadata.get("document_id", ""),
+            filename=metadata.get("filename", ""),
+            category=DocumentCategory(metadata.get("category", "anuncio")),
+            chunk_text=metadata.get("text", ""),
+            similarity_score=round(match.get("score", 0.0), 4),
+            upload_date=datetime.fromisoformat(metadata.get("upload_date", datetime.now().isoformat())),
+            page_number=page_number,
+            gcs_url=api_url,
+            page_url=f"{api_url}?page={page_number}" if api_url and page_number else None
+        ))
+    return results
+
+
+RESPONSE_FIELD = create_model_field(name="Response_search", type_=SearchResponse)
+LOOP = asyncio.new_event_loop()
+
+
+def legacy_path(pinecone_results: dict) -> bytes:
+    """Caminho anterior: modelos validados + serialize_response + JSONResponse"""
+    results = legacy_process_results(pinecone_results)
+    response = SearchResponse(
+        query="trator usado",
+        results=results,
+        total_results=len(results),
+        processing_time_ms=123.45
+    )
+    content = LOOP.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=response))
+    return JSONResponse(content).body
+
+
+def fast_path(pinecone_results: dict, accept_encoding: str = None) -> bytes:
+    """Caminho rápido: model_construct + orjson (+ compressão opcional)"""
+    results = search_service_pinecone._process_results(pinecone_results)
+    body = search_response_bytes("trator usado", results, 123.45)
+    return json_response(body, accept_encoding).body
+
+
+def measure(label: str, fn, iterations: int) -> float:
+    """Executa fn repetidamente e imprime a mediana em ms"""
+    for _ in range(5):
+        fn()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+    median = samples[len(samples) // 2] * 1000
+    p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+    print(f"{label:<32} mediana: {median:7.3f} ms | p95: {p95:7.3f} ms")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialização da busca")
+    parser.add_argument("--results", type=int, default=50)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    pinecone_results = make_matches(args.results, args.chunk_chars)
+
+    # As duas saídas precisam ser equivalentes
+    legacy = json.loads(legacy_path(pinecone_results))
+    fast = json.loads(fast_path(pinecone_results))
+    if legacy != fast:
+        print("❌ Caminho rápido produz JSON diferente do caminho anterior")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("📦 Benchmark - Serialização da busca")
+    print("=" * 70)
+    print(f"Resultados: {args.results} | chunk: ~{args.chunk_chars} caracteres | iterações: {args.iterations}")
+    print()
+
+    legacy_ms = measure("Anterior (validação dupla)", lambda: legacy_path(pinecone_results), args.iterations)
+    fast_ms = measure("Rápido (orjson)", lambda: fast_path(pinecone_results), args.iterations)
+    measure("Rápido + gzip", lambda: fast_path(pinecone_results, "gzip"), args.iterations)
+    measure("Rápido + brotli", lambda: fast_path(pinecone_results, "br"), args.iterations)
+
+    raw_size = len(fast_path(pinecone_results))
+    print()
+    print(f"Tamanho: {raw_size / 1024:.1f} KB | gzip: {len(fast_path(pinecone_results, 'gzip')) / 1024:.1f} KB"
+          f" | br: {len(fast_path(pinecone_results, 'br')) / 1024:.1f} KB")
+    print(f"Speedup (sem compressão): {legacy_ms / fast_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
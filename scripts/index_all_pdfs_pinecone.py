@@ -4,12 +4,16 @@ Script para indexar todos os PDFs do bucket GCS no Pinecone
 import asyncio
 import sys
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional, Tuple
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from google.cloud import storage
 from backend.services.ingestion_pinecone import ingestion_service_pinecone
+from backend.services.ingestion_profile import ingestion_ledger, summarize
+from backend.services.dedup import chunk_deduplicator
+from backend.services.page_slices import is_page_slice
 from backend.services.pinecone_client import pinecone_client
 from backend.models.schemas import DocumentCategory
 from backend.config import settings
@@ -31,7 +35,7 @@ def list_all_pdfs() -> Dict[str, List[str]]:
     blobs = bucket.list_blobs()
     
     for blob in blobs:
-        if blob.name.endswith('.pdf'):
+        if blob.name.endswith('.pdf') and not is_page_slice(blob.name):
             if blob.name.startswith('anuncios/'):
                 pdfs["anuncios"].append(blob.name)
             elif blob.name.startswith('organico/'):
@@ -46,7 +50,72 @@ def list_all_pdfs() -> Dict[str, List[str]]:
     return pdfs
 
 
-async def index_all():
+async def index_files(paths: List[str], category: DocumentCategory, concurrency: int) -> Tuple[int, int, int]:
+    """
+    Indexa uma lista de PDFs com até `concurrency` ingestões simultâneas
+    
+    Returns:
+        Tupla (sucessos, erros, total_de_chunks)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    
+    async def index_one(pdf_path: str) -> Optional[int]:
+        nonlocal done
+        async with semaphore:
+            filename = pdf_path.split('/')[-1]
+            try:
+                document_id, num_chunks = await ingestion_service_pinecone.ingest_pdf(
+                    gcs_path=pdf_path,
+                    category=category,
+                    metadata={"indexed_by": "batch_script_pinecone", "source": "reindex"}
+                )
+                done += 1
+                print(f"[{done}/{len(paths)}] 📄 {filename}")
+                print(f"   ✅ Sucesso! {num_chunks} chunks criados\n")
+                return num_chunks
+            except Exception as e:
+                done += 1
+                print(f"[{done}/{len(paths)}] 📄 {filename}")
+                print(f"   ❌ Erro: {str(e)[:100]}\n")
+                return None
+    
+    results = await asyncio.gather(*[index_one(path) for path in paths])
+    successes = [r for r in results if r is not None]
+    return len(successes), len(results) - len(successes), sum(successes)
+
+
+def print_profile_summary(run_started: float, top_n: int = 10) -> None:
+    """Ranking das etapas e documentos mais lentos desta execução (ledger)"""
+    records = [r for r in ingestion_ledger.recent if r.get("t", 0) >= int(run_started)]
+    if not records:
+        return
+    
+    summary = summarize(records, top_n=top_n)
+    totals = summary["totals"]
+    
+    print("⏱️  PERFIL DA INGESTÃO")
+    print("-" * 80)
+    print(f"   Páginas: {totals['pages']:,} | Bytes: {totals['bytes']:,} | "
+          f"Tokens de embedding: {totals['embedding_tokens']:,} | Lotes de upsert: {totals['upsert_batches']:,}")
+    if totals["dedup_skipped"]:
+        print(f"   Dedup: {totals['dedup_skipped']:,} chunks repetidos pulados | "
+              f"{totals['dedup_saved_tokens']:,} tokens e {totals['dedup_saved_bytes'] / 1024 / 1024:.1f} MB poupados")
+    print(f"   Throughput: {summary['throughput']['pages_per_s']} páginas/s | "
+          f"{summary['throughput']['chunks_per_s']} chunks/s (por documento)")
+    print()
+    print("   Etapas (tempo total de parede / CPU / p95 por documento):")
+    for name, stage in summary["stages"].items():
+        print(f"   {name:10s} {stage['wall_total_s']:9.2f}s  CPU {stage['cpu_total_s']:8.2f}s  p95 {stage['wall_p95_s']:7.2f}s")
+    print()
+    print(f"   {len(summary['slowest_documents'])} documentos mais lentos:")
+    for doc in summary["slowest_documents"]:
+        print(f"   {doc['wall_s']:8.2f}s  {doc['gcs_path']}  "
+              f"({doc['pages']} páginas, etapa mais lenta: {doc['slowest_stage']}, {doc['status']})")
+    print()
+
+
+async def index_all(concurrency: int = 4):
     """Indexa todos os PDFs do bucket no Pinecone"""
     
     print("=" * 80)
@@ -61,6 +130,9 @@ async def index_all():
         print(f"✅ Conectado ao Pinecone")
         print(f"   Index: {settings.pinecone_index_name}")
         print(f"   Vetores atuais: {stats.get('total_vectors', 0):,}")
+        if not stats.get('total_vectors', 0):
+            # Index vazio: as cópias canônicas do índice de dedup não existem mais
+            chunk_deduplicator.reset()
     except Exception as e:
         print(f"❌ Erro ao conectar no Pinecone: {e}")
         print(f"   Verifique se PINECONE_API_KEY está configurada no .env")
@@ -92,60 +164,24 @@ async def index_all():
     success_count = 0
     error_count = 0
     total_chunks = 0
-    
-    # Indexar anúncios
-    if pdfs['anuncios']:
-        print(f"\n{'='*80}")
-        print(f"📢 Indexando Anúncios ({len(pdfs['anuncios'])} arquivos)")
-        print(f"{'='*80}\n")
+    run_started = time.time()
+    
+    # Indexar anúncios e orgânicos (downloads e ingestões concorrentes)
+    for key, emoji, label, category in (
+        ("anuncios", "📢", "Anúncios", DocumentCategory.ANUNCIO),
+        ("organico", "🌱", "Orgânico", DocumentCategory.ORGANICO),
+    ):
+        if not pdfs[key]:
+            continue
         
-        for i, pdf_path in enumerate(pdfs['anuncios'], 1):
-            filename = pdf_path.split('/')[-1]
-            print(f"[{i}/{len(pdfs['anuncios'])}] 📄 {filename}")
-            
-            try:
-                document_id, num_chunks = await ingestion_service_pinecone.ingest_pdf(
-                    gcs_path=pdf_path,
-                    category=DocumentCategory.ANUNCIO,
-                    metadata={"indexed_by": "batch_script_pinecone", "source": "reindex"}
-                )
-                
-                print(f"   ✅ Sucesso! {num_chunks} chunks criados")
-                success_count += 1
-                total_chunks += num_chunks
-                
-            except Exception as e:
-                print(f"   ❌ Erro: {str(e)[:100]}")
-                error_count += 1
-            
-            print()
-    
-    # Indexar orgânicos
-    if pdfs['organico']:
         print(f"\n{'='*80}")
-        print(f"🌱 Indexando Orgânico ({len(pdfs['organico'])} arquivos)")
+        print(f"{emoji} Indexando {label} ({len(pdfs[key])} arquivos, concorrência {concurrency})")
         print(f"{'='*80}\n")
         
-        for i, pdf_path in enumerate(pdfs['organico'], 1):
-            filename = pdf_path.split('/')[-1]
-            print(f"[{i}/{len(pdfs['organico'])}] 📄 {filename}")
-            
-            try:
-                document_id, num_chunks = await ingestion_service_pinecone.ingest_pdf(
-                    gcs_path=pdf_path,
-                    category=DocumentCategory.ORGANICO,
-                    metadata={"indexed_by": "batch_script_pinecone", "source": "reindex"}
-                )
-                
-                print(f"   ✅ Sucesso! {num_chunks} chunks criados")
-                success_count += 1
-                total_chunks += num_chunks
-                
-            except Exception as e:
-                print(f"   ❌ Erro: {str(e)[:100]}")
-                error_count += 1
-            
-            print()
+        successes, errors, chunks = await index_files(pdfs[key], category, concurrency)
+        success_count += successes
+        error_count += errors
+        total_chunks += chunks
     
     # Resumo final
     print()
@@ -156,6 +192,8 @@ async def index_all():
     print(f"❌ Erros: {error_count}/{total_pdfs}")
     print(f"📊 Total de chunks criados: {total_chunks:,}")
     print()
+    print_profile_summary(run_started)
+    chunk_deduplicator.save()
     
     # Estatísticas finais do Pinecone
     try:
@@ -187,5 +225,9 @@ async def index_all():
 
 
 if __name__ == "__main__":
-    asyncio.run(index_all())
+    import argparse
+    parser = argparse.ArgumentParser(description="Indexa todos os PDFs do bucket no Pinecone")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documentos processados em paralelo")
+    args = parser.parse_args()
+    asyncio.run(index_all(concurrency=args.concurrency))
 
@@ -0,0 +1,233 @@
+"""
+Teste de carga para /api/search e /api/upload
+
+Dispara requisições em malha aberta (taxa fixa, independente das respostas)
+e reporta p50/p95/p99, throughput e taxa de erro por endpoint.
+
+Modos:
+    # Contra uma API rodando (ex: com OFFLINE_MODE=true para não gastar cota)
+    python scripts/load_test.py --url http://localhost:8000 --rps 20 --duration 30
+
+    # Em processo, com os substitutos offline (OpenAI/Pinecone/GCS locais)
+    python scripts/load_test.py --in-process --rps 50 --duration 20 \\
+        --openai-latency-ms 150 --pinecone-latency-ms 60 --gcs-latency-ms 30
+
+    # Salvar o resultado para comparar mudanças de performance
+    python scripts/load_test.py --in-process --json resultado.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+QUERIES = [
+    "trator usado à venda",
+    "colheitadeira john deere",
+    "soja orgânica certificada",
+    "gado nelore para engorda",
+    "adubo orgânico para hortaliças",
+    "fazenda à venda em goiás",
+    "pulverizador autopropelido",
+    "milho safrinha preço",
+    "irrigação por pivô central",
+    "bezerros desmamados",
+]
+
+AD_WORDS = (
+    "vendo trator massey ferguson ano revisado pneus novos soja milho colheitadeira "
+    "plantadeira hectares fazenda gado nelore bezerros leite orgânico certificado adubo "
+    "calcário irrigação pivô pulverizador safra preço negociável contato whatsapp"
+).split()
+
+
+def random_pdf(rng: random.Random) -> bytes:
+    """Gera um PDF de anúncio com 1 a 4 páginas de texto aleatório"""
+    from backend.services.offline import make_sample_pdf
+
+    pages = [
+        " ".join(rng.choice(AD_WORDS) for _ in range(rng.randint(80, 400)))
+        for _ in range(rng.randint(1, 4))
+    ]
+    return make_sample_pdf(pages)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por vizinho mais próximo"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoadTest:
+    """Gerador de carga em malha aberta"""
+
+    def __init__(self, client: httpx.AsyncClient, rps: float, duration: float, upload_ratio: float, seed: int):
+        self.client = client
+        self.rps = rps
+        self.duration = duration
+        self.upload_ratio = upload_ratio
+        self.rng = random.Random(seed)
+        self.samples: Dict[str, List[tuple]] = {"search": [], "upload": []}
+
+    async def _search(self) -> None:
+        payload = {"query": self.rng.choice(QUERIES), "top_k": self.rng.choice([5, 10, 20])}
+        await self._timed("search", self.client.post("/api/search", json=payload))
+
+    async def _upload(self) -> None:
+        pdf = random_pdf(self.rng)
+        files = {"file": (f"loadtest_{self.rng.randint(0, 10**9)}.pdf", pdf, "application/pdf")}
+        await self._timed("upload", self.client.post("/api/upload", files=files, params={"category": "anuncio"}))
+
+    async def _timed(self, endpoint: str, request) -> None:
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+            status = response.status_code
+        except Exception as e:
+            ok = False
+            status = type(e).__name__
+        self.samples[endpoint].append((time.perf_counter() - start, ok, status))
+
+    async def seed_documents(self, count: int) -> None:
+        """Envia documentos iniciais para que as buscas tenham resultados"""
+        for _ in range(count):
+            await self._upload()
+        self.samples["upload"].clear()
+
+    async def run(self) -> float:
+        """Executa o teste e retorna o tempo decorrido"""
+        tasks = []
+        total = int(self.rps * self.duration)
+        start = time.perf_counter()
+
+        for i in range(total):
+            delay = start + i / self.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            job = self._upload() if self.rng.random() < self.upload_ratio else self._search()
+            tasks.append(asyncio.create_task(job))
+
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> Dict:
+        """Resumo por endpoint"""
+        summary = {"elapsed_s": round(elapsed, 2), "target_rps": self.rps, "endpoints": {}}
+        for endpoint, samples in self.samples.items():
+            if not samples:
+                continue
+            latencies = [s[0] * 1000 for s in samples]
+            errors = [s for s in samples if not s[1]]
+            status_counts: Dict[str, int] = {}
+            for _, _, status in samples:
+                status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+            summary["endpoints"][endpoint] = {
+                "requests": len(samples),
+                "throughput_rps": round((len(samples) - len(errors)) / elapsed, 2),
+                "error_rate": round(len(errors) / len(samples), 4),
+                "p50_ms": round(percentile(latencies, 50), 1),
+                "p95_ms": round(percentile(latencies, 95), 1),
+                "p99_ms": round(percentile(latencies, 99), 1),
+                "max_ms": round(max(latencies), 1),
+                "status": status_counts
+            }
+        return summary
+
+
+def print_report(summary: Dict) -> None:
+    print()
+    print("=" * 70)
+    print("📈 RESULTADO DO TESTE DE CARGA")
+    print("=" * 70)
+    print(f"Duração: {summary['elapsed_s']}s | taxa alvo: {summary['target_rps']} req/s")
+    for endpoint, data in summary["endpoints"].items():
+        print()
+        print(f"🔹 /api/{endpoint}")
+        print(f"   Requisições: {data['requests']} | throughput: {data['throughput_rps']} req/s | erros: {data['error_rate']:.2%}")
+        print(f"   p50: {data['p50_ms']} ms | p95: {data['p95_ms']} ms | p99: {data['p99_ms']} ms | máx: {data['max_ms']} ms")
+        print(f"   Status: {data['status']}")
+    print()
+
+
+def configure_offline(args) -> None:
+    """Configura o modo offline antes de importar o backend"""
+    data_dir = tempfile.mkdtemp(prefix="agrofinder_loadtest_")
+    os.environ.update({
+        "OFFLINE_MODE": "true",
+        "OFFLINE_DATA_DIR": data_dir,
+        "OFFLINE_OPENAI_LATENCY_MS": str(args.openai_latency_ms),
+        "OFFLINE_PINECONE_LATENCY_MS": str(args.pinecone_latency_ms),
+        "OFFLINE_GCS_LATENCY_MS": str(args.gcs_latency_ms),
+        # Todo estado local da API fica no diretório temporário, fora de data/
+        "QUERY_LOG_PATH": os.path.join(data_dir, "query_log.jsonl"),
+        "INGEST_LEDGER_PATH": os.path.join(data_dir, "ingest_ledger.jsonl"),
+        "BLOB_CACHE_DIR": os.path.join(data_dir, "blob_cache"),
+        "CATALOG_DB_PATH": os.path.join(data_dir, "catalog.db"),
+        "DEDUP_INDEX_PATH": os.path.join(data_dir, "dedup_index.npz"),
+        "CACHE_SQLITE_PATH": os.path.join(data_dir, "search_cache.db"),
+        "LOG_LEVEL": "WARNING",
+    })
+    for var in ("OPENAI_API_KEY", "PINECONE_API_KEY", "GCS_BUCKET_NAME"):
+        os.environ.setdefault(var, "offline")
+    print(f"🧪 Modo offline em processo (dados em {data_dir})")
+
+
+async def main(args) -> None:
+    if args.in_process:
+        configure_offline(args)
+        from backend.main import app
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+    else:
+        transport = None
+        base_url = args.url
+
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=timeout, limits=limits) as client:
+        test = LoadTest(client, args.rps, args.duration, args.upload_ratio, args.seed)
+
+        if args.seed_docs:
+            print(f"🌱 Enviando {args.seed_docs} documentos iniciais...")
+            await test.seed_documents(args.seed_docs)
+
+        print(f"🚀 {args.rps} req/s por {args.duration}s ({args.upload_ratio:.0%} uploads)...")
+        elapsed = await test.run()
+
+    summary = test.report(elapsed)
+    print_report(summary)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultado salvo em {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do AgroFinder")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base da API")
+    parser.add_argument("--in-process", action="store_true", help="Rodar a API em processo com substitutos offline")
+    parser.add_argument("--rps", type=float, default=10.0, help="Taxa alvo de requisições por segundo")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duração em segundos")
+    parser.add_argument("--upload-ratio", type=float, default=0.05, help="Fração de requisições que são uploads")
+    parser.add_argument("--seed-docs", type=int, default=10, help="Documentos enviados antes do teste")
+    parser.add_argument("--seed", type=int, default=42, help="Semente aleatória (reprodutibilidade)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--openai-latency-ms", type=float, default=150.0)
+    parser.add_argument("--pinecone-latency-ms", type=float, default=60.0)
+    parser.add_argument("--gcs-latency-ms", type=float, default=30.0)
+    parser.add_argument("--json", help="Arquivo para salvar o resumo em JSON")
+    asyncio.run(main(parser.parse_args()))
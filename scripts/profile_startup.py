@@ -0,0 +1,145 @@
+"""
+Perfil de tempo de import (cold start) da API
+
+Roda `python -X importtime -c "import backend.main"` em um processo novo e
+reporta o tempo total e os módulos mais caros (tempo cumulativo e próprio).
+Com --warmup, mede também o warm-up de conexões em processo.
+
+Uso:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --top 30 --json startup.json
+    python scripts/profile_startup.py --offline --warmup
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+# Pacotes que não deveriam ser importados só para subir a API (SDKs e os
+# usados só na ingestão ou em backends opcionais)
+LAZY_MODULES = (
+    "openai", "pinecone", "google.cloud.storage",
+    "pdfplumber", "pdfminer", "pypdf", "PIL", "redis"
+)
+
+
+def parse_importtime_line(line: str):
+    """
+    Interpreta uma linha de -X importtime ('import time: self | cumulative | módulo')
+
+    Returns:
+        {"module", "self_us", "cumulative_us", "depth"} ou None (cabeçalho/outras linhas)
+    """
+    if not line.startswith("import time:"):
+        return None
+    body = line[len("import time:"):]
+    parts = body.split("|")
+    if len(parts) != 3:
+        return None
+    try:
+        self_us = int(parts[0].strip())
+        cumulative_us = int(parts[1].strip())
+    except ValueError:
+        return None
+    name = parts[2].rstrip()
+    depth = (len(name) - len(name.lstrip(" "))) // 2
+    return {"module": name.strip(), "self_us": self_us, "cumulative_us": cumulative_us, "depth": depth}
+
+
+def profile_imports(env: Dict[str, str]) -> Dict:
+    """Mede o import de backend.main em um processo novo"""
+    code = (
+        "import json, sys, time; t = time.perf_counter(); import backend.main; "
+        "print(json.dumps({'wall_ms': round((time.perf_counter() - t) * 1000, 1), "
+        f"'eager_heavy_modules': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit("❌ Falha ao importar backend.main")
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["modules"] = [e for e in map(parse_importtime_line, result.stderr.splitlines()) if e]
+    return report
+
+
+async def profile_warmup() -> Dict:
+    """Executa o warm-up de conexões em processo"""
+    from backend.services.warmup import warmup_service
+    start = time.perf_counter()
+    await warmup_service.run()
+    status = warmup_service.status()
+    status["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return status
+
+
+def main(args) -> None:
+    env = dict(os.environ)
+    if args.offline:
+        env["OFFLINE_MODE"] = "true"
+        for var in ("OPENAI_API_KEY", "PINECONE_API_KEY", "GCS_BUCKET_NAME"):
+            env.setdefault(var, "offline")
+        os.environ.update(env)
+
+    report = profile_imports(env)
+    modules = report.pop("modules")
+    top_cumulative = sorted(
+        (m for m in modules if m["module"].startswith("backend") or m["depth"] <= 1),
+        key=lambda m: m["cumulative_us"],
+        reverse=True
+    )[:args.top]
+    top_self = sorted(modules, key=lambda m: m["self_us"], reverse=True)[:args.top]
+
+    print("=" * 70)
+    print("⏱️  TEMPO DE IMPORT DA API (backend.main)")
+    print("=" * 70)
+    print(f"Total: {report['wall_ms']:.0f} ms")
+    if report["eager_heavy_modules"]:
+        print(f"⚠️  Importados no startup (deveriam ser lazy): {', '.join(report['eager_heavy_modules'])}")
+    else:
+        print("✅ Nenhum SDK pesado importado no startup")
+
+    print(f"\nTop {args.top} por tempo cumulativo (ms):")
+    for m in top_cumulative:
+        print(f"  {m['cumulative_us'] / 1000:8.1f}  {m['module']}")
+    print(f"\nTop {args.top} por tempo próprio (ms):")
+    for m in top_self:
+        print(f"  {m['self_us'] / 1000:8.1f}  {m['module']}")
+
+    report["top_cumulative"] = top_cumulative
+    report["top_self"] = top_self
+
+    if args.warmup:
+        warmup = asyncio.run(profile_warmup())
+        report["warmup"] = warmup
+        print(f"\n🔥 Warm-up: {warmup['wall_ms']:.0f} ms")
+        for name, step in warmup["steps"].items():
+            status = "✅" if step["ok"] else f"❌ {step.get('error', '')}"
+            print(f"  {name:12s} {step['ms']:8.1f} ms  {status}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Relatório salvo em {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil de cold start do AgroFinder")
+    parser.add_argument("--top", type=int, default=15, help="Número de módulos listados")
+    parser.add_argument("--warmup", action="store_true", help="Medir também o warm-up de conexões")
+    parser.add_argument("--offline", action="store_true", help="Usar os substitutos offline")
+    parser.add_argument("--json", help="Arquivo para salvar o relatório em JSON")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+"""
+Reconstrói o catálogo local de documentos (SQLite) a partir do Pinecone
+
+O catálogo é atualizado a cada ingestão; este script preenche documentos
+indexados antes dele existir (ou após perder o arquivo). Percorre a
+metadata de todos os vetores pela varredura de snapshot_index.py (sem
+trazer os valores), agrupa por document_id e grava páginas, chunks, datas
+e caminho no GCS. Com `--with-gcs`, também busca generation, tamanho e
+data de modificação de cada PDF no bucket.
+
+Uso:
+    python scripts/rebuild_catalog.py
+    python scripts/rebuild_catalog.py --reset --with-gcs
+"""
+import argparse
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.services.catalog import document_catalog
+from backend.services.gcs_client import gcs_client
+from snapshot_index import scan_index
+
+
+def collect_documents(top_k: int, workers: int) -> Dict[str, Dict]:
+    """Agrupa a metadata dos chunks por documento"""
+    documents: Dict[str, Dict] = {}
+    for _, _, metadata in scan_index(top_k, workers, include_values=False):
+        document_id = metadata.get("document_id")
+        if not document_id:
+            continue
+        document = documents.get(document_id)
+        if document is None:
+            upload_date = metadata.get("upload_date")
+            upload_date = datetime.fromisoformat(upload_date) if upload_date else \
+                datetime.fromtimestamp(metadata.get("upload_ts", 0))
+            document = documents[document_id] = {
+                "document_id": document_id,
+                "filename": metadata.get("filename", ""),
+                "category": metadata.get("category", ""),
+                "gcs_path": metadata.get("gcs_path", ""),
+                "content_sha256": metadata.get("content_sha256"),
+                "upload_date": upload_date,
+                "pages": set(),
+                "chunk_count": 0,
+            }
+        document["pages"].add(int(metadata.get("page_number", 0)))
+        document["chunk_count"] += 1
+    return documents
+
+
+def load_gcs_metadata(document: Dict) -> None:
+    """Generation, tamanho e modificação do PDF (ignora arquivos ausentes)"""
+    try:
+        blob = gcs_client.bucket.blob(document["gcs_path"])
+        blob.reload()
+        document["generation"] = blob.generation
+        document["file_size"] = blob.size
+        document["file_updated"] = blob.updated
+    except Exception as e:
+        print(f"   ⚠️  {document['gcs_path']}: {str(e)[:100]}")
+
+
+def rebuild(top_k: int, workers: int, reset: bool, with_gcs: bool):
+    print("=" * 70)
+    print("🗂️  AgroFinder - Rebuild do catálogo de documentos")
+    print("=" * 70)
+    print(f"   Catálogo: {document_catalog.path}")
+    print()
+
+    start = time.time()
+    documents = collect_documents(top_k, workers)
+    print(f"📄 {len(documents)} documentos, {sum(d['chunk_count'] for d in documents.values())} chunks")
+
+    if with_gcs and documents:
+        print("☁️  Lendo metadata dos PDFs no GCS...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(load_gcs_metadata, documents.values()))
+
+    rows = []
+    for document in documents.values():
+        row = dict(document)
+        row["page_count"] = len(row.pop("pages"))
+        rows.append(row)
+
+    if reset:
+        document_catalog.clear()
+    written = document_catalog.record_many(rows)
+
+    print()
+    print("=" * 70)
+    print("📈 RESUMO")
+    print("=" * 70)
+    print(f"✅ Documentos gravados: {written} em {time.time() - start:.1f}s")
+    facets = document_catalog.facets()
+    print(f"📊 Total no catálogo: {facets['total']}")
+    for category, count in facets["category"].items():
+        print(f"   {category}: {count}")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild do catálogo local de documentos")
+    parser.add_argument("--top-k", type=int, default=1000, help="Vetores por query (máx. 1000)")
+    parser.add_argument("--workers", type=int, default=8, help="Queries paralelas")
+    parser.add_argument("--reset", action="store_true", help="Apagar o catálogo antes (remove documentos que saíram do index)")
+    parser.add_argument("--with-gcs", action="store_true", help="Buscar generation/tamanho/modificação no GCS")
+    args = parser.parse_args()
+
+    rebuild(max(1, min(args.top_k, 1000)), args.workers, args.reset, args.with_gcs)
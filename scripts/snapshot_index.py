@@ -0,0 +1,389 @@
+"""
+Snapshot do index Pinecone (exportação/importação em formato colunar)
+
+Exporta todos os vetores e metadata para um diretório:
+
+    vectors.npy      matriz float32 (N x dimensão), linha i = vetor i
+    metadata.jsonl   uma linha {"id", "metadata"} por vetor, na mesma ordem
+    manifest.json    index de origem, contagem, dimensão e sha256 dos arquivos
+
+e importa de volta com upserts paralelos em lotes, sem gerar embeddings
+(útil para backup, migração de index/região ou restaurar um ambiente).
+
+O pinecone-client 3.0 não tem listagem de IDs. Sem `--ids-file`, a
+exportação percorre o index por filtros de metadata: o intervalo de
+`upload_ts` é dividido ao meio enquanto uma query devolve `top_k`
+resultados (ou seja, pode haver mais vetores no intervalo); num único
+segundo, a divisão continua por `page_number` e depois `chunk_index`.
+Cada partição completa já traz valores e metadata, então não há fetch
+extra. Com `--ids-file` (um ID por linha), os vetores são lidos por fetch.
+
+Uso:
+    python scripts/snapshot_index.py export snapshots/2024-06-01
+    python scripts/snapshot_index.py export snapshots/parcial --ids-file ids.txt
+    python scripts/snapshot_index.py import snapshots/2024-06-01 --workers 8
+    python scripts/snapshot_index.py import snapshots/2024-06-01 --index agrofinder-novo --dry-run
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.config import settings
+from backend.services.pinecone_client import pinecone_client
+
+FORMAT_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+# Campos numéricos usados para particionar, com o intervalo [início, fim) de cada um
+PARTITION_FIELDS = [
+    ("upload_ts", 0, 2 ** 32),
+    ("page_number", 0, 2 ** 20),
+    ("chunk_index", 0, 2 ** 20),
+]
+
+# IDs por fetch (vão na query string da requisição)
+FETCH_BATCH_SIZE = 200
+
+
+def random_unit_vector(dimension: int) -> List[float]:
+    """Vetor qualquer para a query (só o filtro importa aqui)"""
+    vector = [random.gauss(0, 1) for _ in range(dimension)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Partition:
+    """Fatia do index: campos já fixados + intervalo [lo, hi) do campo atual"""
+
+    def __init__(self, base: Dict, field_index: int, lo: int, hi: int):
+        self.base = base
+        self.field_index = field_index
+        self.lo = lo
+        self.hi = hi
+
+    @property
+    def field(self) -> str:
+        return PARTITION_FIELDS[self.field_index][0]
+
+    def filter(self) -> Dict:
+        return {"$and": [self.base, {self.field: {"$gte": self.lo, "$lt": self.hi}}]}
+
+    def split(self) -> List["Partition"]:
+        """Metades do intervalo; num valor único, passa ao próximo campo"""
+        if self.hi - self.lo > 1:
+            middle = (self.lo + self.hi) // 2
+            return [
+                Partition(self.base, self.field_index, self.lo, middle),
+                Partition(self.base, self.field_index, middle, self.hi),
+            ]
+        if self.field_index + 1 < len(PARTITION_FIELDS):
+            base = {"$and": [self.base, {self.field: {"$eq": self.lo}}]}
+            _, lo, hi = PARTITION_FIELDS[self.field_index + 1]
+            return [Partition(base, self.field_index + 1, lo, hi)]
+        return []
+
+    def __str__(self) -> str:
+        return f"{self.field}∈[{self.lo}, {self.hi})"
+
+
+def root_partitions() -> List[Partition]:
+    """Vetores com upload_ts + vetores antigos sem o campo (ver backfill_upload_ts.py)"""
+    _, lo, hi = PARTITION_FIELDS[0]
+    _, page_lo, page_hi = PARTITION_FIELDS[1]
+    return [
+        Partition({"upload_ts": {"$exists": True}}, 0, lo, hi),
+        Partition({"upload_ts": {"$exists": False}}, 1, page_lo, page_hi),
+    ]
+
+
+def query_partition(partition: Partition, top_k: int, include_values: bool = True) -> List[Dict]:
+    results = pinecone_client.query(
+        query_vector=random_unit_vector(pinecone_client.dimension),
+        top_k=top_k,
+        filter=partition.filter(),
+        include_metadata=True,
+        include_values=include_values,
+        timeout=120
+    )
+    return results.get("matches", [])
+
+
+def scan_index(
+    top_k: int,
+    workers: int,
+    include_values: bool = True
+) -> Iterator[Tuple[str, Optional[List[float]], Dict]]:
+    """
+    Percorre o index inteiro por partições de metadata
+
+    Args:
+        top_k: Resultados por query (máx. 1000 com include_values)
+        workers: Queries paralelas
+        include_values: Trazer os vetores (False: só metadata, ex: rebuild do catálogo)
+
+    Yields:
+        (id, valores ou None, metadata) de cada partição completa
+    """
+    queries = 0
+    splits = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(query_partition, p, top_k, include_values): p for p in root_partitions()}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                partition = pending.pop(future)
+                matches = future.result()
+                queries += 1
+
+                if len(matches) >= top_k:
+                    children = partition.split()
+                    if children:
+                        splits += 1
+                        for child in children:
+                            pending[executor.submit(query_partition, child, top_k, include_values)] = child
+                        continue
+                    print(f"   ⚠️  Partição {partition} não pode ser dividida: só os {top_k} primeiros vetores")
+
+                for match in matches:
+                    yield match["id"], match.get("values"), match.get("metadata") or {}
+
+    print(f"   🔎 {queries} queries ({splits} partições divididas)")
+
+
+def fetch_ids(ids: List[str], workers: int) -> Iterator[Tuple[str, List[float], Dict]]:
+    """
+    Lê os vetores por ID (registro local em `--ids-file`)
+
+    Yields:
+        (id, valores, metadata) dos IDs encontrados
+    """
+    batches = [ids[i:i + FETCH_BATCH_SIZE] for i in range(0, len(ids), FETCH_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for response in executor.map(lambda batch: pinecone_client.index.fetch(ids=batch), batches):
+            for vector_id, vector in response["vectors"].items():
+                yield vector_id, vector["values"], vector.get("metadata") or {}
+
+
+def export_snapshot(directory: str, ids_file: Optional[str], top_k: int, workers: int):
+    """Grava vectors.npy, metadata.jsonl e manifest.json em `directory`"""
+    print("=" * 70)
+    print("📦 AgroFinder - Exportação de snapshot do index")
+    print("=" * 70)
+    print(f"   Index: {pinecone_client.index_name}")
+    print(f"   Destino: {directory}")
+    print()
+
+    os.makedirs(directory, exist_ok=True)
+    raw_path = os.path.join(directory, VECTORS_FILE + ".tmp")
+    vectors_path = os.path.join(directory, VECTORS_FILE)
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    dimension = pinecone_client.dimension
+    start = time.time()
+
+    if ids_file:
+        with open(ids_file, "r", encoding="utf-8") as f:
+            ids = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+        print(f"📋 {len(ids)} IDs em {ids_file}")
+        source = fetch_ids(ids, workers)
+    else:
+        source = scan_index(top_k, workers)
+
+    # Valores vão para um arquivo bruto (a contagem só é conhecida no fim)
+    seen = set()
+    with open(raw_path, "wb") as raw, open(metadata_path, "w", encoding="utf-8") as meta:
+        for vector_id, values, metadata in source:
+            if vector_id in seen:
+                continue
+            vector = np.asarray(values, dtype=np.float32)
+            if vector.shape != (dimension,):
+                raise ValueError(f"Vetor {vector_id} com dimensão {vector.shape}, esperado {dimension}")
+            seen.add(vector_id)
+            raw.write(vector.tobytes())
+            meta.write(json.dumps({"id": vector_id, "metadata": metadata}, ensure_ascii=False) + "\n")
+            if len(seen) % 10000 == 0:
+                print(f"   📥 {len(seen)} vetores")
+
+    count = len(seen)
+    matrix = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(count, dimension))
+    if count:
+        raw_matrix = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(count, dimension))
+        for i in range(0, count, 65536):
+            matrix[i:i + 65536] = raw_matrix[i:i + 65536]
+        del raw_matrix
+    matrix.flush()
+    del matrix
+    os.remove(raw_path)
+
+    stats = pinecone_client.get_index_stats()
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "index_name": pinecone_client.index_name,
+        "created_at": datetime.now().isoformat(),
+        "source": "ids_file" if ids_file else "metadata_scan",
+        "count": count,
+        "dimension": dimension,
+        "index_total_vectors": stats.get("total_vectors", 0),
+        "files": {
+            VECTORS_FILE: sha256_file(vectors_path),
+            METADATA_FILE: sha256_file(metadata_path),
+        },
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    elapsed = time.time() - start
+    print()
+    print("=" * 70)
+    print("📈 RESUMO")
+    print("=" * 70)
+    print(f"✅ Vetores exportados: {count} ({count / elapsed:.0f}/s)" if elapsed else f"✅ Vetores exportados: {count}")
+    print(f"📊 Vetores no index: {manifest['index_total_vectors']}")
+    if not ids_file and count != manifest["index_total_vectors"]:
+        print("⚠️  Contagem diferente do index (ingestão em andamento ou index eventualmente consistente)")
+    print(f"💾 {os.path.getsize(vectors_path) / 1024 / 1024:.1f} MB em {VECTORS_FILE}, "
+          f"{os.path.getsize(metadata_path) / 1024 / 1024:.1f} MB em {METADATA_FILE}")
+    print()
+
+
+def read_manifest(directory: str, verify: bool) -> Dict:
+    with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Versão de snapshot não suportada: {manifest.get('format_version')}")
+    if verify:
+        for name, expected in manifest["files"].items():
+            if sha256_file(os.path.join(directory, name)) != expected:
+                raise ValueError(f"Checksum de {name} não confere (snapshot corrompido?)")
+    return manifest
+
+
+def iter_batches(directory: str, manifest: Dict, batch_size: int) -> Iterator[List[tuple]]:
+    """Lotes (id, valores, metadata) lendo a matriz por mmap"""
+    matrix = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+    if matrix.shape != (manifest["count"], manifest["dimension"]):
+        raise ValueError(f"{VECTORS_FILE} com formato {matrix.shape}, manifest indica "
+                         f"({manifest['count']}, {manifest['dimension']})")
+
+    batch = []
+    with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            record = json.loads(line)
+            batch.append((record["id"], matrix[row].tolist(), record["metadata"]))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def import_snapshot(directory: str, workers: int, batch_size: int, dry_run: bool, verify: bool):
+    """Upsert paralelo de todos os vetores do snapshot no index atual"""
+    print("=" * 70)
+    print("📦 AgroFinder - Importação de snapshot do index")
+    print("=" * 70)
+
+    manifest = read_manifest(directory, verify)
+    print(f"   Snapshot: {directory} ({manifest['count']} vetores de {manifest['index_name']}, "
+          f"{manifest['created_at']})")
+    print(f"   Index de destino: {pinecone_client.index_name}")
+    print()
+
+    if manifest["dimension"] != pinecone_client.dimension:
+        raise ValueError(f"Dimensão do snapshot ({manifest['dimension']}) difere do index "
+                         f"({pinecone_client.dimension})")
+
+    upserted = 0
+    failed = 0
+    start = time.time()
+
+    def upsert(batch: List[tuple]) -> int:
+        if dry_run:
+            return len(batch)
+        response = pinecone_client.index.upsert(vectors=batch)
+        return response.get("upserted_count", 0) or 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in iter_batches(directory, manifest, batch_size):
+            # Limita os lotes em memória a alguns por worker
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        upserted += future.result()
+                    except Exception as e:
+                        print(f"   ❌ Erro: {str(e)[:100]}")
+                        failed += 1
+            pending.add(executor.submit(upsert, batch))
+
+        for future in pending:
+            try:
+                upserted += future.result()
+            except Exception as e:
+                print(f"   ❌ Erro: {str(e)[:100]}")
+                failed += 1
+
+    elapsed = time.time() - start
+    print()
+    print("=" * 70)
+    print("📈 RESUMO")
+    print("=" * 70)
+    label = "A importar (dry-run)" if dry_run else "Importados"
+    print(f"✅ {label}: {upserted} ({upserted / elapsed:.0f}/s)" if elapsed else f"✅ {label}: {upserted}")
+    print(f"❌ Lotes com erro: {failed}")
+    print()
+    return upserted, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot do index Pinecone (.npy + JSONL)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Exportar o index para um diretório")
+    export_parser.add_argument("directory", help="Diretório do snapshot")
+    export_parser.add_argument("--ids-file", help="Arquivo com um ID por linha (fetch em vez de varredura)")
+    export_parser.add_argument("--top-k", type=int, default=1000, help="Vetores por query (máx. 1000)")
+    export_parser.add_argument("--workers", type=int, default=8, help="Queries/fetches paralelos")
+
+    import_parser = subparsers.add_parser("import", help="Importar um snapshot no index")
+    import_parser.add_argument("directory", help="Diretório do snapshot")
+    import_parser.add_argument("--index", help="Index de destino (padrão: PINECONE_INDEX_NAME)")
+    import_parser.add_argument("--workers", type=int, default=8, help="Upserts paralelos")
+    import_parser.add_argument("--batch-size", type=int, default=settings.pinecone_upsert_batch_size,
+                               help="Vetores por upsert")
+    import_parser.add_argument("--dry-run", action="store_true", help="Só ler e validar o snapshot")
+    import_parser.add_argument("--no-verify", action="store_true", help="Não conferir os checksums")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.directory, args.ids_file, max(1, min(args.top_k, 1000)), args.workers)
+    else:
+        if args.index:
+            # O index só é conectado no primeiro uso
+            pinecone_client.index_name = args.index
+        _, failed_batches = import_snapshot(
+            args.directory, args.workers, max(1, args.batch_size), args.dry_run, not args.no_verify
+        )
+        sys.exit(1 if failed_batches else 0)
@@ -0,0 +1,87 @@
+"""
+Script para testar as vagas de concorrência reservadas à busca no limitador da OpenAI
+
+Pedidos em lote (ingestão) ocupam o limite de concorrência e um pedido
+interativo (busca) ainda precisa ser liberado na hora, inclusive com o
+limite AIMD reduzido a 1 após um 429. Não chama a OpenAI.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.rate_limiter import AdaptiveRateLimiter, Priority
+
+
+def make_limiter(max_concurrency: int) -> AdaptiveRateLimiter:
+    # Buckets folgados: só a concorrência importa aqui
+    return AdaptiveRateLimiter(
+        requests_per_minute=100_000,
+        tokens_per_minute=100_000_000,
+        max_concurrency=max_concurrency,
+        interactive_slots=1
+    )
+
+
+async def hold(limiter: AdaptiveRateLimiter, priority: Priority, started: asyncio.Event, release: asyncio.Event):
+    async with limiter.acquire(1000, priority):
+        started.set()
+        await release.wait()
+
+
+async def acquired_within(limiter: AdaptiveRateLimiter, priority: Priority, timeout: float) -> bool:
+    """Tenta uma vaga e a devolve; False se não foi liberada a tempo"""
+    async def take():
+        async with limiter.acquire(10, priority):
+            pass
+    try:
+        await asyncio.wait_for(take(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def bulk_fills_limit(max_concurrency: int, aimd_limit: float) -> bool:
+    limiter = make_limiter(max_concurrency)
+    limiter.concurrency_limit = aimd_limit
+    release = asyncio.Event()
+    holders = []
+    # Lote em excesso: o que couber fica em andamento, o resto na fila
+    for _ in range(max_concurrency + 2):
+        started = asyncio.Event()
+        holders.append((asyncio.ensure_future(hold(limiter, Priority.BULK, started, release)), started))
+    await asyncio.sleep(0.05)
+    bulk_running = sum(started.is_set() for _, started in holders)
+
+    interactive_ok = await acquired_within(limiter, Priority.INTERACTIVE, 0.5)
+    extra_bulk_blocked = not await acquired_within(limiter, Priority.BULK, 0.2)
+
+    release.set()
+    await asyncio.gather(*(task for task, _ in holders))
+
+    print(f"   limite {int(aimd_limit)}/{max_concurrency}: lote em andamento {bulk_running}, "
+          f"busca liberada: {interactive_ok}, lote extra bloqueado: {extra_bulk_blocked}")
+    return bulk_running >= 1 and interactive_ok and extra_bulk_blocked
+
+
+async def main() -> int:
+    print("🧪 Testando vagas reservadas à busca no limitador da OpenAI...\n")
+    cases = [
+        (8, 8.0),   # Limite cheio
+        (8, 1.0),   # Após 429s, AIMD no piso
+    ]
+    failures = 0
+    for max_concurrency, aimd_limit in cases:
+        if not await bulk_fills_limit(max_concurrency, aimd_limit):
+            failures += 1
+
+    if failures:
+        print(f"\n❌ {failures} cenário(s) com a busca bloqueada pelo lote")
+        return 1
+    print("\n✅ A busca sempre passa à frente da ingestão")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))